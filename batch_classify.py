@@ -0,0 +1,149 @@
+"""
+batch_classify.py
+
+Offline batch classification of logged user messages, e.g. to tune the weights
+in knowledge_base.intent_patterns. No Discord token is needed.
+
+The input is streamed in chunks to N worker processes. At most a fixed number
+of chunks are in flight at any time, so memory use does not depend on the size
+of the file, and results are written as JSONL in input order. Messages are
+classified without the bot's per-message time budget, so the output does not
+depend on --workers, --chunk-size or how busy the machine is:
+
+    {"line": 1, "message": "...", "intents": [...], "scores": {...},
+     "entities": {...}, "handler": "handle_role_to_skill_query"}
+
+Usage:
+    python batch_classify.py messages.txt -o results.jsonl
+    python batch_classify.py logs.jsonl --field content --workers 8 --chunk-size 1000
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+import itertools
+import collections
+import concurrent.futures
+
+
+def _init_worker():
+    """Builds the knowledge structures once per worker process."""
+    logging.getLogger().setLevel(logging.WARNING)
+    import nlu  # noqa: F401
+
+
+def classify_chunk(chunk: list) -> list:
+    """Classifies a chunk of (line number, record id, message) tuples."""
+    import nlu
+    results = []
+    for line_number, record_id, message in chunk:
+        result = {"line": line_number}
+        if record_id is not None:
+            result["id"] = record_id
+        result["message"] = message
+        result.update(nlu.classify_message(message))
+        results.append(result)
+    return results
+
+
+def read_messages(handle, input_format: str, field: str = None):
+    """
+    Yields (line number, record id, message) from a text file (one message per
+    line) or a JSONL file (one object per line, message in `field`).
+    """
+    candidate_fields = [field] if field else ["message", "content", "text"]
+    for line_number, line in enumerate(handle, start=1):
+        line = line.rstrip("\n")
+        if not line.strip():
+            continue
+        if input_format == "text":
+            yield line_number, None, line
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            logging.warning(f"Skipping line {line_number}: not valid JSON.")
+            continue
+        if isinstance(record, str):
+            yield line_number, None, record
+            continue
+        if not isinstance(record, dict):
+            logging.warning(f"Skipping line {line_number}: not a JSON object or string.")
+            continue
+        message = next((record[name] for name in candidate_fields if isinstance(record.get(name), str)), None)
+        if message is None:
+            logging.warning(f"Skipping line {line_number}: no message field ({', '.join(candidate_fields)}).")
+            continue
+        yield line_number, record.get("id"), message
+
+
+def chunked(iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def classify_stream(records, workers: int, chunk_size: int, max_chunks_in_flight: int = None):
+    """
+    Yields classification results for the records in input order. With more
+    than one worker, at most `max_chunks_in_flight` chunks are queued or
+    running at once (default: two per worker).
+    """
+    chunks = chunked(records, chunk_size)
+    if workers <= 1:
+        _init_worker()
+        for chunk in chunks:
+            yield from classify_chunk(chunk)
+        return
+
+    max_chunks_in_flight = max_chunks_in_flight or workers * 2
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        in_flight = collections.deque()
+        for chunk in chunks:
+            in_flight.append(executor.submit(classify_chunk, chunk))
+            if len(in_flight) >= max_chunks_in_flight:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Classify a file of messages with the bot's NLU pipeline.")
+    parser.add_argument("input", help="text file (one message per line) or JSONL file, '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file, '-' for stdout")
+    parser.add_argument("--format", choices=("auto", "text", "jsonl"), default="auto",
+                        help="input format; auto picks jsonl for .jsonl/.json files")
+    parser.add_argument("--field", help="JSONL field holding the message (default: message, content or text)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--chunk-size", type=int, default=500, help="messages per chunk sent to a worker")
+    args = parser.parse_args(argv)
+
+    input_format = args.format
+    if input_format == "auto":
+        input_format = "jsonl" if args.input.endswith((".jsonl", ".json")) else "text"
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    count = 0
+    try:
+        records = read_messages(source, input_format, args.field)
+        for result in classify_stream(records, args.workers, args.chunk_size):
+            sink.write(json.dumps(result, ensure_ascii=False) + "\n")
+            count += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    print(f"Classified {count} messages.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
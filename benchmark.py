@@ -0,0 +1,316 @@
+"""
+benchmark.py
+
+Offline latency benchmark for the NLU pipeline. No Discord token is needed.
+
+It replays a message corpus through each stage of the pipeline and reports
+throughput and p50/p95/p99 latency per stage. The corpus is a fixed set of
+typical user questions, questions generated about every role in the knowledge
+base and generated adversarial long inputs, so every run
+measures the same messages; --requests adds the titles and bodies of a JSONL
+file on top. The fuzzy matcher is also timed over synthetic
+vocabularies of growing size, to show how its cost grows with them.
+
+Usage:
+    python benchmark.py                         # print results
+    python benchmark.py --output results.json   # also save them as JSON
+    python benchmark.py --save-baseline         # store results as the baseline
+    python benchmark.py --check --baseline benchmarks/baseline.json --threshold 0.25
+        # exit with status 1 if any stage's p95 is more than 25% (and 50 us)
+        # slower, or if there is no baseline to compare against
+
+Every statistic is the median of --runs runs. Without --check, the comparison
+with the baseline is only reported: timings are only comparable on the machine
+the baseline was recorded on, and only while it is otherwise idle.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import contextlib
+import platform
+import statistics
+
+import knowledge_base
+import nlu
+from fuzzy_matcher import FuzzyMatcher
+
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+
+SAMPLE_MESSAGES = [
+    "hi",
+    "hello there!",
+    "thanks a lot",
+    "can you help me?",
+    "what skills for a devops engineer",
+    "What skills are needed to become a data scientist?",
+    "how do I become a backend developer",
+    "I'm proficient in python and react, what jobs can I get?",
+    "I know java, spring, docker and kubernetes. What should I do with my skills?",
+    "I have experience with c++, c# and .net",
+    "what does a product manager do",
+    "I am interested in cloud engineer roles with aws and terraform",
+    "my skills include sql, tableau and excel",
+    "I know pyhton, kubernets and postgres, can I be a data scintist?",
+    "bye",
+]
+
+
+# --- CORPUS ---
+
+def load_request_messages(path: str) -> list:
+    """Turns a JSONL file of {title, body} records into messages: titles, bodies and their sentences."""
+    messages = []
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            request = json.loads(line)
+            messages.append(request.get("title", ""))
+            body = request.get("body", "")
+            messages.append(body)
+            messages.extend(sentence for sentence in body.split(". ") if sentence)
+    return [message for message in messages if message]
+
+
+def knowledge_messages(seed: int = 3) -> list:
+    """Questions about every role in the knowledge base: its skills, moves to and from it, and skill lists."""
+    rng = random.Random(seed)
+    roles = list(knowledge_base.role_skill_map.values())
+    messages = []
+    for role_data, other in zip(roles, roles[1:] + roles[:1]):
+        name = role_data["display_name"].lower()
+        skills = [skill for group in role_data["skills"].values() for skill in group]
+        picked = rng.sample(skills, min(3, len(skills)))
+        typo = picked[0][:-2] + picked[0][-1] + picked[0][-2] if len(picked[0]) > 4 else picked[0]
+        messages += [
+            f"what skills do I need to become a {name}?",
+            f"I'm a {name}, how do I become a {other['display_name'].lower()}?",
+            f"I know {', '.join(picked)}, what jobs can I get?",
+            f"my skills are {typo} and {picked[-1]}, which roles fit me?",
+        ]
+    return messages
+
+
+def adversarial_messages(length: int = 2000) -> list:
+    """Long inputs that stress the regex engines (unanchored '.*', long words, many entities)."""
+    technologies = sorted({skill for role in knowledge_base.role_skill_map.values()
+                           for skills in role["skills"].values() for skill in skills})
+    return [
+        ("what " * length)[:length],
+        ("want " * length)[:length],
+        "how " + "x" * (length - 11) + " become",
+        ("with my skill " * length)[:length],
+        "a" * length,
+        " ".join(random.Random(1).choice(technologies) for _ in range(length // 6))[:length],
+        ("I know python, " * length)[:length],
+    ]
+
+
+def build_corpus(requests_path: str = None, long_length: int = 2000) -> list:
+    extra = load_request_messages(requests_path) if requests_path else []
+    return SAMPLE_MESSAGES + knowledge_messages() + extra + adversarial_messages(long_length)
+
+
+# --- MEASUREMENT ---
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(function, inputs: list, repeat: int, warmup: int = 1) -> dict:
+    """Calls function(*args) for every args tuple in inputs, `repeat` times, and summarises the latencies."""
+    for _ in range(warmup):
+        for args in inputs:
+            function(*args)
+
+    # Each input keeps its fastest pass: scheduler and frequency noise only ever
+    # adds time, so the minimum is what stays comparable between runs.
+    best = [float("inf")] * len(inputs)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for position, args in enumerate(inputs):
+            call_started = time.perf_counter()
+            function(*args)
+            best[position] = min(best[position], time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(best) if repeat > 0 else []
+    return {
+        "calls": len(inputs) * repeat,
+        "throughput_per_s": round(len(inputs) * repeat / elapsed, 1) if elapsed else 0.0,
+        "mean_us": round(1e6 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "p50_us": round(1e6 * percentile(latencies, 0.50), 2),
+        "p95_us": round(1e6 * percentile(latencies, 0.95), 2),
+        "p99_us": round(1e6 * percentile(latencies, 0.99), 2),
+        "max_us": round(1e6 * latencies[-1], 2) if latencies else 0.0,
+    }
+
+
+@contextlib.contextmanager
+def caches_disabled():
+    """Turns the response caches (and the fuzzy lookup cache) off, so every call does the full work."""
+    fuzzy_matcher = nlu.INDEX.fuzzy_matcher
+    sizes = (nlu.ANALYSIS_CACHE.max_size, nlu.REPLY_CACHE.max_size, fuzzy_matcher.cache_size)
+    nlu.ANALYSIS_CACHE.max_size = nlu.REPLY_CACHE.max_size = fuzzy_matcher.cache_size = 0
+    try:
+        yield
+    finally:
+        nlu.ANALYSIS_CACHE.max_size, nlu.REPLY_CACHE.max_size, fuzzy_matcher.cache_size = sizes
+
+
+def run_benchmarks(corpus: list, repeat: int) -> dict:
+    """Runs every stage over the corpus and returns {stage: stats}."""
+    messages = [(message,) for message in corpus]
+    analysed = [nlu.detect_entities(message) for message in corpus]
+
+    # Handler inputs: entities from the corpus, plus every known role and skill set.
+    role_queries = [(entities,) for entities in analysed if entities.get("role")]
+    skill_queries = [(entities,) for entities in analysed if entities.get("technology")]
+    for role_id, role_data in knowledge_base.role_skill_map.items():
+        role_queries.append(({"role": [role_id.replace("_", " ")]},))
+        skills = [skill for group in role_data["skills"].values() for skill in group]
+        skill_queries.append(({"technology": skills},))
+
+    results = {}
+    with caches_disabled():
+        results["detect_intents"] = measure(nlu.detect_intents, messages, repeat)
+        results["detect_entities"] = measure(nlu.detect_entities, messages, repeat)
+        results["handle_role_to_skill_query"] = measure(nlu.handle_role_to_skill_query, role_queries, repeat)
+        results["handle_skill_to_role_query"] = measure(nlu.handle_skill_to_role_query, skill_queries, repeat)
+        results["generate_response"] = measure(nlu.generate_response, messages, repeat)
+    results["generate_response_cached"] = measure(nlu.generate_response, messages, repeat)
+    results.update(run_fuzzy_scaling(SAMPLE_MESSAGES, repeat))
+    return results
+
+
+def synthetic_vocabulary(size: int, seed: int = 7) -> dict:
+    """The real phrase vocabulary, padded with made-up skill names up to `size` entries."""
+    vocabulary = dict(nlu.INDEX.gazetteer.phrases)
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    while len(vocabulary) < size:
+        word = "".join(rng.choice(letters) for _ in range(rng.randint(5, 12)))
+        vocabulary.setdefault(word, "technology")
+    return vocabulary
+
+
+def run_fuzzy_scaling(corpus: list, repeat: int, sizes: tuple = (1_000, 10_000, 100_000)) -> dict:
+    """Times the fuzzy fallback over growing vocabularies (it grows slowly, see fuzzy_matcher.py)."""
+    results = {}
+    inputs = [(message.lower(), (), float("inf")) for message in corpus]
+    for size in sizes:
+        matcher = FuzzyMatcher(synthetic_vocabulary(size), cache_size=0)
+        results[f"fuzzy_match_vocab_{size}"] = measure(matcher.match_tokens, inputs, repeat)
+    return results
+
+
+# --- BASELINE COMPARISON ---
+
+def median_results(runs: list) -> dict:
+    """Per stage, the median of every statistic over several runs of run_benchmarks."""
+    return {
+        stage: {name: statistics.median(run[stage][name] for run in runs) for name in stats}
+        for stage, stats in runs[0].items()
+    }
+
+
+def compare_to_baseline(results: dict, baseline: dict, threshold: float, metric: str = "p95_us",
+                        noise_floor_us: float = 50.0) -> list:
+    """
+    Returns a description of every stage whose metric regressed by more than
+    threshold. Slowdowns smaller than noise_floor_us are never reported: on
+    stages that take a few microseconds they are timer and scheduler noise.
+    """
+    regressions = []
+    for stage, stats in results.items():
+        reference = baseline.get("stages", {}).get(stage)
+        if not reference or not reference.get(metric):
+            continue
+        ratio = stats[metric] / reference[metric]
+        if ratio > 1 + threshold and stats[metric] - reference[metric] >= noise_floor_us:
+            regressions.append(
+                f"{stage}: {metric} {stats[metric]:.1f} vs baseline {reference[metric]:.1f} (+{(ratio - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def print_results(results: dict):
+    print(f"{'stage':<30}{'calls':>8}{'ops/s':>12}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'max us':>11}")
+    for stage, stats in results.items():
+        print(f"{stage:<30}{stats['calls']:>8}{stats['throughput_per_s']:>12.1f}{stats['p50_us']:>10.1f}"
+              f"{stats['p95_us']:>10.1f}{stats['p99_us']:>10.1f}{stats['max_us']:>11.1f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the NLU pipeline offline.")
+    parser.add_argument("--requests", help="JSONL file whose titles and bodies are added to the corpus")
+    parser.add_argument("--repeat", type=int, default=10, help="passes over the corpus per stage")
+    parser.add_argument("--runs", type=int, default=3, help="benchmark runs; the median of each statistic is kept")
+    parser.add_argument("--long-length", type=int, default=2000, help="length of the adversarial inputs")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with status 1 on a regression or when there is no baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed p95 slowdown, 0.25 = 25%%")
+    parser.add_argument("--noise-floor-us", type=float, default=50.0,
+                        help="p95 slowdowns smaller than this many microseconds are ignored")
+    args = parser.parse_args(argv)
+
+    # The pipeline logs every message; that is not what we are measuring.
+    logging.getLogger().setLevel(logging.WARNING)
+
+    corpus = build_corpus(args.requests, args.long_length)
+    results = median_results([run_benchmarks(corpus, args.repeat) for _ in range(max(args.runs, 1))])
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "corpus_size": len(corpus),
+        "repeat": args.repeat,
+        "runs": max(args.runs, 1),
+        "kb_version": nlu.KB_VERSION,
+        "stages": results,
+    }
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; record one with --save-baseline.")
+        return 1 if args.check else 0
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    if (baseline.get("python"), baseline.get("machine")) != (report["python"], report["machine"]):
+        print(f"\nNote: the baseline was recorded on Python {baseline.get('python')} ({baseline.get('machine')}); "
+              f"timings from another setup are not directly comparable.")
+    regressions = compare_to_baseline(results, baseline, args.threshold, noise_floor_us=args.noise_floor_us)
+    if regressions:
+        print(f"\nLatency regressions against the baseline{'' if args.check else ' (reported only, see --check)'}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1 if args.check else 0
+    print(f"\nNo stage regressed by more than {args.threshold:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,207 +1,104 @@
 import os
-import re
-import random
+import asyncio
+import functools
 import logging
 import discord
 from dotenv import load_dotenv
 
-# Import the knowledge base
-import knowledge_base
+from metrics import INBOUND_MESSAGES, Gauge, start_metrics_server
+from rate_limits import BurstCoalescer, KeyedTokenBuckets
+from sessions import SessionStore
+from structured_logging import logging_stats, setup_logging, shutdown_logging
+from worker_pool import ResponseDispatcher, DEFAULT_BUSY_REPLY
 
 # --- INITIALIZATION ---
 
-# Set up logging to a file
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("logs/bot.log"),
-        logging.StreamHandler() # Also print logs to console
-    ]
-)
-
-# Load environment variables from .env file
+# Load environment variables from .env file (before anything reads them)
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
-if not TOKEN:
-    logging.error("FATAL: DISCORD_TOKEN environment variable not set.")
-    exit()
+
+# Log to logs/bot.log (JSON lines) and the console, from a background thread
+setup_logging()
+
+# Import the response logic once logging is set up; this builds the knowledge indexes
+import nlu  # noqa: E402
+import knowledge_base  # noqa: E402
+from outbound import PRIORITY_ADMIN, PRIORITY_ANSWER, PRIORITY_NOTICE, SendScheduler, send_chunked  # noqa: E402
+
+# How the response pipeline is executed: "inline" (on the event loop), "thread" or "process"
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "inline")
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "0")) or None  # None = one per CPU
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "100"))
+SHED_WITH_REPLY = os.getenv("SHED_WITH_REPLY", "true").lower() == "true"
+STATS_LOG_INTERVAL = int(os.getenv("STATS_LOG_INTERVAL", "60"))  # seconds, 0 disables
+
+# Per-user conversation state for follow-ups ("tell me more about the first one"):
+# idle time before a session is forgotten, and limits on the number of sessions and their memory
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "200000"))  # 0 disables follow-ups
+SESSION_MAX_MB = float(os.getenv("SESSION_MAX_MB", "96"))
+
+# Flood control: messages per minute a user may send before the rest are ignored (and
+# the burst allowance), and the pause that ends a burst of messages answered as one (0 disables)
+USER_MESSAGES_PER_MINUTE = float(os.getenv("USER_MESSAGES_PER_MINUTE", "20"))
+USER_MESSAGE_BURST = float(os.getenv("USER_MESSAGE_BURST", "8"))
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "1.0"))
+COALESCE_MAX_WAIT = float(os.getenv("COALESCE_MAX_WAIT", "3.0"))
+
+# Outgoing messages: Discord allows 5 messages per 5 seconds in a channel and 50 requests per second
+CHANNEL_SENDS_PER_SECOND = float(os.getenv("CHANNEL_SENDS_PER_SECOND", "1"))
+CHANNEL_SEND_BURST = float(os.getenv("CHANNEL_SEND_BURST", "5"))
+GLOBAL_SENDS_PER_SECOND = float(os.getenv("GLOBAL_SENDS_PER_SECOND", "45"))
+SEND_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", "1000"))
+SEND_MAX_AGE = float(os.getenv("SEND_MAX_AGE", "30"))  # seconds a reply may wait before it is dropped
+
+# Hot reload of knowledge_base.py: poll interval in seconds (0 disables) and the
+# Discord user ids allowed to trigger a reload with the "!reload-kb" command
+KB_WATCH_INTERVAL = float(os.getenv("KB_WATCH_INTERVAL", "5"))
+ADMIN_USER_IDS = {int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+RELOAD_COMMAND = "!reload-kb"
+
+# Prometheus-style metrics endpoint on http://METRICS_HOST:METRICS_PORT/metrics (port 0 disables)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+# Sharding (see shards.py): the shard this process runs and the total number of shards.
+# Without SHARD_ID, one process serves every guild.
+SHARD_ID = os.getenv("SHARD_ID")
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
 
 # Set up Discord client with necessary intents
 intents = discord.Intents.default()
 intents.message_content = True
-client = discord.Client(intents=intents)
-
-# --- PRE-COMPUTATION AT STARTUP ---
-
-# Compile all regex patterns for efficiency
-COMPILED_INTENT_PATTERNS = {
-    intent: [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in patterns]
-    for intent, patterns in knowledge_base.intent_patterns.items()
-}
-
-
-COMPILED_ENTITY_PATTERNS = {
-    entity: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
-    for entity, patterns in knowledge_base.entity_patterns.items()
-}
-
-def build_skill_to_role_map():
-    """
-    Creates an inverted index mapping skills to a list of roles requiring them.
-    This is crucial for the 'Skills -> Role' feature and is run only once at startup.
-    """
-    skill_map = {}
-    for role_id, data in knowledge_base.role_skill_map.items():
-        all_skills = []
-        for skill_list in data['skills'].values():
-            all_skills.extend(skill_list)
-        
-        for skill in set(all_skills): # Use set to avoid duplicates
-            if skill not in skill_map:
-                skill_map[skill] = []
-            skill_map[skill].append(role_id)
-    return skill_map
-
-# This inverted map is the key to finding roles from skills quickly.
-SKILL_TO_ROLE_MAP = build_skill_to_role_map()
-logging.info("Skill-to-Role map built successfully.")
-
-# --- CORE LOGIC FUNCTIONS ---
-
-
-def detect_intents(message: str) -> list:
-    """Detects intents based on regex patterns and scores, returning a sorted list."""
-    scores = {}
-    message_lower = message.lower()
-    
-    for intent, pattern_weights in COMPILED_INTENT_PATTERNS.items():
-        score = 0
-        for pattern, weight in pattern_weights:
-            matches = pattern.findall(message_lower)
-            if matches:
-                score += weight * len(matches)  # Increase score based on number of matches
-        if score > 0:
-            scores[intent] = score
-    
-    # Sort intents by score in descending order
-    return sorted(scores.keys(), key=lambda k: scores[k], reverse=True)
-
-def detect_entities(message: str) -> dict:
-    """
-    Detects all entities (roles, technologies) in a message.
-    
-    BUG FIX: Switched from re.findall() to re.finditer() to capture the
-    full match of a pattern, not just the parenthesized group. This ensures
-    that "backend developer" is extracted instead of just "backend".
-    """
-    detected = {}
-    message_lower = message.lower()
-    for entity_type, patterns in COMPILED_ENTITY_PATTERNS.items():
-        found_entities = set()
-        for pattern in patterns:
-            # Use finditer to get match objects, ensuring we get the full match
-            matches = pattern.finditer(message_lower)
-            for match in matches:
-                # .group(0) returns the entire matched string (e.g., "backend developer")
-                found_entities.add(match.group(0).strip())
-        if found_entities:
-            detected[entity_type] = list(found_entities)
-    return detected
-
-def handle_role_to_skill_query(entities: dict) -> str:
-    """
-    Handles 'career_path' intent.
-    Formats a response detailing the skills needed for a detected role.
-    """
-    if "role" not in entities or not entities["role"]:
-        return "I can see you're asking about a career path, but which role are you interested in? For example, try 'what skills are needed for a devops engineer?'"
-
-    # Take the first role detected
-    role_entity = entities["role"][0]
-    
-    # Normalize the entity to match the key in role_skill_map (e.g., "backend developer" -> "backend_developer")
-    role_key = role_entity.lower().replace(" ", "_").replace("-", "_")
-    
-    if role_key in knowledge_base.role_skill_map:
-        role_data = knowledge_base.role_skill_map[role_key]
-        response = f"Excellent choice! To become a **{role_data['display_name']}**, you'll generally need the following skills:\n\n"
-        response += f"_{role_data['description']}_\n\n"
-        
-        for category, skills in role_data['skills'].items():
-            # Format category name nicely (e.g., 'core_concepts' -> 'Core Concepts')
-            category_name = category.replace('_', ' ').title()
-            skill_list = ", ".join(f"`{s}`" for s in skills)
-            response += f"• **{category_name}:** {skill_list}\n"
-        
-        return response
-    else:
-        return f"I don't have detailed information on the '{role_entity}' role just yet, but I'm constantly learning! Try asking about another role."
-
-def handle_skill_to_role_query(entities: dict) -> str:
-    """
-    Handles 'role_suggestion' intent.
-    Finds and scores potential roles based on the user's mentioned skills.
-    """
-    if "technology" not in entities or not entities["technology"]:
-        return "Please tell me what skills you have! For example, 'I am proficient in Python and React'."
-
-    user_skills = set(entities["technology"])
-    role_scores = {}
-
-    for skill in user_skills:
-        # Check our pre-computed map for roles associated with this skill
-        if skill in SKILL_TO_ROLE_MAP:
-            for role_id in SKILL_TO_ROLE_MAP[skill]:
-                role_scores[role_id] = role_scores.get(role_id, 0) + 1
-
-    if not role_scores:
-        return f"Based on the skills you mentioned ({', '.join(f'`{s}`' for s in user_skills)}), I couldn't find a direct career match in my database. Perhaps try listing some other technologies you know?"
-
-    # Sort roles by how many of the user's skills matched
-    sorted_roles = sorted(role_scores.items(), key=lambda item: item[1], reverse=True)
-
-    response = f"With skills in **{', '.join(user_skills)}**, you have several great career prospects! Here are some top matches based on your skills:\n\n"
-    
-    # Show top 3 matches
-    for role_id, score in sorted_roles[:3]:
-        role_data = knowledge_base.role_skill_map[role_id]
-        display_name = role_data['display_name']
-        match_quality = f"({score} of your skills match)"
-        response += f"• **{display_name}** {match_quality}\n"
-
-    response += "\nYou can ask me for more details on any of these roles to see the full skill set required!"
-    return response
-
-def generate_response(message: str) -> str:
-    """
-    The main response dispatcher. It detects intents and entities,
-    then routes to the appropriate handler function.
-    """
-    intents = detect_intents(message)
-    entities = detect_entities(message)
-    
-    logging.info(f"Message: '{message}' | Intents: {intents} | Entities: {entities}")
-
-    if not intents:
-        return "I'm not sure how to help with that. Try asking me what skills you need for a job, or what jobs you can get with your skills!"
-
-    primary_intent = intents[0]
-    
-    # Route to handlers based on intent
-    if primary_intent == "greeting":
-        return random.choice(knowledge_base.simple_responses["greeting"])
-    elif primary_intent == "consultation_start":
-        return random.choice(knowledge_base.simple_responses["consultation_start"])
-    elif primary_intent == "thanks":
-        return random.choice(knowledge_base.simple_responses["thanks"])
-    elif primary_intent == "career_path":
-        return handle_role_to_skill_query(entities)
-    elif primary_intent == "role_suggestion":
-        return handle_skill_to_role_query(entities)
-    
-    # Fallback if an intent was detected but has no handler
-    return "I see you're asking about something tech-related, but I'm not sure how to answer. Could you rephrase your question?"
+shard_options = {} if SHARD_ID is None else {"shard_id": int(SHARD_ID), "shard_count": SHARD_COUNT}
+client = discord.Client(intents=intents, **shard_options)
+
+dispatcher = ResponseDispatcher(
+    mode=EXECUTION_MODE,
+    workers=WORKER_COUNT,
+    max_pending=WORKER_QUEUE_SIZE,
+    busy_reply=DEFAULT_BUSY_REPLY if SHED_WITH_REPLY else None,
+    sessions=SessionStore(SESSION_MAX_COUNT, SESSION_TTL, int(SESSION_MAX_MB * 1024 * 1024)),
+)
+
+scheduler = SendScheduler(
+    channel_rate=CHANNEL_SENDS_PER_SECOND,
+    channel_burst=CHANNEL_SEND_BURST,
+    global_rate=GLOBAL_SENDS_PER_SECOND,
+    max_queued=SEND_QUEUE_SIZE,
+    max_age=SEND_MAX_AGE,
+)
+user_limits = KeyedTokenBuckets(USER_MESSAGES_PER_MINUTE / 60, USER_MESSAGE_BURST)
+
+Gauge("bot_dispatcher", "Worker queue depth, completed and shed messages, and wait times.",
+      lambda: {(stat,): value for stat, value in dispatcher.stats().items() if isinstance(value, (int, float))},
+      ("stat",))
+Gauge("bot_logging_dropped", "Log records dropped by sampling or because the log queue was full.",
+      lambda: {(reason,): value for reason, value in logging_stats().items()}, ("reason",))
+Gauge("bot_send_scheduler", "Messages waiting for a send slot and being sent.",
+      lambda: {(stat,): value for stat, value in scheduler.stats().items()}, ("stat",))
+Gauge("bot_sessions", "Conversation sessions: count, estimated bytes, hits, evictions and expirations.",
+      lambda: {(stat,): value for stat, value in dispatcher.sessions.stats().items()}, ("stat",))
 
 # --- DISCORD CLIENT EVENTS ---
 
@@ -210,21 +107,104 @@ async def on_ready():
     """Event handler for when the bot has connected to Discord."""
     logging.info(f'Bot logged in as {client.user}')
     print(f'Logged in as {client.user}. The bot is ready!')
+    # on_ready fires again after reconnects; only start the background tasks once
+    if not getattr(client, "background_tasks", None):
+        client.background_tasks = []
+        if STATS_LOG_INTERVAL:
+            client.background_tasks.append(asyncio.create_task(log_dispatcher_stats()))
+        if KB_WATCH_INTERVAL:
+            client.background_tasks.append(asyncio.create_task(watch_knowledge_base()))
+
+async def log_dispatcher_stats():
+    """Periodically logs the worker queue depth and wait times."""
+    while True:
+        await asyncio.sleep(STATS_LOG_INTERVAL)
+        logging.info(f"Dispatcher stats: {dispatcher.stats()}")
+        logging.info(f"Logging stats: {logging_stats()}")
+        logging.info(f"Session stats: {dispatcher.sessions.stats()}")
+        logging.info(f"Send scheduler stats: {scheduler.stats()}, bursts: {coalescer.stats()}")
+
+async def reload_knowledge_base() -> str:
+    """Rebuilds the knowledge index in a background thread and reports the outcome."""
+    try:
+        changed, version = await asyncio.to_thread(nlu.reload_knowledge_base)
+    except ValueError as error:
+        logging.error(f"Knowledge base reload failed, keeping the current version: {error}")
+        return f"Reload failed, still serving the previous knowledge base: {error}"
+    if not changed:
+        return f"The knowledge base is unchanged (version `{version}`)."
+    return f"Knowledge base reloaded (version `{version}`)."
+
+async def watch_knowledge_base():
+    """Reloads the knowledge base whenever knowledge_base.py changes on disk."""
+    last_mtime = os.path.getmtime(knowledge_base.__file__)
+    while True:
+        await asyncio.sleep(KB_WATCH_INTERVAL)
+        try:
+            mtime = os.path.getmtime(knowledge_base.__file__)
+        except OSError:
+            continue  # the file is being replaced; try again next time
+        if mtime != last_mtime:
+            last_mtime = mtime
+            logging.info(await reload_knowledge_base())
+
+def reply_sender(channel, priority: int = PRIORITY_ANSWER):
+    """A send coroutine function for `channel` that goes through the send scheduler and splits long replies."""
+    async def send(text: str):
+        # A "busy" notice is the first thing to drop when the send queue is full.
+        text_priority = PRIORITY_NOTICE if text == dispatcher.busy_reply else priority
+        await send_chunked(functools.partial(scheduler.send, channel.id, channel.send, priority=text_priority), text)
+    return send
+
+async def answer(message, text: str):
+    """Answers `text`: one message, or a burst of messages from the same user joined together."""
+    # Generate the response (possibly in a worker) and send it in channel order
+    await dispatcher.dispatch(message.channel.id, text, reply_sender(message.channel), message.author.id)
+
+coalescer = BurstCoalescer(answer, window=COALESCE_WINDOW, max_wait=COALESCE_MAX_WAIT)
 
 @client.event
 async def on_message(message):
     """Event handler for when a message is sent in a channel the bot can see."""
-    # Ignore messages sent by the bot itself
-    if message.author == client.user:
+    # Ignore messages sent by bots, including this one
+    if message.author.bot:
+        INBOUND_MESSAGES.inc("bot")
         return
 
-    # Generate and send the response
-    response_text = generate_response(message.content)
-    await message.channel.send(response_text)
+    # Admin command to reload the knowledge base without restarting the bot
+    if message.content.strip() == RELOAD_COMMAND and message.author.id in ADMIN_USER_IDS:
+        await reply_sender(message.channel, PRIORITY_ADMIN)(await reload_knowledge_base())
+        return
+
+    # Flood control: past its allowance, a user's messages are not even analysed
+    if not user_limits.take((message.channel.id, message.author.id)):
+        INBOUND_MESSAGES.inc("rate_limited")
+        return
+
+    if not COALESCE_WINDOW:
+        INBOUND_MESSAGES.inc("answered")
+        await answer(message, message.content)
+    elif coalescer.submit((message.channel.id, message.author.id), message.content, message):
+        INBOUND_MESSAGES.inc("answered")
+    else:
+        INBOUND_MESSAGES.inc("held")  # answered with the rest of its burst
 
 # --- RUN THE BOT ---
-if __name__ == "__main__":
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-    client.run(TOKEN)
 
+def run():
+    """Connects to Discord and serves messages until the client stops."""
+    # Only running the bot needs a token; importing this module (tools, tests) does not.
+    if not TOKEN:
+        logging.error("FATAL: DISCORD_TOKEN environment variable not set.")
+        shutdown_logging()
+        exit()
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT, METRICS_HOST)
+    try:
+        client.run(TOKEN)
+    finally:
+        dispatcher.shutdown()
+        shutdown_logging()
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,120 @@
+"""
+gazetteer.py
+
+A phrase index for entity extraction (roles, technologies).
+
+Every phrase the entity patterns can match, plus every skill listed in
+knowledge_base.role_skill_map, is stored in one trie. The trie is compiled into
+a single regex so extraction is one left-to-right pass over the message in C,
+whatever the size of the vocabulary. At each position the longest phrase wins,
+so "react native" is reported instead of both "react" and "react native".
+"""
+
+import re
+
+from pattern_analysis import build_trie_regex, expand_literals
+from regex_safety import chunk_text
+
+# A phrase may start where a word starts, or anywhere if it begins with a
+# symbol (".net"). Likewise it must end where a word ends, or anywhere if it
+# ends with a symbol ("c++"). This is \b, generalised to phrases with symbols.
+_START_BOUNDARY = r"(?:(?<!\w)(?=\w)|(?=\W))"
+_END_BOUNDARY = r"(?:(?<=\w)(?!\w)|(?<=\W))"
+
+
+class Gazetteer:
+    """Longest-match, boundary-aware phrase extractor."""
+
+    def __init__(self):
+        self.phrases = {}      # phrase -> entity type
+        self.fallback = []     # (entity type, regex) for open-ended patterns
+        self.scanner_pattern = None
+        self._scanner = None
+        self._fallback_compiled = None
+
+    def __getstate__(self):
+        # The regexes are recompiled after unpickling.
+        state = self.__dict__.copy()
+        state["_scanner"] = state["_fallback_compiled"] = None
+        return state
+
+    def add_phrase(self, phrase: str, entity_type: str):
+        """Registers a literal phrase. The first entity type registered for a phrase wins."""
+        phrase = phrase.strip().lower()
+        if phrase and phrase not in self.phrases:
+            self.phrases[phrase] = entity_type
+            self.scanner_pattern = self._scanner = None
+
+    def add_pattern(self, pattern: str, entity_type: str):
+        """Registers every phrase a regex can match, or keeps it as a regex if it is open-ended."""
+        phrases = expand_literals(pattern, re.IGNORECASE)
+        if phrases is None:
+            self.fallback.append((entity_type, pattern))
+            self._fallback_compiled = None
+            return
+        for phrase in sorted(phrases):
+            self.add_phrase(phrase, entity_type)
+
+    def compile(self):
+        """Builds the scanning regex and compiles the fallback patterns. Called lazily on first use after any change."""
+        if self.scanner_pattern is None:
+            if self.phrases:
+                trie = build_trie_regex(self.phrases)
+                self.scanner_pattern = _START_BOUNDARY + "(" + trie + ")" + _END_BOUNDARY
+            else:
+                self.scanner_pattern = r"(?!)"
+        self._scanner = re.compile(self.scanner_pattern)
+        self._fallback_compiled = [(entity_type, re.compile(pattern, re.IGNORECASE))
+                                   for entity_type, pattern in self.fallback]
+        return self._scanner
+
+    @property
+    def is_compiled(self) -> bool:
+        return self._scanner is not None and self._fallback_compiled is not None
+
+    def extract(self, message: str, spans: list = None, chunk_size: int = None) -> dict:
+        """
+        Returns {entity type: [phrases]} in order of first appearance, without duplicates.
+        If `spans` is given, the (start, end) offset of every match is appended to it.
+        The trie scan is linear; open-ended fallback patterns are run on pieces of
+        at most `chunk_size` characters, so they cannot backtrack over the whole text.
+        """
+        scanner = self._scanner if self.is_compiled else self.compile()
+        message_lower = message.lower()
+
+        detected = {}
+        for match in scanner.finditer(message_lower):
+            phrase = match.group(1)
+            if spans is not None:
+                spans.append(match.span(1))
+            found = detected.setdefault(self.phrases[phrase], [])
+            if phrase not in found:
+                found.append(phrase)
+
+        chunks = chunk_text(message_lower, chunk_size) if chunk_size and self.fallback else [message_lower]
+        for entity_type, pattern in self._fallback_compiled:
+            offset = 0
+            for chunk in chunks:
+                for match in pattern.finditer(chunk):
+                    phrase = match.group(0).strip()
+                    if spans is not None:
+                        spans.append((offset + match.start(), offset + match.end()))
+                    found = detected.setdefault(entity_type, [])
+                    if phrase and phrase not in found:
+                        found.append(phrase)
+                offset += len(chunk)
+        return detected
+
+
+def build_gazetteer(entity_patterns: dict, role_skill_map: dict) -> Gazetteer:
+    """Builds the gazetteer from the entity patterns and every skill in the role map."""
+    gazetteer = Gazetteer()
+    for entity_type, patterns in entity_patterns.items():
+        for pattern in patterns:
+            gazetteer.add_pattern(pattern, entity_type)
+    for role_data in role_skill_map.values():
+        for skills in role_data["skills"].values():
+            for skill in skills:
+                gazetteer.add_phrase(skill, "technology")
+    gazetteer.compile()
+    return gazetteer
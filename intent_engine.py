@@ -0,0 +1,151 @@
+"""
+intent_engine.py
+
+A compiled intent classifier built once from knowledge_base.intent_patterns.
+
+Instead of running every weighted pattern over every message, the engine scans
+the message a single time with a trie-shaped regex made of the literal words
+each pattern must start with. Only patterns whose keywords were actually seen
+are then run to count their matches, so the scores (and therefore the intent
+ranking) are exactly the same as running every pattern, but the cost per
+message depends on what the user wrote rather than on how many intents exist.
+
+Compiled regexes are not pickled: an engine loaded from a knowledge base
+snapshot compiles them again, all at once with compile() or one by one on
+first use.
+"""
+
+import re
+import time
+
+from pattern_analysis import build_trie_regex, literal_prefixes
+
+
+class IntentEngine:
+    """Scores and ranks intents for a message using the weighted intent patterns."""
+
+    def __init__(self, intent_patterns: dict, flags: int = re.IGNORECASE):
+        self.flags = flags
+        self.intents = list(intent_patterns)
+
+        # Flat rule list in declaration order: (intent, pattern, weight)
+        self.rules = [
+            (intent, pattern, weight)
+            for intent, patterns in intent_patterns.items()
+            for pattern, weight in patterns
+        ]
+        # The position of each rule in its intent's pattern list, a short stable name for it.
+        self.rule_numbers = [number for patterns in intent_patterns.values() for number in range(len(patterns))]
+
+        # Rules without a derivable keyword set must always run.
+        self.always_run = []
+        keyword_rules = {}
+        for rule_id, (intent, pattern, weight) in enumerate(self.rules):
+            prefixes = literal_prefixes(pattern, flags)
+            if prefixes is None:
+                self.always_run.append(rule_id)
+                continue
+            for prefix in prefixes:
+                keyword_rules.setdefault(prefix, set()).add(rule_id)
+
+        # The scanner reports the longest keyword at each position. Any shorter
+        # keyword matching at that position is necessarily a prefix of it, so
+        # precompute the rules implied by each keyword and its own prefixes.
+        self.keyword_rules = {
+            keyword: frozenset().union(*(
+                rule_ids for other, rule_ids in keyword_rules.items() if keyword.startswith(other)
+            ))
+            for keyword in keyword_rules
+        }
+        self.scanner_pattern = "(?=(" + build_trie_regex(keyword_rules) + "))" if keyword_rules else None
+
+        self._compiled_rules = [None] * len(self.rules)
+        self._scanner = None
+
+    def __getstate__(self):
+        # Compiled regexes are rebuilt by compile() (or on first use) after unpickling.
+        state = self.__dict__.copy()
+        state["_compiled_rules"] = [None] * len(self.rules)
+        state["_scanner"] = None
+        return state
+
+    def rule_pattern(self, rule_id: int) -> re.Pattern:
+        """Returns the compiled regex of a rule, compiling it on first use."""
+        compiled = self._compiled_rules[rule_id]
+        if compiled is None:
+            compiled = self._compiled_rules[rule_id] = re.compile(self.rules[rule_id][1], self.flags)
+        return compiled
+
+    def compile(self):
+        """Compiles every rule and the keyword scanner, so no message pays for it."""
+        for rule_id in range(len(self.rules)):
+            self.rule_pattern(rule_id)
+        if self.scanner_pattern is not None and self._scanner is None:
+            self._scanner = re.compile(self.scanner_pattern)
+        return self
+
+    @property
+    def is_compiled(self) -> bool:
+        return None not in self._compiled_rules and (self.scanner_pattern is None or self._scanner is not None)
+
+    @property
+    def compiled(self) -> dict:
+        """Same structure the bot has always exposed: intent -> [(compiled, weight)]"""
+        compiled = {intent: [] for intent in self.intents}
+        for rule_id, (intent, _, weight) in enumerate(self.rules):
+            compiled[intent].append((self.rule_pattern(rule_id), weight))
+        return compiled
+
+    def candidate_rules(self, message_lower: str) -> list:
+        """Returns the ids of the rules that can possibly match, in declaration order."""
+        # Unicode case folding can match ASCII keywords from non-ASCII text
+        # (e.g. 'ſ' and 's'), so only trust the keyword scan for ASCII input.
+        if self.scanner_pattern is None or not message_lower.isascii():
+            return range(len(self.rules))
+        if self._scanner is None:
+            self._scanner = re.compile(self.scanner_pattern)
+
+        candidates = set(self.always_run)
+        seen = set()
+        for match in self._scanner.finditer(message_lower):
+            keyword = match.group(1)
+            if keyword not in seen:
+                seen.add(keyword)
+                candidates |= self.keyword_rules[keyword]
+        return sorted(candidates)
+
+    def scores(self, message: str, timings: list = None, deadline: float = None) -> dict:
+        """
+        Returns {intent: score} for every intent with a positive score, in declaration order.
+        If `timings` is given, (rule id, seconds, number of matches) is appended to it
+        for every rule that was run. Once time.perf_counter() passes `deadline`, the
+        remaining rules are skipped and the partial scores are returned.
+        """
+        message_lower = message.lower()
+        scores = {}
+        for rule_id in self.candidate_rules(message_lower):
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            if timings is None:
+                matches = self.rule_pattern(rule_id).findall(message_lower)
+            else:
+                pattern = self.rule_pattern(rule_id)
+                started = time.perf_counter()
+                matches = pattern.findall(message_lower)
+                timings.append((rule_id, time.perf_counter() - started, len(matches)))
+            if matches:
+                intent, _, weight = self.rules[rule_id]
+                scores[intent] = scores.get(intent, 0) + weight * len(matches)
+
+        # Keep the declaration order so ties rank the same way they always have.
+        return {intent: scores[intent] for intent in self.intents if intent in scores}
+
+    def rank_scores(self, scores: dict) -> list:
+        """Sorts intents by score in descending order, ties in declaration order."""
+        ordered = [intent for intent in self.intents if intent in scores]
+        return sorted(ordered, key=lambda k: scores[k], reverse=True)
+
+    def rank(self, message: str, timings: list = None, deadline: float = None) -> list:
+        """Returns the detected intents sorted by score in descending order."""
+        scores = self.scores(message, timings, deadline)
+        return sorted(scores.keys(), key=lambda k: scores[k], reverse=True)
@@ -4,7 +4,7 @@ knowledge_base.py
 This file contains all the data and "knowledge" for the IT Career Consultant Bot.
 By separating the data from the logic, we can easily update and expand the bot's
 capabilities without changing the core application code in bot.py.
-VERSION 2.6 - Added Goodbye Intent
+VERSION 2.8 - Added Role Aliases and Career Transitions
 """
 
 # 1. Intent Keywords: Words or phrases that map to a user's intention.
@@ -30,6 +30,28 @@ intent_patterns = {
          r'(?:technical|hard|soft)\s+skills?|necessary\s+skills?|what\s+(?:does\s+it\s+take|is\s+needed)|'
          r'learn\s+to\s+become|study\s+to\s+become|training\s+for)(?:\b|$)', 3)
     ],
+    # Only considered for messages that name a role (see nlu.ROLE_INTENTS), so
+    # "I moved from Jakarta to Bandung" does not count as a career move.
+    "career_transition": [
+        # Moving from one role to another ("switch from data analyst to ml engineer")
+        (r'(?:\b|^)(?:switch(?:ing)?|transition(?:ing)?|mov(?:e|ing)|pivot(?:ing)?|go(?:ing)?|'
+         r'chang(?:e|ing)\s+(?:careers?|jobs?|roles?))\s+from(?:\b|$)', 5),
+
+        # "from <role> to <role>"
+        (r'(?:\b|^)from\s+(?:an?\s+)?\w+(?:[\s/-]+\w+){0,3}\s+(?:to|into)(?:\b|$)', 3),
+
+        # "can a data analyst become a data scientist?"
+        (r'(?:\b|^)(?:can|could|should|would)\s+an?\s+\w+(?:[\s/-]+\w+){0,3}\s+'
+         r'(?:become|switch\s+to|move\s+(?:in)?to)(?:\b|$)', 2),
+
+        # Questions about the distance between two roles
+        (r'(?:\b|^)(?:career\s+(?:switch|change|transition)|role\s+change|skills?\s+gap|'
+         r'gap\s+between|what\s+(?:else\s+)?(?:do\s+I|would\s+I|I\s+need\s+to)\s+learn\s+to\s+move)(?:\b|$)', 3),
+
+        # The user's current role ("I'm a data analyst, how do I become ...")
+        (r'(?:\b|^)(?:(?:i\'?m|i\s+am)\s+(?:currently\s+|now\s+)?(?:an?|working\s+as)|'
+         r'currently\s+(?:an?|working\s+as)|i\s+work\s+as)(?:\b|$)', 1)
+    ],
     "role_suggestion": [
         # Direct questions about career options (more comprehensive)
         (r'(?:\b|^)(?:what\s+(?:can|should|could)\s+I\s+(?:be(?:come)?|do|pursue)|'
@@ -128,7 +150,7 @@ entity_patterns = {
         r"\b(game developer|ar/vr developer)\b",
         r"\b(embedded systems engineer|blockchain developer|robotics engineer)\b",
         # Data Roles
-        r"\b(data scientist|data analyst|ml engineer|ai engineer|bi developer|ai researcher)\b",
+        r"\b(data scientist|data analyst|machine learning engineer|ml engineer|ai engineer|bi developer|ai researcher)\b",
         # Operations & Infrastructure Roles
         r"\b(devops?|site reliability|sre|cloud|network|hardware) engineer\b",
         r"\b(database administrator|dba|system administrator|sysadmin)\b",
@@ -249,3 +271,36 @@ role_skill_map = {
         "skills": {"tools": ["markdown", "git", "confluence"], "concepts": ["api documentation", "instructional design"], "soft_skills": ["clarity", "attention to detail", "communication"]}}
 }
 
+# 5. Skill Category Weights: How much a skill counts towards a role match, by the
+# category it is listed under in role_skill_map. Categories not listed count 1.0.
+skill_category_weights = {
+    "soft_skills": 0.5,
+    "business": 0.5,
+    "certifications": 0.5,
+    "compliance": 0.5,
+    "principles": 0.75,
+    "concepts": 0.75,
+    "core_concepts": 0.75,
+}
+
+# 6. Role Aliases: Other names for the roles in role_skill_map, so the role
+# phrases users write (see entity_patterns) resolve to a role. Display names
+# and role ids resolve without one; case, spaces, "-", "_" and "." are ignored
+# ("Full-Stack Developer" and "full_stack_developer" are the same name).
+role_aliases = {
+    "ml engineer": "machine_learning_engineer",
+    "ai engineer": "machine_learning_engineer",
+    "fullstack developer": "full_stack_developer",
+    "full/stack developer": "full_stack_developer",
+    "android developer": "mobile_developer",
+    "ios developer": "mobile_developer",
+    "devop engineer": "devops_engineer",
+    "sre engineer": "site_reliability_engineer",
+    "site reliability engineer": "site_reliability_engineer",
+    "dba": "database_administrator",
+    "sysadmin": "system_administrator",
+    "pen tester": "penetration_tester",
+    "ethical hacker": "penetration_tester",
+    "information security analyst": "cybersecurity_analyst",
+    "test automation engineer": "qa_engineer",
+}
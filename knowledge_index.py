@@ -0,0 +1,337 @@
+"""
+knowledge_index.py
+
+Everything the bot derives from knowledge_base.py, built together as one
+immutable KnowledgeIndex and versioned by a content hash.
+
+Building the index compiles and analyses every pattern, expands the entity
+patterns into the gazetteer and builds the role/skill matrix. To avoid paying
+that on every restart and in every worker process, the index can be saved as
+an on-disk snapshot:
+
+    snapshots/kb-<version>.pkl          pickled index (regexes are stored as
+                                         strings and compiled on load)
+    snapshots/kb-<version>.matrices.npy  role/skill weight matrix, memory-mapped
+
+<version> hashes the knowledge base content together with the source of the
+modules that build the index, so a snapshot is rebuilt only when either changes.
+
+Usage:
+    python knowledge_index.py            # build (or refresh) the snapshot and report timings
+"""
+
+import os
+import sys
+import copy
+import glob
+import json
+import time
+import pickle
+import hashlib
+import logging
+import importlib.util
+import re
+
+import numpy as np
+
+import knowledge_base
+from intent_engine import IntentEngine
+from gazetteer import build_gazetteer
+from fuzzy_matcher import FuzzyMatcher
+from role_matcher import RoleMatcher
+from role_cards import RoleCards
+from role_transitions import RoleGapIndex
+from pattern_analysis import backtracking_risks
+
+# Bump when the snapshot layout changes in a way the source hash cannot see.
+SNAPSHOT_FORMAT = 1
+
+DEFAULT_SNAPSHOT_DIR = os.getenv("KB_SNAPSHOT_DIR", "snapshots")
+
+# Modules whose code shapes the index; editing any of them invalidates snapshots.
+_BUILDER_MODULES = (
+    "knowledge_index", "intent_engine", "gazetteer", "pattern_analysis", "role_matcher", "fuzzy_matcher",
+    "role_cards", "role_transitions",
+)
+
+
+def knowledge_fingerprint(kb=knowledge_base) -> str:
+    """Returns a short content hash of the knowledge base data."""
+    payload = json.dumps(
+        [kb.intent_patterns, kb.entity_patterns, kb.simple_responses,
+         kb.role_skill_map, kb.skill_category_weights, getattr(kb, "role_aliases", {})],
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _builder_source_hash() -> str:
+    digest = hashlib.sha256(str(SNAPSHOT_FORMAT).encode("ascii"))
+    for name in _BUILDER_MODULES:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), name + ".py")
+        with open(path, "rb") as handle:
+            digest.update(handle.read())
+    return digest.hexdigest()[:8]
+
+
+def load_knowledge_module(path: str = None):
+    """
+    Executes knowledge_base.py from disk into a fresh module object, leaving the
+    imported knowledge_base module untouched (so a broken edit cannot half-apply).
+    """
+    path = path or knowledge_base.__file__
+    spec = importlib.util.spec_from_file_location("knowledge_base", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def validate_knowledge_base(kb):
+    """Raises ValueError if the knowledge base is missing data or malformed."""
+    for name in ("intent_patterns", "entity_patterns", "simple_responses", "role_skill_map", "skill_category_weights"):
+        if not isinstance(getattr(kb, name, None), dict):
+            raise ValueError(f"knowledge_base.{name} is missing or not a dict")
+    for intent, patterns in kb.intent_patterns.items():
+        for entry in patterns:
+            if not (isinstance(entry, tuple) and len(entry) == 2 and isinstance(entry[0], str)
+                    and isinstance(entry[1], (int, float))):
+                raise ValueError(f"intent_patterns['{intent}'] entries must be (pattern, weight) tuples")
+    for entity_type, patterns in kb.entity_patterns.items():
+        if not all(isinstance(pattern, str) for pattern in patterns):
+            raise ValueError(f"entity_patterns['{entity_type}'] must be a list of pattern strings")
+    for role_id, role_data in kb.role_skill_map.items():
+        for field in ("display_name", "description", "skills"):
+            if field not in role_data:
+                raise ValueError(f"role_skill_map['{role_id}'] has no '{field}'")
+        for category, skills in role_data["skills"].items():
+            if not isinstance(skills, list) or not all(isinstance(skill, str) for skill in skills):
+                raise ValueError(f"role_skill_map['{role_id}']['skills']['{category}'] must be a list of strings")
+    role_aliases = getattr(kb, "role_aliases", {})  # optional
+    if not isinstance(role_aliases, dict):
+        raise ValueError("knowledge_base.role_aliases is not a dict")
+    for alias, role_id in role_aliases.items():
+        if role_id not in kb.role_skill_map:
+            raise ValueError(f"role_aliases['{alias}'] names unknown role '{role_id}'")
+
+
+def normalize_role_name(name: str) -> str:
+    """The form role names are looked up in: lowercase, with runs of spaces, "-", "_" and "." as one space."""
+    return re.sub(r"[\s_.-]+", " ", name.lower()).strip()
+
+
+def build_role_names(role_skill_map: dict, role_aliases: dict) -> dict:
+    """Maps every normalized role id, display name and alias to its role id."""
+    names = {}
+    for role_id, role_data in role_skill_map.items():
+        names[normalize_role_name(role_id)] = role_id
+        names.setdefault(normalize_role_name(role_data["display_name"]), role_id)
+    for alias, role_id in role_aliases.items():
+        names[normalize_role_name(alias)] = role_id
+    return names
+
+
+def _role_skills(role_skill_map: dict, role_id: str) -> set:
+    return {skill for skills in role_skill_map[role_id]["skills"].values() for skill in skills}
+
+
+def _all_skills(role_skill_map: dict) -> set:
+    return {skill for role_id in role_skill_map for skill in _role_skills(role_skill_map, role_id)}
+
+
+class KnowledgeIndex:
+    """
+    All structures derived from one version of the knowledge base.
+
+    When `previous` is given, parts whose source data did not change are reused
+    and the role gaps are only recomputed for the roles that changed.
+    """
+
+    def __init__(self, kb=knowledge_base, previous=None):
+        self.version = knowledge_fingerprint(kb)
+
+        # The source data the indexes were built from, so answers never mix versions.
+        self.intent_patterns = copy.deepcopy(kb.intent_patterns)
+        self.entity_patterns = copy.deepcopy(kb.entity_patterns)
+        self.role_skill_map = copy.deepcopy(kb.role_skill_map)
+        self.simple_responses = copy.deepcopy(kb.simple_responses)
+        self.skill_category_weights = copy.deepcopy(kb.skill_category_weights)
+        self.role_aliases = copy.deepcopy(getattr(kb, "role_aliases", {}))
+
+        same_intents = previous is not None and previous.intent_patterns == self.intent_patterns
+        same_roles = previous is not None and previous.role_skill_map == self.role_skill_map
+        same_entities = (
+            previous is not None
+            and previous.entity_patterns == self.entity_patterns
+            and _all_skills(previous.role_skill_map) == _all_skills(self.role_skill_map)
+        )
+
+        # Compile all intent patterns into a single-pass engine for efficiency
+        self.intent_engine = previous.intent_engine if same_intents else IntentEngine(kb.intent_patterns)
+        # Index every entity phrase and known skill for single-pass entity extraction
+        self.gazetteer = previous.gazetteer if same_entities else build_gazetteer(kb.entity_patterns, kb.role_skill_map)
+        # Typo-tolerant fallback over the same phrases, for words the gazetteer missed
+        self.fuzzy_matcher = previous.fuzzy_matcher if same_entities else FuzzyMatcher(self.gazetteer.phrases)
+        # Role x skill matrix used to score every role against the user's skills at once.
+        if same_roles and previous.skill_category_weights == self.skill_category_weights:
+            self.role_matcher = previous.role_matcher
+        else:
+            self.role_matcher = RoleMatcher(kb.role_skill_map, kb.skill_category_weights)
+        # Role answers rendered once, so the role handlers only look them up.
+        self.role_cards = previous.role_cards if same_roles else RoleCards(self.role_skill_map)
+        # Every name a role goes by (id, display name, aliases), for resolving role entities.
+        if same_roles and previous.role_aliases == self.role_aliases:
+            self.role_names = previous.role_names
+        else:
+            self.role_names = build_role_names(self.role_skill_map, self.role_aliases)
+        # Skill gaps and routes between every two roles, only recomputed for the roles that changed.
+        if same_roles and previous.skill_category_weights == self.skill_category_weights:
+            self.role_gaps = previous.role_gaps
+        else:
+            self.role_gaps = RoleGapIndex(self.role_skill_map, self.skill_category_weights,
+                                          previous=previous.role_gaps if previous is not None else None)
+
+    def resolve_role(self, name: str):
+        """The role id a role entity (e.g. "ML engineer") refers to, or None."""
+        return self.role_names.get(normalize_role_name(name))
+
+    def compile(self):
+        """
+        Compiles every intent rule, the intent keyword scanner and the gazetteer,
+        so the first messages do not spend their time budget compiling regexes.
+        """
+        self.intent_engine.compile()
+        if not self.gazetteer.is_compiled:
+            self.gazetteer.compile()
+        return self
+
+    def validate(self):
+        """Compiles every pattern and runs a smoke test. Raises ValueError on failure."""
+        try:
+            self.compile()
+        except re.error as error:
+            raise ValueError(f"invalid pattern in the knowledge base: {error}") from error
+        patterns = [pattern for _, pattern, _ in self.intent_engine.rules]
+        patterns += [pattern for entries in self.entity_patterns.values() for pattern in entries]
+        for pattern in patterns:
+            for severity, description in backtracking_risks(pattern, re.IGNORECASE):
+                if severity == "exponential":
+                    raise ValueError(f"pattern '{pattern[:80]}' is unsafe: {description}")
+        self.intent_engine.rank("hi, what skills do I need to become a devops engineer?")
+        self.gazetteer.extract("I know python, c++ and react native")
+        for intent in self.intent_patterns:
+            if intent in self.simple_responses and not self.simple_responses[intent]:
+                raise ValueError(f"simple_responses['{intent}'] is empty")
+
+
+# --- SNAPSHOTS ---
+
+def snapshot_key(kb=knowledge_base) -> str:
+    """Identifies the snapshot for a knowledge base and the current builder code."""
+    return f"{knowledge_fingerprint(kb)}-{_builder_source_hash()}"
+
+
+def _snapshot_paths(snapshot_dir: str, key: str) -> tuple:
+    base = os.path.join(snapshot_dir, f"kb-{key}")
+    return base + ".pkl", base + ".matrices.npy"
+
+
+def save_snapshot(index: KnowledgeIndex, snapshot_dir: str = DEFAULT_SNAPSHOT_DIR, key: str = None) -> str:
+    """Writes the index to disk atomically and removes snapshots of other versions."""
+    key = key or snapshot_key()
+    os.makedirs(snapshot_dir, exist_ok=True)
+    pickle_path, matrices_path = _snapshot_paths(snapshot_dir, key)
+
+    # The matrices go to a .npy file so they can be memory-mapped on load.
+    stored = copy.copy(index)
+    stored.role_matcher = copy.copy(index.role_matcher)
+    stored.role_matcher.weights = None
+
+    temp_suffix = f".tmp-{os.getpid()}"
+    with open(matrices_path + temp_suffix, "wb") as handle:
+        np.save(handle, index.role_matcher.weights)
+    with open(pickle_path + temp_suffix, "wb") as handle:
+        pickle.dump(stored, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(matrices_path + temp_suffix, matrices_path)
+    os.replace(pickle_path + temp_suffix, pickle_path)
+
+    for path in glob.glob(os.path.join(snapshot_dir, "kb-*")):
+        if not os.path.basename(path).startswith(f"kb-{key}.") and ".tmp-" not in path:
+            os.remove(path)
+    return pickle_path
+
+
+def load_snapshot(snapshot_dir: str = DEFAULT_SNAPSHOT_DIR, key: str = None):
+    """Loads the snapshot for the current knowledge base, or returns None if there is none."""
+    key = key or snapshot_key()
+    pickle_path, matrices_path = _snapshot_paths(snapshot_dir, key)
+    if not (os.path.exists(pickle_path) and os.path.exists(matrices_path)):
+        return None
+    try:
+        with open(pickle_path, "rb") as handle:
+            index = pickle.load(handle)
+        matrices = np.load(matrices_path, mmap_mode="r")
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError, ImportError) as error:
+        logging.warning(f"Ignoring unreadable knowledge base snapshot {pickle_path}: {error}")
+        return None
+    expected = (len(index.role_matcher.role_ids), len(index.role_matcher.skills))
+    if matrices.shape != expected:
+        logging.warning(f"Ignoring knowledge base snapshot {matrices_path}: matrix is {matrices.shape}, expected {expected}")
+        return None
+    index.role_matcher.weights = matrices
+    return index
+
+
+def load_index(snapshot_dir: str = DEFAULT_SNAPSHOT_DIR) -> KnowledgeIndex:
+    """
+    Returns the index for the current knowledge base: from the snapshot when it
+    is up to date, otherwise built from scratch (and saved for next time).
+    Either way its regexes are compiled before it is returned.
+    Pass an empty snapshot_dir to always build in memory.
+    """
+    started = time.perf_counter()
+    if snapshot_dir:
+        key = snapshot_key()
+        index = load_snapshot(snapshot_dir, key)
+        if index is not None:
+            index.compile()
+            logging.info(f"Knowledge index {key} loaded from snapshot in {(time.perf_counter() - started) * 1000:.1f} ms.")
+            return index
+
+    index = KnowledgeIndex().compile()
+    logging.info(f"Knowledge index {index.version} built in {(time.perf_counter() - started) * 1000:.1f} ms.")
+    if snapshot_dir:
+        try:
+            save_snapshot(index, snapshot_dir, key)
+        except OSError as error:
+            logging.warning(f"Could not save the knowledge base snapshot: {error}")
+    return index
+
+
+def main() -> int:
+    # Pickle the classes under their importable module name, not __main__.
+    import knowledge_index
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    snapshot_dir = DEFAULT_SNAPSHOT_DIR or "snapshots"
+
+    started = time.perf_counter()
+    index = knowledge_index.KnowledgeIndex()
+    built_ms = (time.perf_counter() - started) * 1000
+    path = knowledge_index.save_snapshot(index, snapshot_dir)
+
+    started = time.perf_counter()
+    loaded = knowledge_index.load_snapshot(snapshot_dir)
+    loaded_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    loaded.compile()
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    print(f"Snapshot written to {path}")
+    print(f"Build from source:   {built_ms:8.1f} ms")
+    print(f"Load from snapshot:  {loaded_ms:8.1f} ms")
+    print(f"Compile after load:  {compile_ms:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
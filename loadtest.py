@@ -0,0 +1,308 @@
+"""
+loadtest.py
+
+End-to-end load test of the bot without Discord: no token, no network.
+
+Stand-ins for discord.py's objects (users, channels, messages and a gateway
+that dispatches each message to bot.on_message in its own task, like
+discord.py does) replay a message mix from simulated users in simulated
+channels. The whole path runs as in production: flood control, burst
+coalescing, the response dispatcher (inline, thread or process mode), the
+send scheduler's rate limits and the reply splitting. Sends are recorded by the
+fake channels after a simulated API latency.
+
+Messages arrive at random (Poisson) at a fixed rate, whether or not the bot
+keeps up, so an overloaded bot shows up as growing latency. Reported:
+  - replies per second and the messages that got no reply of their own
+    (merged into a burst, rate limited, shed or still queued at the end)
+  - latency from on_message to the first part of the reply (p50/p95/p99/max)
+  - event-loop lag: how late a 10 ms timer on the bot's loop fires
+
+The bot's settings come from the environment and .env as usual; --set
+overrides them for the run (e.g. to lift the per-user limits).
+
+Usage:
+    python loadtest.py                                    # 50 msg/s for 10 s, 200 users in 100 channels
+    python loadtest.py --rate 200 --duration 30 --mode process --workers 4
+    python loadtest.py --mix questions=5,smalltalk=3,followups=1,long=1
+    python loadtest.py --messages messages.txt --set USER_MESSAGES_PER_MINUTE=600
+    python loadtest.py --output results.json --max-p99-ms 250   # exit 1 if the p99 latency is higher
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import itertools
+
+from metrics import REGISTRY
+
+SMALL_TALK = ["hi", "hello there!", "thanks a lot", "can you help me?", "bye"]
+FOLLOW_UPS = ["tell me more about the first one", "and the second one?", "what about the last one", "tell me more"]
+DEFAULT_MIX = "questions=6,smalltalk=2,followups=1,long=1"
+
+
+# --- FAKE DISCORD OBJECTS ---
+
+class FakeUser:
+    """The parts of discord.User the bot uses."""
+
+    def __init__(self, user_id: int, bot: bool = False):
+        self.id = user_id
+        self.bot = bot
+        self.name = f"user-{user_id}"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeChannel:
+    """A text channel whose send() takes `send_latency` seconds, like an API call."""
+
+    def __init__(self, channel_id: int, send_latency: float = 0.0):
+        self.id = channel_id
+        self.name = f"channel-{channel_id}"
+        self.send_latency = send_latency
+        self.sent = 0
+
+    async def send(self, content: str):
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        self.sent += 1
+
+
+class _ReplyChannel:
+    """What a FakeMessage exposes as .channel: its channel, plus a record of the replies sent to it."""
+
+    def __init__(self, channel: FakeChannel, message):
+        self.channel = channel
+        self.message = message
+        self.id = channel.id
+        self.name = channel.name
+
+    async def send(self, content: str):
+        await self.channel.send(content)
+        if self.message.first_reply_at is None:
+            self.message.first_reply_at = time.perf_counter()
+        self.message.reply_parts += 1
+
+
+class FakeMessage:
+    """The parts of discord.Message the bot uses, and when it was delivered and answered."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, content: str, author: FakeUser, channel: FakeChannel):
+        self.id = next(self._ids)
+        self.content = content
+        self.author = author
+        self.channel = _ReplyChannel(channel, self)
+        self.received_at = None
+        self.first_reply_at = None
+        self.reply_parts = 0
+
+
+class FakeGateway:
+    """Delivers messages to an on_message coroutine function, one task per event like discord.py."""
+
+    def __init__(self, on_message):
+        self.on_message = on_message
+        self.tasks = set()
+
+    def deliver(self, message: FakeMessage):
+        message.received_at = time.perf_counter()
+        task = asyncio.get_running_loop().create_task(self.on_message(message))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+
+# --- LOAD GENERATION ---
+
+def build_mix(spec: str, messages_path: str = None) -> tuple:
+    """Returns ([message lists], [weights]) for a 'class=weight,...' spec, or for a file of messages."""
+    if messages_path:
+        with open(messages_path, encoding="utf-8") as handle:
+            messages = [line.strip() for line in handle if line.strip()]
+        if not messages:
+            raise ValueError(f"{messages_path} has no messages")
+        return [messages], [1.0]
+
+    import benchmark
+    classes = {
+        "questions": [message for message in benchmark.SAMPLE_MESSAGES if message not in SMALL_TALK],
+        "smalltalk": SMALL_TALK,
+        "followups": FOLLOW_UPS,
+        "long": benchmark.adversarial_messages(2000),
+    }
+    pools, weights = [], []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in classes:
+            raise ValueError(f"Unknown message class '{name.strip()}'. Expected one of {sorted(classes)}.")
+        pools.append(classes[name.strip()])
+        weights.append(float(weight or 1))
+    return pools, weights
+
+
+async def _monitor_loop_lag(lags: list, stop: asyncio.Event, interval: float = 0.01):
+    """Records how late a timer of `interval` seconds fires on this loop."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - started - interval))
+
+
+def _bot_idle(bot) -> bool:
+    stats = bot.scheduler.stats()
+    return bot.dispatcher.pending == 0 and len(bot.coalescer) == 0 and not stats["queued"] and not stats["sending"]
+
+
+async def run_load(bot, rate: float, duration: float, users: int, channels: int, pools: list, weights: list,
+                   send_latency: float = 0.0, warmup: int = 20, drain: float = 10.0, seed: int = 7) -> dict:
+    """Fires messages at bot.on_message for `duration` seconds and summarises what happened."""
+    rng = random.Random(seed)
+    fake_channels = [FakeChannel(1000 + number, send_latency) for number in range(channels)]
+    fake_users = [FakeUser(100000 + number) for number in range(users)]
+    gateway = FakeGateway(bot.on_message)
+
+    # Warm up (process workers start, caches fill) with users that take no part in the run.
+    for number in range(warmup):
+        message = FakeMessage(rng.choice(rng.choices(pools, weights)[0]), FakeUser(number + 1), fake_channels[0])
+        gateway.deliver(message)
+        await asyncio.gather(*gateway.tasks)
+    deadline = time.perf_counter() + drain
+    while not _bot_idle(bot) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+    inbound = REGISTRY.metrics["bot_inbound_messages_total"]
+    inbound_before = dict(inbound.values)
+
+    lags, stop = [], asyncio.Event()
+    monitor = asyncio.get_running_loop().create_task(_monitor_loop_lag(lags, stop))
+    messages = []
+    started = time.perf_counter()
+    next_at = started
+    while True:
+        next_at += rng.expovariate(rate)
+        if next_at - started >= duration:
+            break
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        user_number = rng.randrange(users)
+        message = FakeMessage(rng.choice(rng.choices(pools, weights)[0]),
+                              fake_users[user_number], fake_channels[user_number % channels])
+        messages.append(message)
+        gateway.deliver(message)
+    sending_ended = time.perf_counter()
+
+    # Let the bot finish what it accepted (bursts still held, replies queued for a send slot).
+    deadline = sending_ended + drain
+    while (gateway.tasks or not _bot_idle(bot)) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    stop.set()
+    await monitor
+    summary = summarise(messages, lags, started, sending_ended)
+    summary["inbound"] = {labels[0]: int(count - inbound_before.get(labels, 0))
+                          for labels, count in sorted(inbound.values.items())}
+    return summary
+
+
+def _percentiles(values: list, scale: float = 1000.0) -> dict:
+    from benchmark import percentile
+    values = sorted(values)
+    return {
+        "p50_ms": round(scale * percentile(values, 0.50), 2),
+        "p95_ms": round(scale * percentile(values, 0.95), 2),
+        "p99_ms": round(scale * percentile(values, 0.99), 2),
+        "max_ms": round(scale * values[-1], 2) if values else 0.0,
+    }
+
+
+def summarise(messages: list, lags: list, started: float, sending_ended: float) -> dict:
+    answered = [message for message in messages if message.first_reply_at is not None]
+    latencies = [message.first_reply_at - message.received_at for message in answered]
+    last_reply = max((message.first_reply_at for message in answered), default=sending_ended)
+    elapsed = max(last_reply, sending_ended) - started
+    return {
+        "messages": len(messages),
+        "offered_per_s": round(len(messages) / (sending_ended - started), 1),
+        "replies": len(answered),
+        "replies_per_s": round(len(answered) / elapsed, 1) if elapsed else 0.0,
+        "reply_parts": sum(message.reply_parts for message in answered),
+        "no_own_reply": len(messages) - len(answered),
+        "latency": _percentiles(latencies),
+        "loop_lag": _percentiles(lags),
+    }
+
+
+def print_summary(summary: dict, bot):
+    print(f"Messages: {summary['messages']} ({summary['offered_per_s']}/s offered), "
+          f"replies: {summary['replies']} ({summary['replies_per_s']}/s, {summary['reply_parts']} Discord messages), "
+          f"no reply of their own: {summary['no_own_reply']}")
+    for name in ("latency", "loop_lag"):
+        figures = summary[name]
+        print(f"  {name:<9} p50 {figures['p50_ms']:8.2f} ms   p95 {figures['p95_ms']:8.2f} ms   "
+              f"p99 {figures['p99_ms']:8.2f} ms   max {figures['max_ms']:8.2f} ms")
+    print(f"  inbound:   {summary['inbound']}")
+    print(f"  dispatcher: {bot.dispatcher.stats()}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load test bot.on_message end to end, without Discord.")
+    parser.add_argument("--rate", type=float, default=50.0, help="messages per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--users", type=int, default=200, help="simulated users")
+    parser.add_argument("--channels", type=int, default=100, help="simulated channels (users are spread over them)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="message classes and weights: questions, smalltalk, "
+                                                           "followups, long")
+    parser.add_argument("--messages", help="file with one message per line, used instead of --mix")
+    parser.add_argument("--mode", choices=("inline", "thread", "process"), help="EXECUTION_MODE for the run")
+    parser.add_argument("--workers", type=int, help="WORKER_COUNT for the run")
+    parser.add_argument("--send-latency-ms", type=float, default=50.0, help="simulated duration of a send call")
+    parser.add_argument("--warmup", type=int, default=20, help="messages sent before measuring")
+    parser.add_argument("--drain", type=float, default=10.0, help="seconds allowed to finish after the load stops")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a bot setting (environment variable) for this run")
+    parser.add_argument("--seed", type=int, default=7, help="random seed of the message stream")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--max-p99-ms", type=float, help="exit with status 1 if the p99 latency is higher")
+    args = parser.parse_args(argv)
+
+    # The bot reads its settings when it is imported, so they are set first.
+    os.environ.setdefault("LOG_LEVEL", "WARNING")  # the bot logs every message otherwise
+    if args.mode:
+        os.environ["EXECUTION_MODE"] = args.mode
+    if args.workers:
+        os.environ["WORKER_COUNT"] = str(args.workers)
+    for setting in args.set:
+        name, _, value = setting.partition("=")
+        os.environ[name.strip()] = value
+    import bot
+
+    pools, weights = build_mix(args.mix, args.messages)
+    try:
+        summary = asyncio.run(run_load(
+            bot, args.rate, args.duration, args.users, args.channels, pools, weights,
+            send_latency=args.send_latency_ms / 1000, warmup=args.warmup, drain=args.drain, seed=args.seed))
+    finally:
+        bot.dispatcher.shutdown()
+        bot.shutdown_logging()
+    summary["settings"] = {"rate": args.rate, "duration": args.duration, "users": args.users,
+                           "channels": args.channels, "mix": args.messages or args.mix,
+                           "mode": bot.EXECUTION_MODE, "workers": args.workers,
+                           "send_latency_ms": args.send_latency_ms, "overrides": args.set}
+    print_summary(summary, bot)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(summary, handle, indent=2)
+    if args.max_p99_ms is not None and summary["latency"]["p99_ms"] > args.max_p99_ms:
+        print(f"\np99 latency {summary['latency']['p99_ms']} ms is above {args.max_p99_ms} ms.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+metrics.py
+
+In-process metrics for the bot, served in the Prometheus text format from a
+small HTTP endpoint (http://127.0.0.1:<METRICS_PORT>/metrics).
+
+Counters and histograms are plain dicts keyed by label values, updated under a
+per-metric lock; recording a value costs about a microsecond, so the
+instrumentation stays on in production. Gauges are computed by a callback
+when the endpoint is scraped (cache sizes, queue depth, ...).
+
+Process pool workers have their own copy of every metric. They send what they
+recorded with each reply (Registry.drain) and the bot adds it to its own
+(Registry.merge), so the endpoint always shows the totals.
+"""
+
+import bisect
+import logging
+import threading
+import http.server
+
+# Latency buckets in seconds, from 50 us to 2.5 s.
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _label_text(labelnames: tuple, labels: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Registry:
+    """The set of metrics rendered by the endpoint."""
+
+    def __init__(self):
+        self.metrics = {}
+        self._unknown = set()  # names of merged metrics that are not registered here
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered.")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str):
+        self.metrics.pop(name, None)
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def drain(self) -> dict:
+        """Returns and resets the values recorded since the last drain (for worker processes)."""
+        return {name: metric.drain() for name, metric in self.metrics.items()
+                if hasattr(metric, "drain") and metric.values}
+
+    def merge(self, delta: dict):
+        """Adds values drained in another process. Metrics this process does not define are skipped (and logged once)."""
+        for name, values in delta.items():
+            metric = self.metrics.get(name)
+            if metric is not None:
+                metric.merge(values)
+            elif name not in self._unknown:
+                self._unknown.add(name)
+                logging.warning(f"Dropping values of metric '{name}', which is not registered in this process.")
+
+
+REGISTRY = Registry()
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}  # label values -> total
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def inc_many(self, amounts: dict):
+        """Adds {label values: amount} under a single lock acquisition."""
+        with self._lock:
+            for labels, amount in amounts.items():
+                self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def samples(self) -> list:
+        with self._lock:
+            values = list(self.values.items())
+        return [f"{self.name}{_label_text(self.labelnames, labels)} {value}" for labels, value in values]
+
+    def drain(self) -> dict:
+        with self._lock:
+            values, self.values = self.values, {}
+        return values
+
+    def merge(self, values: dict):
+        self.inc_many(values)
+
+
+class Histogram:
+    """Bucketed observations (count, sum and cumulative buckets) per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS,
+                 registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # label values -> [count per bucket..., count above the last bucket, sum]
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value: float, *labels):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[position] += 1
+            state[-1] += value
+
+    def samples(self) -> list:
+        with self._lock:
+            values = [(labels, list(state)) for labels, state in self.values.items()]
+        lines = []
+        for labels, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                bucket_labels = _label_text(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            cumulative += state[len(self.buckets)]
+            bucket_labels = _label_text(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, labels)} {state[-1]}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, labels)} {cumulative}")
+        return lines
+
+    def drain(self) -> dict:
+        with self._lock:
+            values, self.values = self.values, {}
+        return values
+
+    def merge(self, values: dict):
+        with self._lock:
+            for labels, other in values.items():
+                state = self.values.get(labels)
+                if state is None:
+                    self.values[labels] = list(other)
+                else:
+                    for position, amount in enumerate(other):
+                        state[position] += amount
+
+
+class Gauge:
+    """Values computed at scrape time by `function`, which returns {label values: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, function, labelnames: tuple = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        registry.register(self)
+
+    def samples(self) -> list:
+        try:
+            values = self.function()
+        except Exception as error:
+            logging.warning(f"Could not collect gauge {self.name}: {error}")
+            return []
+        return [f"{self.name}{_label_text(self.labelnames, labels)} {value}" for labels, value in values.items()]
+
+
+# --- PIPELINE METRICS ---
+
+STAGE_SECONDS = Histogram(
+    "bot_stage_seconds",
+    "Time spent in each stage of answering a message (detection, handlers, queueing, send).",
+    ("stage",),
+)
+# Defined here rather than in bot.py so the shard supervisor, which does not
+# run a Discord client, knows it and can merge the shards' counts.
+INBOUND_MESSAGES = Counter(
+    "bot_inbound_messages_total", "Messages seen, by what was done with them.", ("outcome",))
+
+
+# --- HTTP ENDPOINT ---
+
+class _MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes are not worth a log line each
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1", registry: Registry = REGISTRY):
+    """Serves the registry on http://host:port/metrics from a daemon thread."""
+    handler = type("MetricsRequestHandler", (_MetricsRequestHandler,), {"registry": registry})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logging.info(f"Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
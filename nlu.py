@@ -0,0 +1,604 @@
+"""
+nlu.py
+
+The bot's language understanding and response logic: intent detection, entity
+extraction and the handlers that turn them into replies. It has no Discord
+dependency, so it can be imported by worker processes, tools and benchmarks
+without a token; bot.py only wires it to the Discord client.
+"""
+
+import os
+import re
+import time
+import random
+import logging
+import threading
+
+from knowledge_index import (
+    DEFAULT_SNAPSHOT_DIR, KnowledgeIndex, knowledge_fingerprint, load_index,
+    load_knowledge_module, load_snapshot, save_snapshot, snapshot_key, validate_knowledge_base,
+)
+from metrics import STAGE_SECONDS, Counter, Gauge
+from regex_safety import MATCH_BUDGET_MS, MATCH_CHUNK_CHARS, MAX_MESSAGE_CHARS, chunk_text
+from response_cache import LRUTTLCache, normalize_message
+from sessions import Session
+
+# --- PRE-COMPUTATION AT STARTUP ---
+
+# Every derived structure (intent engine, gazetteer, role matrix, role gaps)
+# lives in one KnowledgeIndex, loaded from an up-to-date snapshot when possible.
+INDEX = load_index()
+KB_VERSION = INDEX.version
+
+ROLE_MATCH_METRIC = os.getenv("ROLE_MATCH_METRIC", "jaccard")  # overlap, coverage or jaccard
+
+# Typo tolerance for skills and roles, tried only on words with no exact match.
+FUZZY_MATCHING = os.getenv("FUZZY_MATCHING", "true").lower() == "true"
+FUZZY_BUDGET_MS = float(os.getenv("FUZZY_BUDGET_MS", "2"))
+
+# --- RESPONSE CACHES ---
+
+# Intent/entity analysis per normalized message. Replies picked at random from
+# simple_responses are never cached, only the analysis that selected them.
+ANALYSIS_CACHE = LRUTTLCache(
+    max_size=int(os.getenv("RESPONSE_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+)
+# Final reply text, and the roles it names, for intents whose handlers are deterministic.
+REPLY_CACHE = LRUTTLCache(
+    max_size=int(os.getenv("RESPONSE_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+)
+
+# Answers whose fuzzy pass ran out of time (e.g. a long list of skills) are cached
+# for this many seconds only: they may miss a misspelled skill, but are otherwise complete.
+DEGRADED_CACHE_TTL = float(os.getenv("DEGRADED_CACHE_TTL", "60"))
+
+# Intents answered with a random pick from simple_responses
+RANDOM_REPLY_INTENTS = ("greeting", "consultation_start", "thanks")
+
+# Intents that only apply to messages naming a role. Without one they are dropped
+# from the ranking, so "I moved from Jakarta to Bandung" is not a career move.
+ROLE_INTENTS = ("career_transition",)
+
+# At most this many role cards in one answer ("skills for a backend and a frontend developer")
+MAX_ROLE_CARDS = 3
+
+# The words just before a role name tell which end of a career move it is:
+# "from a data analyst", "I'm currently a data analyst" vs "become an ML engineer".
+TRANSITION_SOURCE_CUE = re.compile(r"\b(?:from|currently|now|i'?m|i am|work(?:ing)? as)\s+(?:an?\s+)?$")
+TRANSITION_TARGET_CUE = re.compile(r"\b(?:become|becoming|be|to|into|towards?|as)\s+(?:an?\s+)?$")
+
+# --- METRICS ---
+
+INTENT_HITS = Counter("bot_intent_detections_total", "Messages in which each intent was detected.", ("intent",))
+# Intent patterns are labelled by their position in knowledge_base.intent_patterns[intent]:
+# the regex source would make long, high-cardinality label values.
+PATTERN_MATCHES = Counter(
+    "bot_intent_pattern_matches_total", "Matches of each intent pattern.", ("intent", "rule"))
+PATTERN_SECONDS = Counter(
+    "bot_intent_pattern_seconds_total", "Cumulative time spent running each intent pattern.", ("intent", "rule"))
+ENTITY_HITS = Counter(
+    "bot_entities_total", "Entities detected, by type and by exact or fuzzy match.", ("type", "match"))
+GUARD_EVENTS = Counter(
+    "bot_input_guard_total", "Messages truncated, matched in chunks or cut short by the time budget.",
+    ("stage", "guard"))
+Gauge("bot_response_cache", "Response cache counters and sizes.",
+      lambda: {(cache, stat): value for cache, stats in cache_stats().items()
+               for stat, value in stats.items() if isinstance(value, (int, float))},
+      ("cache", "stat"))
+Gauge("bot_knowledge_base_info", "The knowledge base version being served.",
+      lambda: {(INDEX.version,): 1}, ("version",))
+
+# --- CORE LOGIC FUNCTIONS ---
+
+
+def _guarded_text(message: str, stage: str) -> str:
+    """Caps the length of the text handed to the regex engines."""
+    if len(message) > MAX_MESSAGE_CHARS:
+        GUARD_EVENTS.inc(stage, "truncated")
+        return message[:MAX_MESSAGE_CHARS]
+    return message
+
+def score_intents(message: str, index=None, incomplete: set = None, bounded: bool = True) -> dict:
+    """
+    Scores every intent whose patterns match the message: {intent: score}.
+
+    Long messages are scored in chunks (scores add up across chunks), so a
+    pattern like 'what.*become' cannot backtrack over the whole text, and scoring
+    stops with the intents found so far once the time budget is spent. In that
+    case "detect_intents" is added to `incomplete`, if given. With
+    bounded=False there is no time budget, so the scores depend on the message only.
+    """
+    index = index or INDEX
+    engine = index.intent_engine
+    started = time.perf_counter()
+    deadline = started + MATCH_BUDGET_MS / 1000 if bounded else None
+    timings = []
+    chunks = chunk_text(_guarded_text(message, "detect_intents"), MATCH_CHUNK_CHARS)
+    if len(chunks) == 1:
+        scores = engine.scores(chunks[0], timings, deadline)
+    else:
+        GUARD_EVENTS.inc("detect_intents", "chunked")
+        scores = {}
+        for chunk in chunks:
+            for intent, score in engine.scores(chunk, timings, deadline).items():
+                scores[intent] = scores.get(intent, 0) + score
+    finished = time.perf_counter()
+    STAGE_SECONDS.observe(finished - started, "detect_intents")
+    if deadline is not None and finished > deadline:
+        GUARD_EVENTS.inc("detect_intents", "budget_exceeded")
+        logging.warning(f"Intent detection stopped after {(finished - started) * 1000:.1f} ms "
+                        f"on a {len(message)}-character message.")
+        if incomplete is not None:
+            incomplete.add("detect_intents")
+
+    matches, seconds = {}, {}
+    for rule_id, elapsed, count in timings:
+        labels = (engine.rules[rule_id][0], str(engine.rule_numbers[rule_id]))
+        seconds[labels] = seconds.get(labels, 0.0) + elapsed
+        if count:
+            matches[labels] = matches.get(labels, 0) + count
+    PATTERN_SECONDS.inc_many(seconds)
+    PATTERN_MATCHES.inc_many(matches)
+    return scores
+
+def detect_intents(message: str, index=None, incomplete: set = None) -> list:
+    """Detects intents based on regex patterns and scores, returning a sorted list (see score_intents)."""
+    index = index or INDEX
+    detected_intents = index.intent_engine.rank_scores(score_intents(message, index, incomplete))
+    INTENT_HITS.inc_many({(intent,): 1 for intent in detected_intents})
+    return detected_intents
+
+def detect_entities(message: str, index=None, incomplete: set = None, bounded: bool = True) -> dict:
+    """
+    Detects all entities (roles, technologies) in a message.
+
+    Uses the gazetteer, so the longest phrase wins where matches overlap
+    ("react native" rather than "react") and each entity list keeps the order
+    in which the entities appear in the message. Words outside every exact
+    match are then looked up with the fuzzy matcher ("pyhton" -> "python"),
+    and any corrections are appended after the exact matches. If the time
+    budget cuts the fuzzy pass short, "detect_entities" is added to `incomplete`;
+    with bounded=False the fuzzy pass always runs to the end.
+    """
+    index = index or INDEX
+    started = time.perf_counter()
+    message = _guarded_text(message, "detect_entities")
+    spans = [] if FUZZY_MATCHING else None
+    detected_entities = index.gazetteer.extract(message, spans, MATCH_CHUNK_CHARS)
+    hits = {(entity_type, "exact"): len(found) for entity_type, found in detected_entities.items()}
+
+    # The fuzzy pass gets whatever is left of the message's time budget, up to its own.
+    remaining_ms = MATCH_BUDGET_MS - (time.perf_counter() - started) * 1000
+    if FUZZY_MATCHING:
+        budget_ms = min(FUZZY_BUDGET_MS, remaining_ms) if bounded else float("inf")
+        fuzzy_started = time.perf_counter()
+        if budget_ms > 0:
+            for phrase, entity_type, distance in index.fuzzy_matcher.match_tokens(message.lower(), spans, budget_ms):
+                found = detected_entities.setdefault(entity_type, [])
+                if phrase not in found:
+                    found.append(phrase)
+                    hits[(entity_type, "fuzzy")] = hits.get((entity_type, "fuzzy"), 0) + 1
+                    logging.debug(f"Fuzzy match: '{phrase}' ({entity_type}, distance {distance})")
+        # match_tokens only stops early once its budget is spent.
+        if (time.perf_counter() - fuzzy_started) * 1000 > budget_ms:
+            GUARD_EVENTS.inc("detect_entities", "budget_exceeded")
+            if incomplete is not None:
+                incomplete.add("detect_entities")
+
+    STAGE_SECONDS.observe(time.perf_counter() - started, "detect_entities")
+    ENTITY_HITS.inc_many(hits)
+    return detected_entities
+
+def applicable_intents(intents: list, entities: dict) -> list:
+    """Drops the ROLE_INTENTS from an intent ranking when the message names no role."""
+    if entities.get("role"):
+        return intents
+    return [intent for intent in intents if intent not in ROLE_INTENTS]
+
+def resolve_roles(entities: dict, index) -> list:
+    """The distinct role ids the role entities refer to, in the order they were mentioned."""
+    roles = []
+    for role_entity in entities.get("role", ()):
+        role_id = index.resolve_role(role_entity)
+        if role_id is not None and role_id not in roles:
+            roles.append(role_id)
+    return roles
+
+def transition_roles(message: str, entities: dict, index) -> tuple:
+    """
+    (from, to) role ids for a question about moving between roles, told apart
+    by the words before each role name, None for an end that is not named.
+    Roles without such a cue fill the missing ends in the order they were
+    mentioned; a single role without a cue is taken as the one to move to.
+    """
+    text = normalize_message(message)
+    source = target = None
+    unmarked = []
+    for role_entity in entities.get("role", ()):
+        role_id = index.resolve_role(role_entity)
+        if role_id is None or role_id in (source, target) or role_id in unmarked:
+            continue
+        position = text.find(role_entity)
+        before = text[max(0, position - 40):position] if position >= 0 else ""
+        if source is None and TRANSITION_SOURCE_CUE.search(before):
+            source = role_id
+        elif target is None and TRANSITION_TARGET_CUE.search(before):
+            target = role_id
+        else:
+            unmarked.append(role_id)
+    if source is None and target is None and len(unmarked) == 1:
+        return None, unmarked[0]
+    if source is None and unmarked:
+        source = unmarked.pop(0)
+    if target is None and unmarked:
+        target = unmarked.pop(0)
+    return source, target
+
+def handle_role_to_skill_query(entities: dict, index=None) -> str:
+    """
+    Handles 'career_path' intent.
+    Formats a response detailing the skills needed for each detected role (up to MAX_ROLE_CARDS).
+    """
+    if "role" not in entities or not entities["role"]:
+        return "I can see you're asking about a career path, but which role are you interested in? For example, try 'what skills are needed for a devops engineer?'"
+
+    index = index or INDEX
+    roles = resolve_roles(entities, index)
+    if roles:
+        return "\n".join(index.role_cards.card(role_id) for role_id in roles[:MAX_ROLE_CARDS])
+    return f"I don't have detailed information on the '{entities['role'][0]}' role just yet, but I'm constantly learning! Try asking about another role."
+
+def suggested_roles(skills: set, index, exclude: tuple = ()) -> list:
+    """The best three (role_id, score, overlap) for a set of skills, leaving out the `exclude` roles."""
+    top_roles = index.role_matcher.top_roles(skills, k=3 + len(exclude), metric=ROLE_MATCH_METRIC)
+    return [entry for entry in top_roles if entry[0] not in exclude][:3]
+
+def handle_skill_to_role_query(entities: dict, index=None, exclude: tuple = ()) -> str:
+    """
+    Handles 'role_suggestion' intent.
+    Finds and scores potential roles based on the user's mentioned skills,
+    other than the `exclude` roles (e.g. the one the user already has).
+    """
+    if "technology" not in entities or not entities["technology"]:
+        return "Please tell me what skills you have! For example, 'I am proficient in Python and React'."
+
+    index = index or INDEX
+    user_skills = set(entities["technology"])
+
+    # Score every role in one vectorized pass and keep the best three
+    top_roles = suggested_roles(user_skills, index, exclude)
+
+    if not top_roles:
+        return f"Based on the skills you mentioned ({', '.join(f'`{s}`' for s in user_skills)}), I couldn't find a direct career match in my database. Perhaps try listing some other technologies you know?"
+
+    response = f"With skills in **{', '.join(user_skills)}**, you have several great career prospects! Here are some top matches based on your skills:\n\n"
+    
+    # Show top 3 matches
+    for role_id, score, overlap in top_roles:
+        response += f"{index.role_cards.bullet(role_id)} ({overlap} of your skills match)\n"
+
+    response += "\nYou can ask me for more details on any of these roles to see the full skill set required!"
+    return response
+
+def handle_role_transition_query(entities: dict, index=None, message: str = "") -> str:
+    """
+    Handles 'career_transition' intent, and other questions about moving between two roles.
+    Describes the skill gap from one role to the other, from the precomputed gap index.
+    """
+    index = index or INDEX
+    source, target = transition_roles(message, entities, index)
+    role_data = index.role_skill_map
+    if target is None and source is not None:
+        # Only the current role: suggest where to go, from the user's skills if they named any
+        if entities.get("technology"):
+            return handle_skill_to_role_query(entities, index, exclude=(source,))
+        closest = index.role_gaps.closest(source)
+        response = f"Which role would you like to move to from **{role_data[source]['display_name']}**?"
+        if closest:
+            names = ", ".join(f"**{role_data[role_id]['display_name']}**" for role_id in closest)
+            response += (f" The roles with the most in common with it are {names}. For example, try "
+                         f"'how do I go from {source.replace('_', ' ')} to {closest[0].replace('_', ' ')}?'")
+        return response
+    if source is None:
+        if target is not None:
+            # Only the role to move to: what it takes to get there at all
+            return index.role_cards.card(target)
+        if entities.get("role"):
+            return handle_role_to_skill_query(entities, index)
+        return "Which roles are you moving between? For example, try 'how do I go from data analyst to ml engineer?'"
+
+    gap = index.role_gaps.gap(source, target)
+
+    response = (f"Moving from **{role_data[source]['display_name']}** to **{role_data[target]['display_name']}**: "
+                f"the two roles are about {gap.similarity:.0%} alike in the skills they need.\n\n")
+    if gap.shared:
+        response += f"• **Skills you can build on:** {', '.join(f'`{skill}`' for skill in gap.shared)}\n"
+    else:
+        response += "• **Skills you can build on:** none listed for both roles, so this one is a fresh start.\n"
+    if gap.missing:
+        response += f"• **Skills to learn:** {', '.join(f'`{skill}`' for skill in gap.missing)}\n"
+    else:
+        response += "• **Skills to learn:** none, you already have every skill listed for this role!\n"
+
+    # Through related roles when the direct move is a big one
+    route = index.role_gaps.route(source, target)
+    if len(route) > 2:
+        steps = " → ".join(f"**{role_data[role_id]['display_name']}**" for role_id in route)
+        new_skills = ", then ".join(str(len(index.role_gaps.gap(step_from, step_to).missing))
+                                    for step_from, step_to in zip(route, route[1:]))
+        response += f"\nA gentler route goes through related roles: {steps} ({new_skills} new skills per step)."
+    return response
+
+def named_roles(intents: list, entities: dict, index=None, message: str = "") -> tuple:
+    """The role ids the reply to an analysed message names, in the order it lists them."""
+    index = index or INDEX
+    handler = select_handler(intents, entities)
+    if handler == "handle_role_to_skill_query":
+        return tuple(resolve_roles(entities, index)[:MAX_ROLE_CARDS])
+    if handler == "handle_role_transition_query":
+        source, target = transition_roles(message, entities, index)
+        if source is not None and target is not None:
+            return index.role_gaps.route(source, target)
+        if source is not None:
+            if entities.get("technology"):
+                return tuple(role_id for role_id, _, _ in suggested_roles(set(entities["technology"]), index, (source,)))
+            return index.role_gaps.closest(source)
+        return (target,) if target is not None else ()
+    if handler == "handle_skill_to_role_query" and entities.get("technology"):
+        return tuple(role_id for role_id, _, _ in suggested_roles(set(entities["technology"]), index))
+    return ()
+
+# --- FOLLOW-UPS ---
+
+# "the first one", "2nd", "#3", "the last one": positions in the roles the bot just listed
+FOLLOW_UP_ORDINALS = {"first": 0, "1st": 0, "#1": 0, "second": 1, "2nd": 1, "#2": 1,
+                      "third": 2, "3rd": 2, "#3": 2, "last": -1}
+FOLLOW_UP_ORDINAL_PATTERN = re.compile(r"(?<![\w#])(first|1st|second|2nd|third|3rd|last|#[1-3])(?!\w)")
+# "tell me more", "more details", "what about it": a reference without a position
+FOLLOW_UP_MORE_PATTERN = re.compile(r"\b(more|details?|explain|elaborate)\b|\b(about|on) (it|that|this)\b")
+# In a message that is also a question of its own, only an explicit reference to a
+# listed role counts: "what skills does the second one need?", not "what are the first steps?"
+FOLLOW_UP_REFERENCE_PATTERN = re.compile(
+    r"(?<![\w#])(first|1st|second|2nd|third|3rd|last)\s+(?:one|role|job|career|option)\b|(?<![\w#])(#[1-3])(?!\w)")
+
+def answer_follow_up(message: str, session: Session, index=None, explicit_only: bool = False):
+    """
+    Answers a follow-up to the roles the bot listed in its last reply, from the
+    session alone. Returns None when the message is not such a follow-up.
+    With `explicit_only`, only a reference such as "the second one" counts.
+    """
+    if not session.roles:
+        return None
+    index = index or INDEX
+    text = normalize_message(message)
+    if explicit_only:
+        reference = FOLLOW_UP_REFERENCE_PATTERN.search(text)
+        if reference is None:
+            return None
+        ordinal = reference.group(1) or reference.group(2)
+    else:
+        match = FOLLOW_UP_ORDINAL_PATTERN.search(text)
+        ordinal = match.group(1) if match is not None else None
+    if ordinal is not None:
+        position = FOLLOW_UP_ORDINALS[ordinal]
+        if position >= len(session.roles):
+            return f"I only mentioned {len(session.roles)} role(s). Which one would you like to know more about?"
+    elif FOLLOW_UP_MORE_PATTERN.search(text):
+        if len(session.roles) > 1:
+            names = ", ".join(f"**{index.role_skill_map[role_id]['display_name']}**"
+                              for role_id in session.roles if role_id in index.role_skill_map)
+            return f"Which one would you like to know more about: {names}? You can say 'the first one', 'the second one', ..."
+        position = 0
+    else:
+        return None
+    # None if the role was removed by a knowledge base reload since the last reply
+    return index.role_cards.card(session.roles[position])
+
+def cache_ttl(cache: LRUTTLCache, cut_short: set) -> float:
+    """
+    How long to cache a result, given the stages the time budget cut short: 0
+    (not at all) when intent scoring was cut, since the partial ranking would
+    answer every later copy of the message; DEGRADED_CACHE_TTL when only the
+    fuzzy pass was, which at worst misses a misspelled word.
+    """
+    if "detect_intents" in cut_short:
+        return 0
+    if cut_short:
+        return min(cache.ttl, DEGRADED_CACHE_TTL)
+    return cache.ttl
+
+def analyze_message(message: str, index=None, incomplete: set = None) -> tuple:
+    """
+    Returns (intents, entities) for a message, using the analysis cache.
+    The returned objects are shared with the cache and must not be modified.
+
+    The stages the time budget cut short, now or when the cached analysis was
+    made, are added to `incomplete`, if given. They decide how long the
+    analysis is cached (see cache_ttl).
+    """
+    index = index or INDEX
+    key = normalize_message(message)
+    ANALYSIS_CACHE.bind_version(index.version)
+    cached = ANALYSIS_CACHE.get(key)
+    if cached is None:
+        cut_short = set()
+        entities = detect_entities(key, index, cut_short)
+        cached = (applicable_intents(detect_intents(key, index, cut_short), entities), entities, frozenset(cut_short))
+        ttl = cache_ttl(ANALYSIS_CACHE, cut_short)
+        if ttl > 0:
+            ANALYSIS_CACHE.put(key, cached, version=index.version, ttl=ttl)
+    intents, entities, cut_short = cached
+    if incomplete is not None:
+        incomplete.update(cut_short)
+    return intents, entities
+
+def select_handler(intents: list, entities: dict = None) -> str:
+    """Names the handler that answers a message with the given ranked intents and entities."""
+    if not intents:
+        return "no_intent"
+    primary_intent = intents[0]
+    if primary_intent in RANDOM_REPLY_INTENTS:
+        return "simple_response"
+    elif primary_intent == "career_transition" or (
+            "career_transition" in intents and len(set((entities or {}).get("role", ()))) > 1):
+        # Also when another intent ranks first ("I'm a data analyst, how do I become an ML engineer?")
+        return "handle_role_transition_query"
+    elif primary_intent == "career_path":
+        return "handle_role_to_skill_query"
+    elif primary_intent == "role_suggestion":
+        return "handle_skill_to_role_query"
+    return "fallback"
+
+def build_reply(intents: list, entities: dict, index=None, message: str = "") -> str:
+    """Routes an analysed message to the appropriate handler function, timing the handler."""
+    index = index or INDEX
+    handler = select_handler(intents, entities)
+    started = time.perf_counter()
+    reply = _run_handler(handler, intents, entities, index, message)
+    STAGE_SECONDS.observe(time.perf_counter() - started, handler)
+    return reply
+
+def _run_handler(handler: str, intents: list, entities: dict, index, message: str = "") -> str:
+    """Calls the handler named by select_handler."""
+    # Route to handlers based on intent
+    if handler == "no_intent":
+        return "I'm not sure how to help with that. Try asking me what skills you need for a job, or what jobs you can get with your skills!"
+    elif handler == "simple_response":
+        return random.choice(index.simple_responses[intents[0]])
+    elif handler == "handle_role_to_skill_query":
+        return handle_role_to_skill_query(entities, index)
+    elif handler == "handle_skill_to_role_query":
+        return handle_skill_to_role_query(entities, index)
+    elif handler == "handle_role_transition_query":
+        return handle_role_transition_query(entities, index, message)
+    
+    # Fallback if an intent was detected but has no handler
+    return "I see you're asking about something tech-related, but I'm not sure how to answer. Could you rephrase your question?"
+
+def classify_message(message: str, index=None) -> dict:
+    """
+    Runs the analysis half of the pipeline without building a reply. Used for
+    offline evaluation, so it bypasses the caches and also returns the scores.
+    It has the bot's length cap and chunking but no time budget, so the result
+    does not depend on how busy the machine is.
+    """
+    index = index or INDEX
+    key = normalize_message(message)
+    scores = score_intents(key, index, bounded=False)
+    entities = detect_entities(key, index, bounded=False)
+    intents = applicable_intents(index.intent_engine.rank_scores(scores), entities)
+    return {
+        "intents": intents,
+        "scores": scores,
+        "entities": entities,
+        "handler": select_handler(intents, entities),
+    }
+
+def respond(message: str, session: Session = None) -> tuple:
+    """
+    The main response dispatcher. It detects intents and entities,
+    then routes to the appropriate handler function.
+
+    `session` is what the bot last answered this user in this channel (or
+    None). A message with no intent and no entity is first tried as a
+    follow-up to it. Returns (reply, session to remember for the next message).
+    """
+    started = time.perf_counter()
+    # Read the index once, so a concurrent reload cannot mix two versions.
+    index = INDEX
+    incomplete = set()
+    intents, entities = analyze_message(message, index, incomplete)
+    
+    # One record per message: sampled, and formatted by the log writer thread.
+    logging.info("Message: %r", message,
+                 extra={"sampled": True, "fields": {"intents": intents, "entities": entities}})
+
+    if session is not None and not entities.get("role"):
+        # A message with intents or entities of its own must point at a listed role to be a follow-up.
+        reply = answer_follow_up(message, session, index, explicit_only=bool(intents or entities))
+        if reply is not None:
+            STAGE_SECONDS.observe(time.perf_counter() - started, "follow_up")
+            return reply, session
+
+    if intents and intents[0] in RANDOM_REPLY_INTENTS:
+        reply, roles = build_reply(intents, entities, index), ()
+    else:
+        key = normalize_message(message)
+        REPLY_CACHE.bind_version(index.version)
+        cached = REPLY_CACHE.get(key)
+        if cached is None:
+            cached = (build_reply(intents, entities, index, key), named_roles(intents, entities, index, key))
+            ttl = cache_ttl(REPLY_CACHE, incomplete)
+            if ttl > 0:
+                REPLY_CACHE.put(key, cached, version=index.version, ttl=ttl)
+        reply, roles = cached
+    STAGE_SECONDS.observe(time.perf_counter() - started, "generate_response")
+    if session is not None and not roles and not entities:
+        return reply, session  # small talk in between does not make the bot forget its last answer
+    return reply, Session(intents[0] if intents else None, roles, entities.get("technology", ()))
+
+def generate_response(message: str) -> str:
+    """Answers a message on its own, without conversation state."""
+    return respond(message)[0]
+
+def cache_stats() -> dict:
+    """Hit/miss/eviction counters of the response caches."""
+    return {"analysis": ANALYSIS_CACHE.stats(), "reply": REPLY_CACHE.stats()}
+
+# --- HOT RELOAD ---
+
+_RELOAD_LOCK = threading.Lock()
+
+def reload_knowledge_base(snapshot_dir: str = DEFAULT_SNAPSHOT_DIR):
+    """
+    Rebuilds the knowledge index from knowledge_base.py on disk and swaps it in.
+
+    The new index is built next to the live one (reusing the parts whose data
+    did not change), validated, and only then published with a single
+    assignment, so in-flight messages keep using the index they started with.
+    Returns (changed, version). Raises ValueError if the new knowledge base is
+    invalid, in which case the live index is left untouched.
+    """
+    global INDEX, KB_VERSION
+    with _RELOAD_LOCK:
+        started = time.perf_counter()
+        try:
+            kb = load_knowledge_module()
+            validate_knowledge_base(kb)
+        except ValueError:
+            raise
+        except Exception as error:  # a syntax error or typo in knowledge_base.py
+            raise ValueError(f"could not load knowledge_base.py: {error!r}") from error
+        if knowledge_fingerprint(kb) == INDEX.version:
+            return False, INDEX.version
+
+        key = snapshot_key(kb)
+        new_index = load_snapshot(snapshot_dir, key) if snapshot_dir else None
+        if new_index is not None:
+            new_index.compile()
+        else:
+            try:
+                new_index = KnowledgeIndex(kb, previous=INDEX)
+            except re.error as error:
+                raise ValueError(f"invalid pattern in the knowledge base: {error}") from error
+            new_index.validate()
+            if snapshot_dir:
+                try:
+                    save_snapshot(new_index, snapshot_dir, key)
+                except OSError as error:
+                    logging.warning(f"Could not save the knowledge base snapshot: {error}")
+
+        INDEX = new_index
+        KB_VERSION = new_index.version
+        logging.info(f"Knowledge base reloaded as version {KB_VERSION} in {(time.perf_counter() - started) * 1000:.1f} ms.")
+        return True, KB_VERSION
+
+def ensure_version(version: str):
+    """Used by worker processes: reloads the knowledge base if the bot has moved to another version."""
+    if version and version != INDEX.version:
+        try:
+            reload_knowledge_base()
+        except ValueError as error:
+            logging.error(f"Worker {os.getpid()} could not reload the knowledge base: {error}")
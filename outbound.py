@@ -0,0 +1,308 @@
+"""
+outbound.py
+
+Sends replies to Discord, which rejects messages longer than 2000 characters.
+
+split_message() cuts a reply at line boundaries into as few messages as
+possible: lines are packed greedily, so a message is only closed when the next
+line would not fit. A single line longer than the limit is cut at the last
+space before it (or hard-cut when there is none). A ``` code block that spans
+two messages is closed at the end of the first and reopened in the second, so
+the Markdown renders the same.
+
+SendScheduler queues the messages to send and drains them by priority while
+staying under Discord's rate limits (5 messages per 5 seconds in a channel,
+50 requests per second overall), so the bot does not collect 429 responses
+and retries. When a channel's bucket is empty, other channels' messages go
+first. Messages that wait too long, or are pushed out of a full queue by more
+important ones, are dropped: a late "busy" notice is worth nothing.
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import collections
+
+from metrics import STAGE_SECONDS, Counter
+from rate_limits import KeyedTokenBuckets, TokenBucket
+
+# Discord's limit on the length of a message's content.
+DISCORD_MESSAGE_LIMIT = int(os.getenv("DISCORD_MESSAGE_LIMIT", "2000"))
+
+FENCE = "```"
+
+
+def _split_line(line: str, limit: int) -> list:
+    """Cuts one overlong line into pieces of at most `limit` characters, at spaces when possible."""
+    pieces = []
+    while len(line) > limit:
+        cut = line.rfind(" ", 1, limit + 1)
+        if cut <= 0:
+            cut = limit
+        pieces.append(line[:cut])
+        line = line[cut:].lstrip(" ")
+    pieces.append(line)
+    return pieces
+
+
+def split_message(text: str, limit: int = DISCORD_MESSAGE_LIMIT) -> list:
+    """Returns the messages to send for `text`, each at most `limit` characters."""
+    if len(text) <= limit:
+        return [text] if text.strip() else []
+
+    # Room kept for closing an open code block at the end of a message.
+    reserve = len(FENCE) + 1
+    messages = []
+    current = []  # lines of the message being built
+    length = 0    # len("\n".join(current))
+    fence = None  # the line that opened the current code block, if inside one
+
+    def flush():
+        nonlocal current, length
+        if fence is not None:
+            current.append(FENCE)
+        body = "\n".join(current)
+        if body.strip():
+            messages.append(body)
+        current = [fence] if fence is not None else []
+        length = len(fence) if fence is not None else 0
+
+    for line in text.split("\n"):
+        # An overlong line must fit in a message of its own, between reopened fences if needed.
+        width = limit - reserve - (len(fence) + 1 if fence is not None else reserve)
+        for piece in _split_line(line, max(width, 1)):
+            toggles_fence = piece.lstrip().startswith(FENCE)
+            # Inside a code block after this line, the closing fence must still fit.
+            inside_after = (fence is not None) != toggles_fence
+            room = limit - (reserve if inside_after else 0)
+            if current and length + 1 + len(piece) > room:
+                flush()
+            length += len(piece) + (1 if current else 0)
+            current.append(piece)
+            if toggles_fence:
+                fence = None if fence is not None else piece
+    if current:
+        fence = None  # a block left open by the reply itself is sent as is
+        flush()
+    return messages
+
+
+async def send_chunked(send, text: str, limit: int = DISCORD_MESSAGE_LIMIT) -> bool:
+    """
+    Sends `text` through the `send` coroutine, split into as few messages as fit
+    the limit. Stops at the first part `send` returns False for (the send
+    scheduler dropped it), so a reply is never delivered with a hole in the
+    middle. Returns whether every part was sent.
+    """
+    for part in split_message(text, limit):
+        if await send(part) is False:
+            return False
+    return True
+
+
+# --- SEND SCHEDULING ---
+
+# Send priorities, most important first.
+PRIORITY_ADMIN = 0   # replies to admin commands
+PRIORITY_ANSWER = 1  # answers to questions
+PRIORITY_NOTICE = 2  # "busy" notices and other replies that are fine to drop
+
+OUTBOUND_MESSAGES = Counter(
+    "bot_outbound_messages_total", "Messages handed to the send scheduler, by outcome.", ("outcome",))
+
+
+class _Outgoing:
+    """A message waiting in the send scheduler. Ordered by priority, then arrival."""
+
+    __slots__ = ("priority", "sequence", "channel_id", "send", "text", "future", "queued_at", "queued")
+
+    def __init__(self, priority, sequence, channel_id, send, text, future, queued_at):
+        self.priority = priority
+        self.sequence = sequence
+        self.channel_id = channel_id
+        self.send = send
+        self.text = text
+        self.future = future
+        self.queued_at = queued_at
+        self.queued = True  # False once taken for sending, dropped or expired
+
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class SendScheduler:
+    """
+    Priority queue of outgoing messages, drained under per-channel and global rate limits.
+
+    Each channel's messages are a heap, and a heap of the channels' most
+    important messages picks the next one to send, so choosing a message costs
+    O(log n) plus one step per channel that is waiting for its bucket. Removed
+    messages are only marked (`queued` = False) and skipped when they surface.
+    """
+
+    def __init__(self, channel_rate: float = 1.0, channel_burst: float = 5, global_rate: float = 45.0,
+                 global_burst: float = 50, max_queued: int = 1000, max_age: float = 30.0, clock=time.monotonic):
+        self.channel_buckets = KeyedTokenBuckets(channel_rate, channel_burst, clock=clock)
+        self.global_bucket = TokenBucket(global_rate, global_burst, clock())
+        self.max_queued = max_queued
+        self.max_age = max_age
+        self.clock = clock
+        self._channels = {}                     # channel id -> heap of its _Outgoing messages
+        self._heads = []                        # heap of the channels' most important messages
+        self._listed = {}                       # channel id -> its current entry in _heads
+        self._arrivals = collections.deque()    # queued messages, oldest first, for expiry
+        self._worst = []                        # heap of (-priority, -sequence, message), for a full queue
+        self._size = 0                          # messages still queued
+        self._sequence = itertools.count()
+        self._wakeup = None
+        self._drainer = None
+        self._deliveries = set()
+
+    async def send(self, channel_id, send, text: str, priority: int = PRIORITY_ANSWER) -> bool:
+        """
+        Queues `text` for the `send` coroutine function (e.g. channel.send) and
+        waits until it has been sent. Returns False if it was dropped instead.
+        """
+        loop = asyncio.get_running_loop()
+        if self._drainer is None or self._drainer.done():
+            self._wakeup = asyncio.Event()
+            self._drainer = loop.create_task(self._drain())
+
+        if self._size >= self.max_queued:
+            # Make room by dropping the least important, most recent message (possibly this one).
+            worst = self._least_important()
+            if worst is None or worst.priority <= priority:
+                OUTBOUND_MESSAGES.inc("dropped_queue_full")
+                return False
+            self._remove(worst, dropped=True)
+            OUTBOUND_MESSAGES.inc("dropped_queue_full")
+
+        message = _Outgoing(priority, next(self._sequence), channel_id, send, text, loop.create_future(), self.clock())
+        heapq.heappush(self._channels.setdefault(channel_id, []), message)
+        self._list(channel_id)
+        self._arrivals.append(message)
+        heapq.heappush(self._worst, (-priority, -message.sequence, message))
+        self._size += 1
+        self._wakeup.set()
+        return await message.future
+
+    def _remove(self, message: _Outgoing, dropped: bool = False):
+        """Takes a message out of the queue; its entries in the heaps are skipped from now on."""
+        message.queued = False
+        self._size -= 1
+        if dropped and not message.future.done():
+            message.future.set_result(False)
+
+    def _list(self, channel_id):
+        """Puts a channel's most important queued message in _heads, if it is not there yet."""
+        heap = self._channels.get(channel_id)
+        while heap and not heap[0].queued:
+            heapq.heappop(heap)
+        if not heap:
+            self._channels.pop(channel_id, None)
+            self._listed.pop(channel_id, None)
+        elif self._listed.get(channel_id) is not heap[0]:
+            self._listed[channel_id] = heap[0]
+            heapq.heappush(self._heads, heap[0])
+
+    def _least_important(self):
+        """The queued message a full queue drops first: least important, then most recent."""
+        while self._worst and not self._worst[0][2].queued:
+            heapq.heappop(self._worst)
+        return self._worst[0][2] if self._worst else None
+
+    def _expire(self, now: float):
+        """Drops the messages that have waited longer than max_age (and those whose sender gave up)."""
+        while self._arrivals:
+            message = self._arrivals[0]
+            if message.queued and not message.future.done() and now - message.queued_at <= self.max_age:
+                break
+            self._arrivals.popleft()
+            if message.queued:
+                if not message.future.done():
+                    OUTBOUND_MESSAGES.inc("expired")
+                self._remove(message, dropped=True)
+                self._list(message.channel_id)
+
+    def _compact(self):
+        """Drops the skipped entries once they outnumber the queued messages."""
+        if len(self._worst) > 2 * self._size + 64:
+            self._worst = [entry for entry in self._worst if entry[2].queued]
+            heapq.heapify(self._worst)
+        if len(self._heads) > 2 * len(self._listed) + 64:
+            self._heads = list(self._listed.values())
+            heapq.heapify(self._heads)
+
+    def _next_ready(self, now: float):
+        """Removes and returns the most important message whose channel may send now, or the time to wait."""
+        self._expire(now)
+        wait = float("inf")
+        waiting = []  # heads of channels whose bucket is empty
+        ready = None
+        while self._heads:
+            message = heapq.heappop(self._heads)
+            channel_id = message.channel_id
+            if self._listed.get(channel_id) is not message:
+                continue  # no longer the channel's head
+            del self._listed[channel_id]
+            if not message.queued or message.future.done():
+                if message.queued:
+                    self._remove(message)  # the sender gave up waiting
+                self._list(channel_id)
+                continue
+            channel_wait = self.channel_buckets.wait_time(channel_id)
+            if channel_wait == 0:
+                self.channel_buckets.take(channel_id)
+                self._remove(message)
+                self._list(channel_id)
+                ready = message
+                break
+            wait = min(wait, channel_wait)
+            waiting.append(message)
+        for message in waiting:
+            self._listed[message.channel_id] = message
+            heapq.heappush(self._heads, message)
+        self._compact()
+        return (ready, 0.0) if ready is not None else (None, wait)
+
+    async def _drain(self):
+        while True:
+            if not self._size:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            global_wait = self.global_bucket.wait_time(self.clock())
+            if global_wait == 0:
+                message, wait = self._next_ready(self.clock())
+                if message is not None:
+                    self.global_bucket.take(self.clock())
+                    task = asyncio.get_running_loop().create_task(self._deliver(message))
+                    self._deliveries.add(task)
+                    task.add_done_callback(self._deliveries.discard)
+                    continue
+            else:
+                wait = global_wait
+            # Sleep until a bucket refills, or a new message arrives (it may be for an idle channel).
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(wait, self.max_age))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, message: _Outgoing):
+        STAGE_SECONDS.observe(self.clock() - message.queued_at, "send_queue")
+        try:
+            await message.send(message.text)
+        except Exception as error:
+            OUTBOUND_MESSAGES.inc("error")
+            if not message.future.done():
+                message.future.set_exception(error)
+            return
+        OUTBOUND_MESSAGES.inc("sent")
+        if not message.future.done():
+            message.future.set_result(True)
+
+    def stats(self) -> dict:
+        return {"queued": self._size, "sending": len(self._deliveries)}
@@ -0,0 +1,401 @@
+"""
+pattern_analysis.py
+
+Helpers that look inside the regular expressions stored in knowledge_base.py.
+The bot's matching engines use them at startup to derive cheap literal
+prefilters from the hand-written patterns, so the patterns themselves can stay
+readable and nobody has to maintain a second keyword list by hand.
+"""
+
+import re
+import string
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+_LITERAL = sre_constants.LITERAL
+_IN = sre_constants.IN
+_ANY = sre_constants.ANY
+_RANGE = sre_constants.RANGE
+_AT = sre_constants.AT
+_BRANCH = sre_constants.BRANCH
+_SUBPATTERN = sre_constants.SUBPATTERN
+_ASSERTIONS = (sre_constants.ASSERT, sre_constants.ASSERT_NOT)
+_REPEATS = tuple(
+    getattr(sre_constants, name)
+    for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+    if hasattr(sre_constants, name)
+)
+_ATOMIC_GROUP = getattr(sre_constants, "ATOMIC_GROUP", None)
+_NOT_LITERAL = sre_constants.NOT_LITERAL
+_NEGATE = sre_constants.NEGATE
+_CATEGORY = sre_constants.CATEGORY
+_MAXREPEAT = sre_constants.MAXREPEAT
+
+
+def parse_pattern(pattern: str, flags: int = 0):
+    """Parses a pattern string into the stdlib's regex syntax tree."""
+    return sre_parse.parse(pattern, flags)
+
+
+def _group_body(op, av):
+    """Returns the inner items of a grouping node, or None if it is not a group."""
+    if op is _SUBPATTERN:
+        return list(av[-1])
+    if _ATOMIC_GROUP is not None and op is _ATOMIC_GROUP:
+        return list(av)
+    return None
+
+
+def is_zero_width(op, av) -> bool:
+    """True if the node can only ever match the empty string (anchors, lookarounds)."""
+    if op is _AT or op in _ASSERTIONS:
+        return True
+    if op is _BRANCH:
+        return all(all(is_zero_width(o, a) for o, a in branch) for branch in av[1])
+    body = _group_body(op, av)
+    if body is not None:
+        return all(is_zero_width(o, a) for o, a in body)
+    return False
+
+
+def _sequence_prefixes(items):
+    """
+    Returns a set of lowercase literal strings, one of which must appear at the
+    start of every match of the item sequence, or None if no such set exists.
+    """
+    for index, (op, av) in enumerate(items):
+        if is_zero_width(op, av):
+            continue
+
+        if op is _LITERAL:
+            run = []
+            for next_op, next_av in items[index:]:
+                if next_op is not _LITERAL:
+                    break
+                run.append(chr(next_av))
+            literal = "".join(run)
+            # Case folding is only predictable for ASCII; give up otherwise.
+            if not literal.isascii():
+                return None
+            return {literal.lower()}
+
+        if op in _REPEATS:
+            min_count, _, body = av
+            head = _sequence_prefixes(list(body))
+            if min_count > 0:
+                return head
+            # Optional item: the match starts either inside it or after it.
+            rest = _sequence_prefixes(items[index + 1:])
+            if head is None or rest is None:
+                return None
+            return head | rest
+
+        if op is _BRANCH:
+            prefixes = set()
+            for branch in av[1]:
+                branch_prefixes = _sequence_prefixes(list(branch))
+                if branch_prefixes is None:
+                    return None
+                prefixes |= branch_prefixes
+            return prefixes
+
+        body = _group_body(op, av)
+        if body is not None:
+            return _sequence_prefixes(body)
+
+        # Character classes, '.', backreferences, ...: nothing literal to anchor on.
+        return None
+
+    # The sequence can match the empty string.
+    return None
+
+
+def literal_prefixes(pattern: str, flags: int = 0):
+    """
+    Returns the set of lowercase literal strings a match of `pattern` must start
+    with (after skipping anchors such as \\b), or None if it cannot be derived.
+
+    Example: r'\\b(hi|hello|good\\s+morning)\\b' -> {'hi', 'hello', 'good'}
+    """
+    prefixes = _sequence_prefixes(list(parse_pattern(pattern, flags)))
+    if not prefixes or "" in prefixes:
+        return None
+    return frozenset(prefixes)
+
+
+# What '.' stands for when a pattern is expanded into literal phrases, e.g.
+# r'full.?stack' -> 'fullstack', 'full stack', 'full-stack', ...
+ANY_CHAR_EXPANSION = (" ", "-", "_", "/", ".")
+
+
+def _expand_sequence(items, limit):
+    """Expands a sequence of nodes into the finite set of strings it matches, or None."""
+    results = {""}
+    for op, av in items:
+        options = _expand_node(op, av, limit)
+        if options is None:
+            return None
+        results = {head + tail for head in results for tail in options}
+        if len(results) > limit:
+            return None
+    return results
+
+
+def _expand_node(op, av, limit):
+    if is_zero_width(op, av):
+        return {""}
+    if op is _LITERAL:
+        return {chr(av)}
+    if op is _ANY:
+        return set(ANY_CHAR_EXPANSION)
+    if op is _IN:
+        chars = set()
+        for set_op, set_av in av:
+            if set_op is _LITERAL:
+                chars.add(chr(set_av))
+            elif set_op is _RANGE and set_av[1] - set_av[0] < limit:
+                chars.update(chr(code) for code in range(set_av[0], set_av[1] + 1))
+            else:  # negated sets and categories such as \s are not finite enough
+                return None
+        return chars
+    if op in _REPEATS:
+        min_count, max_count, body = av
+        if max_count > 4:
+            return None
+        options = _expand_sequence(list(body), limit)
+        if options is None:
+            return None
+        results = set()
+        for count in range(min_count, max_count + 1):
+            repeated = {""}
+            for _ in range(count):
+                repeated = {head + tail for head in repeated for tail in options}
+            results |= repeated
+        return results
+    if op is _BRANCH:
+        results = set()
+        for branch in av[1]:
+            options = _expand_sequence(list(branch), limit)
+            if options is None:
+                return None
+            results |= options
+        return results
+    body = _group_body(op, av)
+    if body is not None:
+        return _expand_sequence(body, limit)
+    return None
+
+
+def expand_literals(pattern: str, flags: int = 0, limit: int = 256):
+    """
+    Returns the finite set of lowercase phrases `pattern` can match, ignoring
+    anchors, or None if the pattern is open-ended or expands past `limit`.
+
+    Example: r'\\b(devops?|cloud) engineer\\b'
+        -> {'devop engineer', 'devops engineer', 'cloud engineer'}
+    """
+    phrases = _expand_sequence(list(parse_pattern(pattern, flags)), limit)
+    if phrases is None:
+        return None
+    phrases = {phrase.strip().lower() for phrase in phrases}
+    phrases.discard("")
+    return frozenset(phrases)
+
+
+def build_trie_regex(words) -> str:
+    """
+    Renders a collection of literal strings as a single trie-shaped regex.
+
+    Branches at each node start with distinct characters, so the regex engine
+    never retries a shared prefix, and optional tails are greedy so the longest
+    word wins at any given position.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def render(node):
+        terminal = "" in node
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return "(?:" + body + ")?"
+        return body
+
+    return render(trie)
+
+
+# --- BACKTRACKING ANALYSIS ---
+
+# Character sets are approximated over ASCII, with "\x80" standing for any
+# non-ASCII character.
+_ALPHABET = frozenset(chr(code) for code in range(9, 127)) | {"\x80"}
+_CATEGORY_CHARS = {
+    sre_constants.CATEGORY_DIGIT: frozenset(string.digits),
+    sre_constants.CATEGORY_SPACE: frozenset(" \t\n\r\f\v"),
+    sre_constants.CATEGORY_WORD: frozenset(string.ascii_letters + string.digits + "_\x80"),
+}
+for _positive, _negative in (
+    (sre_constants.CATEGORY_DIGIT, sre_constants.CATEGORY_NOT_DIGIT),
+    (sre_constants.CATEGORY_SPACE, sre_constants.CATEGORY_NOT_SPACE),
+    (sre_constants.CATEGORY_WORD, sre_constants.CATEGORY_NOT_WORD),
+):
+    _CATEGORY_CHARS[_negative] = _ALPHABET - _CATEGORY_CHARS[_positive]
+
+
+def _literal_chars(code: int, ignore_case: bool) -> frozenset:
+    char = chr(code)
+    if not char.isascii():
+        return frozenset("\x80")
+    return frozenset({char, char.lower(), char.upper()} if ignore_case else {char})
+
+
+def _char_set(items, ignore_case: bool) -> frozenset:
+    """Every character a sequence of nodes can consume (an over-approximation)."""
+    chars = set()
+    for op, av in items:
+        if op is _LITERAL:
+            chars |= _literal_chars(av, ignore_case)
+        elif op is _NOT_LITERAL:
+            chars |= _ALPHABET - _literal_chars(av, ignore_case)
+        elif op is _ANY:
+            chars |= _ALPHABET
+        elif op is _IN:
+            members = set()
+            for set_op, set_av in av:
+                if set_op is _LITERAL:
+                    members |= _literal_chars(set_av, ignore_case)
+                elif set_op is _RANGE:
+                    for code in range(set_av[0], min(set_av[1], 127) + 1):
+                        members |= _literal_chars(code, ignore_case)
+                    if set_av[1] > 127:
+                        members.add("\x80")
+                elif set_op is _CATEGORY:
+                    members |= _CATEGORY_CHARS.get(set_av, _ALPHABET)
+            negated = any(set_op is _NEGATE for set_op, _ in av)
+            chars |= (_ALPHABET - members) if negated else members
+        elif op in _REPEATS:
+            chars |= _char_set(list(av[2]), ignore_case)
+        elif op is _BRANCH:
+            for branch in av[1]:
+                chars |= _char_set(list(branch), ignore_case)
+        elif op is _AT or op in _ASSERTIONS:
+            continue
+        else:
+            body = _group_body(op, av)
+            chars |= _char_set(body, ignore_case) if body is not None else _ALPHABET
+    return frozenset(chars)
+
+
+def _can_be_empty(items) -> bool:
+    """True if a sequence of nodes can match the empty string."""
+    for op, av in items:
+        if is_zero_width(op, av):
+            continue
+        if op in _REPEATS:
+            if av[0] > 0 and not _can_be_empty(list(av[2])):
+                return False
+        elif op is _BRANCH:
+            if not any(_can_be_empty(list(branch)) for branch in av[1]):
+                return False
+        elif op in (_LITERAL, _NOT_LITERAL, _ANY, _IN):
+            return False
+        else:
+            body = _group_body(op, av)
+            if body is not None and not _can_be_empty(body):
+                return False
+    return True
+
+
+def _flatten_groups(items) -> list:
+    """Inlines the contents of groups, so (?:\s+\w+) is seen as the sequence \s+ \w+."""
+    flat = []
+    for op, av in items:
+        body = _group_body(op, av)
+        flat.extend(_flatten_groups(body) if body is not None else [(op, av)])
+    return flat
+
+
+def _unbounded_repeats(items):
+    """Yields (top-level index, repeat body) for every unbounded repeat in a sequence."""
+    for index, (op, av) in enumerate(items):
+        if op in _REPEATS and av[1] == _MAXREPEAT:
+            yield index, list(av[2])
+        children = []
+        if op in _REPEATS:
+            children = [list(av[2])]
+        elif op is _BRANCH:
+            children = [list(branch) for branch in av[1]]
+        elif _group_body(op, av) is not None:
+            children = [_group_body(op, av)]
+        for child in children:
+            for _, body in _unbounded_repeats(child):
+                yield index, body
+
+
+def _is_wide(chars: frozenset) -> bool:
+    """True for classes such as '.' or [^x] that run across words and spaces alike."""
+    return " " in chars and "a" in chars
+
+
+def _backtracking_degree(items, ignore_case: bool, followed: bool, risks: list) -> int:
+    """
+    Returns how many word-crossing unbounded repeats are chained along the
+    sequence with something required after them. Each of them can make one
+    match attempt retry O(n) split points. Exponential risks are added to `risks`.
+    """
+    degree = 0
+    for index, (op, av) in enumerate(items):
+        after_required = followed or not _can_be_empty(items[index + 1:])
+        if op in _REPEATS:
+            _, max_count, body = av
+            body = list(body)
+            if max_count == _MAXREPEAT:
+                flat_body = _flatten_groups(body)
+                for inner_index, inner_body in _unbounded_repeats(flat_body):
+                    others = flat_body[:inner_index] + flat_body[inner_index + 1:]
+                    if _can_be_empty(others) or _char_set(others, ignore_case) & _char_set(inner_body, ignore_case):
+                        risks.append(("exponential", "an unbounded repeat nested in another one can split "
+                                                     "the same text in exponentially many ways"))
+                        break
+                if after_required and _is_wide(_char_set(body, ignore_case)):
+                    degree += 1
+            degree += _backtracking_degree(body, ignore_case, after_required or max_count > 1, risks)
+        elif op is _BRANCH:
+            degree += max(_backtracking_degree(list(branch), ignore_case, after_required, risks)
+                          for branch in av[1])
+        else:
+            body = _group_body(op, av)
+            if body is not None:
+                degree += _backtracking_degree(body, ignore_case, after_required, risks)
+    return degree
+
+
+def backtracking_risks(pattern: str, flags: int = 0) -> list:
+    """
+    Statically looks for super-linear backtracking in a pattern used with
+    search()/findall(). Returns [(severity, description)], where severity is
+    "exponential" (nested ambiguous repeats such as (a+)+) or "polynomial"
+    (e.g. r'what.*become': every 'what' scans to the end of the text, O(n^2)).
+    """
+    items = list(parse_pattern(pattern, flags))
+    ignore_case = bool(flags & re.IGNORECASE)
+    risks = []
+    degree = _backtracking_degree(items, ignore_case, False, risks)
+    anchored = bool(items) and items[0] == (_AT, sre_constants.AT_BEGINNING_STRING) or (
+        bool(items) and items[0] == (_AT, sre_constants.AT_BEGINNING) and not flags & re.MULTILINE)
+    exponent = degree + (0 if anchored else 1)
+    if degree and exponent >= 2:
+        risks.append(("polynomial", f"O(n^{exponent}): {degree} '.*'-style repeat(s) across words "
+                                    "with more pattern after them"))
+    return risks
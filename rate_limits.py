@@ -0,0 +1,176 @@
+"""
+rate_limits.py
+
+Building blocks that keep the bot within Discord's rate limits and stop
+message floods from costing CPU:
+
+  - TokenBucket: `rate` tokens per second, up to `capacity` saved for bursts.
+  - KeyedTokenBuckets: one bucket per key (user, channel), bounded in number.
+  - BurstCoalescer: merges the messages a user sends in quick succession into
+    one, so a burst is classified and answered once.
+
+The coalescer answers the first message of a burst right away. Messages that
+follow within `window` seconds are held, and answered together (one text, one
+reply) once the user pauses for `window` seconds, or at the latest `max_wait`
+seconds after the first held message.
+"""
+
+import time
+import asyncio
+import logging
+import collections
+
+
+class TokenBucket:
+    """A token bucket, refilled continuously."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def take(self, now: float, amount: float = 1.0) -> bool:
+        """Takes `amount` tokens if the bucket has them."""
+        self._refill(now)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def wait_time(self, now: float, amount: float = 1.0) -> float:
+        """Seconds until `amount` tokens are available (0 if they are now)."""
+        self._refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class KeyedTokenBuckets:
+    """
+    One token bucket per key, created full on first use. At most `max_keys`
+    buckets are kept; the least recently used one is dropped beyond that
+    (a dropped bucket comes back full, so this only ever errs on the lenient side).
+    """
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = 100000, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = collections.OrderedDict()  # key -> TokenBucket
+
+    def _bucket(self, key, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def take(self, key, amount: float = 1.0) -> bool:
+        now = self.clock()
+        return self._bucket(key, now).take(now, amount)
+
+    def wait_time(self, key, amount: float = 1.0) -> float:
+        now = self.clock()
+        return self._bucket(key, now).wait_time(now, amount)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class _Burst:
+    """A user's recent activity: the held messages and the timer that will answer them."""
+
+    __slots__ = ("texts", "context", "first_held_at", "timer")
+
+    def __init__(self):
+        self.texts = []
+        self.context = None
+        self.first_held_at = 0.0
+        self.timer = None
+
+
+class BurstCoalescer:
+    """
+    Calls the `handler` coroutine function with (context, text) once per burst
+    of messages from the same key. `context` is the one passed with the last
+    message of the burst (e.g. the Discord message, to reply in its channel).
+    """
+
+    def __init__(self, handler, window: float = 1.0, max_wait: float = 3.0, max_parts: int = 10):
+        self.handler = handler
+        self.window = window
+        self.max_wait = max_wait
+        self.max_parts = max_parts
+        self._bursts = {}  # key -> _Burst, for keys active within the last `window` seconds
+        self._tasks = set()  # running handler calls, kept so they are not garbage collected
+
+        self.answered = 0   # handler calls
+        self.coalesced = 0  # messages merged into another message's answer
+        self.failed = 0     # handler calls that raised
+
+    def submit(self, key, text: str, context=None) -> bool:
+        """Returns True if the message is answered right away, False if it is held for its burst."""
+        loop = asyncio.get_running_loop()
+        burst = self._bursts.get(key)
+        if burst is None:
+            # A quiet user: answer now and remember them for `window` seconds.
+            burst = self._bursts[key] = _Burst()
+            burst.timer = loop.call_later(self.window, self._fire, key, burst)
+            self._run(context, text)
+            return True
+
+        now = loop.time()
+        if not burst.texts:
+            burst.first_held_at = now
+        burst.texts.append(text)
+        del burst.texts[:-self.max_parts]
+        burst.context = context
+        burst.timer.cancel()
+        delay = min(self.window, burst.first_held_at + self.max_wait - now)
+        burst.timer = loop.call_later(max(delay, 0.0), self._fire, key, burst)
+        return False
+
+    def _fire(self, key, burst: _Burst):
+        if self._bursts.get(key) is not burst:
+            return
+        if not burst.texts:
+            del self._bursts[key]  # quiet for a whole window
+            return
+        self.coalesced += len(burst.texts) - 1
+        text, burst.texts = "\n".join(burst.texts), []
+        burst.timer = asyncio.get_running_loop().call_later(self.window, self._fire, key, burst)
+        self._run(burst.context, text)
+
+    def _run(self, context, text: str):
+        self.answered += 1
+        task = asyncio.get_running_loop().create_task(self.handler(context, text))
+        self._tasks.add(task)
+        task.add_done_callback(self._handler_done)
+
+    def _handler_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()  # retrieved, so asyncio does not report it as never retrieved
+        if error is not None:
+            self.failed += 1
+            logging.error(f"Burst handler failed: {error!r}", exc_info=error)
+
+    def __len__(self):
+        return len(self._bursts)
+
+    def stats(self) -> dict:
+        return {"active_users": len(self._bursts), "answered": self.answered, "coalesced": self.coalesced,
+                "failed": self.failed}
@@ -0,0 +1,151 @@
+"""
+regex_safety.py
+
+Keeps regex matching time bounded, whatever users type.
+
+Static audit: every pattern in knowledge_base.intent_patterns and
+entity_patterns is checked for super-linear backtracking
+(pattern_analysis.backtracking_risks). With --measure, every pattern is also
+timed on crafted inputs (its own keywords repeated, long runs of one letter)
+at two lengths, and the growth of the matching time is reported.
+
+Runtime guards: nlu caps the length of the analysed text, matches long texts in
+chunks (so an O(n^2) pattern costs O(n * chunk) instead) and stops scoring a
+message once its time budget is spent. chunk_text() below does the splitting.
+
+Usage:
+    python regex_safety.py              # static audit; exit 1 on exponential risks
+    python regex_safety.py --measure    # also time each pattern on crafted inputs
+"""
+
+import os
+import re
+import sys
+import math
+import time
+import argparse
+
+import knowledge_base
+from pattern_analysis import backtracking_risks, literal_prefixes
+
+# Defaults of the runtime guards (see nlu.py and .env.example).
+MAX_MESSAGE_CHARS = int(os.getenv("MAX_MESSAGE_CHARS", "4000"))
+MATCH_CHUNK_CHARS = int(os.getenv("MATCH_CHUNK_CHARS", "512"))
+MATCH_BUDGET_MS = float(os.getenv("MATCH_BUDGET_MS", "25"))
+
+# Where chunk_text prefers to cut. A mark must be followed by a space, so "node.js" or "3.5" is not cut.
+_SENTENCE_BREAKS = (". ", "! ", "? ", "\n")
+
+
+def chunk_text(text: str, size: int) -> list:
+    """
+    Splits text into pieces of at most `size` characters. Each piece ends after
+    the last sentence break in the second half of the window, so phrases like
+    "machine learning" stay in one piece, or else at the last whitespace
+    before the limit, so words stay whole.
+    """
+    if len(text) <= size:
+        return [text]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + size
+        if end < len(text):
+            sentence_end = max(text.rfind(mark, start + size // 2, end) for mark in _SENTENCE_BREAKS)
+            cut = text.rfind(" ", start + 1, end)
+            if sentence_end > start:
+                end = sentence_end + 1
+            elif cut > start:
+                end = cut
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+def knowledge_base_patterns(kb=knowledge_base) -> list:
+    """Returns [(source, pattern)] for every intent and entity pattern."""
+    patterns = [(f"intent:{intent}", pattern)
+                for intent, entries in kb.intent_patterns.items() for pattern, _ in entries]
+    patterns += [(f"entity:{entity_type}", pattern)
+                 for entity_type, entries in kb.entity_patterns.items() for pattern in entries]
+    return patterns
+
+
+def audit_patterns(patterns: list, flags: int = re.IGNORECASE) -> list:
+    """Returns [(source, pattern, severity, description)] for every risk found."""
+    findings = []
+    for source, pattern in patterns:
+        for severity, description in backtracking_risks(pattern, flags):
+            findings.append((source, pattern, severity, description))
+    return findings
+
+
+def crafted_inputs(pattern: str, length: int, flags: int = re.IGNORECASE) -> list:
+    """Inputs that make a backtracking pattern work hard: its own keywords, repeated."""
+    inputs = ["a" * length, ("a " * length)[:length]]
+    for prefix in sorted(literal_prefixes(pattern, flags) or ())[:5]:
+        inputs.append(((prefix + " ") * length)[:length])
+    return inputs
+
+
+def _best_time(compiled, chunks: list, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for chunk in chunks:
+            compiled.findall(chunk)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def measure_growth(pattern: str, length: int = MAX_MESSAGE_CHARS, chunk_size: int = MATCH_CHUNK_CHARS,
+                   flags: int = re.IGNORECASE) -> tuple:
+    """
+    Times the pattern on crafted inputs of length/4 and length characters.
+    Returns (seconds, growth exponent, seconds when matched in chunks) for the
+    slowest input at `length`. An exponent of ~1 is linear, ~2 quadratic.
+    """
+    compiled = re.compile(pattern, flags)
+    worst = (0.0, 1.0, 0.0)
+    for short_input, long_input in zip(crafted_inputs(pattern, length // 4, flags),
+                                       crafted_inputs(pattern, length, flags)):
+        short_time = _best_time(compiled, [short_input])
+        long_time = _best_time(compiled, [long_input])
+        if long_time > worst[0]:
+            exponent = math.log(max(long_time, 1e-7) / max(short_time, 1e-7), 4)
+            worst = (long_time, exponent, _best_time(compiled, chunk_text(long_input, chunk_size)))
+    return worst
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Audit the knowledge base patterns for catastrophic backtracking.")
+    parser.add_argument("--measure", action="store_true", help="also time every pattern on crafted inputs")
+    parser.add_argument("--length", type=int, default=MAX_MESSAGE_CHARS, help="length of the crafted inputs")
+    parser.add_argument("--chunk", type=int, default=MATCH_CHUNK_CHARS, help="chunk size used at runtime")
+    parser.add_argument("--max-ms", type=float, default=MATCH_BUDGET_MS,
+                        help="with --measure, fail if a pattern matched in chunks takes longer than this")
+    args = parser.parse_args(argv)
+
+    patterns = knowledge_base_patterns()
+    findings = audit_patterns(patterns)
+    print(f"Audited {len(patterns)} patterns: {len(findings)} risk(s) found.")
+    for source, pattern, severity, description in findings:
+        print(f"  [{severity}] {source}: {description}\n      {pattern[:120]}{'...' if len(pattern) > 120 else ''}")
+    failed = any(severity == "exponential" for _, _, severity, _ in findings)
+
+    if args.measure:
+        print(f"\nSlowest patterns on crafted {args.length}-character inputs (whole / in {args.chunk}-character chunks):")
+        timings = sorted(((measure_growth(pattern, args.length, args.chunk), source, pattern)
+                          for source, pattern in patterns), reverse=True)
+        for (seconds, exponent, chunked), source, pattern in timings[:10]:
+            print(f"  {seconds * 1000:8.2f} ms / {chunked * 1000:6.2f} ms  growth n^{exponent:.1f}  "
+                  f"{source}: {pattern[:60]}")
+        slowest_chunked = max((timing[0][2] for timing in timings), default=0.0)
+        if slowest_chunked * 1000 > args.max_ms:
+            print(f"\nA pattern takes more than {args.max_ms:.0f} ms on a crafted input, even in chunks.")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
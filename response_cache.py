@@ -0,0 +1,105 @@
+"""
+response_cache.py
+
+A small thread-safe cache with LRU and TTL eviction, used by nlu.py to skip
+the intent/entity pipeline for messages it has already seen.
+
+Each cache is bound to a knowledge base version: when the version it is asked
+about differs from the one its entries were computed with, it empties itself,
+so answers built from an old knowledge base are never served.
+"""
+
+import collections
+import threading
+import time
+
+
+def normalize_message(message: str) -> str:
+    """
+    Normalizes a message into a cache key: lowercased, trimmed, with runs of
+    whitespace collapsed. The pipeline analyses this normalized text, so a
+    cached analysis is always the one the message would have produced.
+    """
+    return " ".join(message.lower().split())
+
+
+class LRUTTLCache:
+    """Bounded mapping with least-recently-used and time-to-live eviction."""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.version = None
+        self._entries = collections.OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0      # removed to make room (LRU)
+        self.expirations = 0    # removed because their TTL ran out
+        self.invalidations = 0  # full clears caused by a knowledge base change
+
+    def bind_version(self, version):
+        """Clears the cache if it holds entries computed for another knowledge base version."""
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    if self._entries:
+                        self.invalidations += 1
+                    self._entries.clear()
+                    self.version = version
+
+    def get(self, key, default=None):
+        if self.max_size <= 0:
+            return default
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, version=None, ttl: float = None):
+        """
+        Stores a value, for `ttl` seconds instead of the cache's TTL if given.
+        If `version` is given and the cache has moved on to another one, it is dropped.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._entries[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,58 @@
+"""
+role_cards.py
+
+Replies that only depend on the knowledge base, rendered once when the
+knowledge index is built instead of on every request.
+
+A role card is the full "skills needed for <role>" answer of
+handle_role_to_skill_query. A role bullet is the "• **<role>**" line the
+skill-to-role answer lists for each suggested role.
+"""
+
+
+def render_role_card(role_data: dict) -> str:
+    """The Markdown answer listing every skill a role needs, by category."""
+    lines = [
+        f"Excellent choice! To become a **{role_data['display_name']}**, "
+        "you'll generally need the following skills:",
+        "",
+        f"_{role_data['description']}_",
+        "",
+    ]
+    for category, skills in role_data["skills"].items():
+        # Format category name nicely (e.g., 'core_concepts' -> 'Core Concepts')
+        category_name = category.replace("_", " ").title()
+        skill_list = ", ".join(f"`{skill}`" for skill in skills)
+        lines.append(f"• **{category_name}:** {skill_list}")
+    return "\n".join(lines) + "\n"
+
+
+class RoleCards:
+    """Read-only tables of pre-rendered role replies, keyed by role id."""
+
+    __slots__ = ("_cards", "_bullets")
+
+    def __init__(self, role_skill_map: dict):
+        self._cards = {role_id: render_role_card(role_data) for role_id, role_data in role_skill_map.items()}
+        self._bullets = {role_id: f"• **{role_data['display_name']}**"
+                         for role_id, role_data in role_skill_map.items()}
+
+    def __getstate__(self):
+        return self._cards, self._bullets
+
+    def __setstate__(self, state):
+        self._cards, self._bullets = state
+
+    def __contains__(self, role_id) -> bool:
+        return role_id in self._cards
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def card(self, role_id: str):
+        """The full skills answer for a role, or None for an unknown role."""
+        return self._cards.get(role_id)
+
+    def bullet(self, role_id: str) -> str:
+        """The list line naming a role in role suggestions."""
+        return self._bullets[role_id]
@@ -0,0 +1,99 @@
+"""
+role_matcher.py
+
+Vectorized role scoring for the 'Skills -> Role' feature.
+
+At startup the role/skill table in knowledge_base.role_skill_map is turned into
+a role x skill weight matrix (the category weight of each skill a role needs,
+0 elsewhere). Scoring a user's skills against every role is then a single
+gather-and-sum over the matrix columns of the skills they mentioned, and the
+best roles are picked with a partial selection rather than a full sort, so
+suggestions stay fast as the map grows.
+
+Supported metrics:
+  - "overlap":  weighted number of the user's skills the role needs.
+  - "coverage": weighted share of the role's skills the user already has.
+  - "jaccard":  weighted Jaccard similarity of the two skill sets (sum of the
+                smaller weight over sum of the larger one, per skill), the
+                same measure role_transitions uses between roles. It stops
+                large roles from winning just by listing more skills. A user's
+                skill weighs what it weighs for the roles that value it most.
+"""
+
+import numpy as np
+
+METRICS = ("overlap", "coverage", "jaccard")
+
+
+class RoleMatcher:
+    """Scores all roles against a set of skills at once."""
+
+    def __init__(self, role_skill_map: dict, category_weights: dict = None):
+        category_weights = category_weights or {}
+        self.role_ids = list(role_skill_map)
+        self.skills = sorted({
+            skill for role_data in role_skill_map.values()
+            for skills in role_data["skills"].values() for skill in skills
+        })
+        self.skill_index = {skill: column for column, skill in enumerate(self.skills)}
+
+        # weights[r, s] is the weight of skill s for role r (0 if the role does not need it).
+        # A skill listed under several categories of one role keeps its highest weight.
+        self.weights = np.zeros((len(self.role_ids), len(self.skills)), dtype=np.float32)
+        for row, role_id in enumerate(self.role_ids):
+            for category, skills in role_skill_map[role_id]["skills"].items():
+                weight = category_weights.get(category, 1.0)
+                for skill in skills:
+                    column = self.skill_index[skill]
+                    self.weights[row, column] = max(self.weights[row, column], weight)
+
+        self.role_weight_totals = self.weights.sum(axis=1)
+        # The weight of each skill on the user's side: its highest weight for any role.
+        self.skill_weights = self.weights.max(axis=0) if self.skills else np.zeros(0, dtype=np.float32)
+
+    def known_skills(self, skills) -> list:
+        """The column indices of the skills the matcher knows, without duplicates."""
+        return sorted({self.skill_index[skill] for skill in skills if skill in self.skill_index})
+
+    def score(self, skills, metric: str = "jaccard"):
+        """
+        Returns (scores, overlaps): one score per role for the given metric and
+        the raw number of the user's skills each role needs.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown role matching metric '{metric}'. Expected one of {METRICS}.")
+        columns = self.known_skills(skills)
+        if not columns:
+            zeros = np.zeros(len(self.role_ids), dtype=np.float32)
+            return zeros, zeros
+
+        gathered = self.weights[:, columns]
+        overlaps = np.count_nonzero(gathered, axis=1).astype(np.float32)
+        # Sum over the user's skills of the smaller weight: the role's own, as the user's is the largest.
+        scores = gathered.sum(axis=1)
+        if metric == "jaccard":
+            union = self.skill_weights[columns].sum() + self.role_weight_totals - scores
+            scores = np.divide(scores, union, out=np.zeros_like(scores), where=union > 0)
+        elif metric == "coverage":
+            totals = self.role_weight_totals
+            scores = np.divide(scores, totals, out=np.zeros_like(scores), where=totals > 0)
+        return scores, overlaps
+
+    def top_roles(self, skills, k: int = 3, metric: str = "jaccard") -> list:
+        """
+        Returns up to k (role_id, score, overlap) tuples for roles sharing at
+        least one skill with the user, best first. Ties are broken by the raw
+        overlap, then by the order of roles in the knowledge base.
+        """
+        scores, overlaps = self.score(skills, metric)
+        candidates = np.flatnonzero(overlaps > 0)
+        if candidates.size == 0:
+            return []
+        if candidates.size > k:
+            # Partial selection of the k best, then an exact ordering of just those.
+            # Include every candidate tied with the k-th score so tie-breaking stays exact.
+            kth_best = -np.partition(-scores[candidates], k - 1)[k - 1]
+            candidates = candidates[scores[candidates] >= kth_best]
+        order = np.lexsort((candidates, -overlaps[candidates], -scores[candidates]))
+        best = candidates[order[:k]]
+        return [(self.role_ids[row], float(scores[row]), int(overlaps[row])) for row in best]
@@ -0,0 +1,133 @@
+"""
+role_transitions.py
+
+Precomputed answers for the 'Role -> Role' feature ("I'm a data analyst, how
+do I become an ML engineer?").
+
+For every ordered pair of roles (from, to) the gap index stores the skills
+`to` needs that `from` does not list, the skills they share, and how alike
+the two roles are: a weighted Jaccard similarity of their skill sets (sum of
+the smaller weight over sum of the larger one, per skill), with the same
+category weights the role matcher uses.
+
+Roles at least NEIGHBOR_SIMILARITY alike are neighbours. For every pair the
+index also stores the route through neighbouring roles with the fewest steps
+(ties: the fewest new skills to learn along the way), for moves between roles
+with little in common. A pair that is itself neighbouring, or that no route
+connects, is a single step.
+
+Answering a transition question is then two dict lookups. When the knowledge
+base is reloaded, only the pairs involving a role whose skills changed are
+recomputed; the routes are recomputed from the stored similarities.
+"""
+
+import heapq
+import collections
+
+# Similarity from which two roles are neighbours, i.e. one step apart on a route.
+NEIGHBOR_SIMILARITY = 0.15
+
+RoleGap = collections.namedtuple("RoleGap", ("missing", "shared", "similarity"))
+RoleGap.__doc__ = "What moving from one role to another takes: skills to learn, skills to keep, similarity."
+
+
+def weighted_skills(role_data: dict, category_weights: dict) -> dict:
+    """{skill: weight} for one role, in listing order. A skill listed twice keeps its highest weight."""
+    skills = {}
+    for category, category_skills in role_data["skills"].items():
+        weight = category_weights.get(category, 1.0)
+        for skill in category_skills:
+            skills[skill] = max(skills.get(skill, 0.0), weight)
+    return skills
+
+
+def compute_gap(source: dict, target: dict) -> RoleGap:
+    """The gap from a role with `source` skills to one with `target` skills (both from weighted_skills)."""
+    # Most important first (technical skills before soft skills), listing order otherwise.
+    missing = sorted((skill for skill in target if skill not in source), key=lambda skill: -target[skill])
+    shared = sorted((skill for skill in target if skill in source), key=lambda skill: -target[skill])
+    common = sum(min(weight, source[skill]) for skill, weight in target.items() if skill in source)
+    union = sum(source.values()) + sum(target.values()) - common
+    return RoleGap(tuple(missing), tuple(shared), round(common / union, 4) if union else 0.0)
+
+
+class RoleGapIndex:
+    """All-pairs skill gaps and step-by-step routes between roles."""
+
+    def __init__(self, role_skill_map: dict, category_weights: dict = None, previous=None):
+        self.category_weights = dict(category_weights or {})
+        self.skills = {role_id: weighted_skills(role_data, self.category_weights)
+                       for role_id, role_data in role_skill_map.items()}
+
+        # Pairs between roles whose skills did not change are taken from the previous index.
+        reusable = previous is not None and previous.category_weights == self.category_weights
+        changed = {
+            role_id for role_id, skills in self.skills.items()
+            if not reusable or role_id not in previous.skills
+            or list(previous.skills[role_id].items()) != list(skills.items())
+        }
+        self.gaps = {}
+        self.recomputed = 0  # pairs computed by this build, as opposed to reused
+        for source, source_skills in self.skills.items():
+            for target, target_skills in self.skills.items():
+                if source == target:
+                    continue
+                if source in changed or target in changed:
+                    self.gaps[(source, target)] = compute_gap(source_skills, target_skills)
+                    self.recomputed += 1
+                else:
+                    self.gaps[(source, target)] = previous.gaps[(source, target)]
+
+        self.neighbors = {role_id: [] for role_id in self.skills}
+        for (source, target), gap in self.gaps.items():
+            if gap.similarity >= NEIGHBOR_SIMILARITY:
+                self.neighbors[source].append(target)
+        self.routes = {}
+        for source in self.skills:
+            self.routes.update(self._routes_from(source))
+
+    def _routes_from(self, source: str) -> dict:
+        """Dijkstra over the neighbour graph; a step costs (1 step, its missing skills)."""
+        best = {source: (0, 0)}
+        previous_step = {}
+        heap = [(0, 0, source)]
+        while heap:
+            steps, to_learn, role_id = heapq.heappop(heap)
+            if best[role_id] < (steps, to_learn):
+                continue
+            for neighbor in self.neighbors[role_id]:
+                cost = (steps + 1, to_learn + len(self.gaps[(role_id, neighbor)].missing))
+                if neighbor not in best or cost < best[neighbor]:
+                    best[neighbor] = cost
+                    previous_step[neighbor] = role_id
+                    heapq.heappush(heap, (*cost, neighbor))
+
+        routes = {}
+        for target in self.skills:
+            if target == source:
+                continue
+            if target not in previous_step:
+                routes[(source, target)] = (source, target)  # no route through neighbours
+                continue
+            route = [target]
+            while route[-1] != source:
+                route.append(previous_step[route[-1]])
+            routes[(source, target)] = tuple(reversed(route))
+        return routes
+
+    def gap(self, source: str, target: str):
+        """The RoleGap from `source` to `target`, or None if either role is unknown (or they are the same)."""
+        return self.gaps.get((source, target))
+
+    def closest(self, source: str, k: int = 3) -> tuple:
+        """The k roles most alike to `source`, most alike first (ties in knowledge base order)."""
+        others = [role_id for role_id in self.skills if role_id != source and source in self.skills]
+        others.sort(key=lambda role_id: -self.gaps[(source, role_id)].similarity)
+        return tuple(others[:k])
+
+    def route(self, source: str, target: str) -> tuple:
+        """The role ids from `source` to `target` through neighbouring roles, both ends included."""
+        return self.routes.get((source, target), ())
+
+    def __len__(self):
+        return len(self.gaps)
@@ -0,0 +1,148 @@
+"""
+sessions.py
+
+Short-term conversation state per user and channel, so follow-ups such as
+"tell me more about the first one" can be answered from what the bot said
+last instead of being analysed as a new question.
+
+A Session is a small slotted record (no per-instance dict): the last intent,
+the role ids the last reply named (ranked, for role suggestions) and the
+skills the user mentioned. Strings are interned, so the role ids and skill
+names are shared by every session instead of copied into each one.
+
+The SessionStore keeps them in least-recently-used order and evicts on three
+limits: a TTL since the user's last message, a maximum number of sessions and
+a cap on the memory the sessions take (estimated per record with
+sys.getsizeof, shared strings excluded). A session naming three roles and
+two skills takes about 360 bytes, so 200,000 active users need about 70 MB.
+"""
+
+import sys
+import time
+import threading
+import collections
+
+# Approximate memory of one OrderedDict slot (hash table entry plus the
+# linked-list node used for LRU order), on top of the key and the record.
+_ENTRY_OVERHEAD = 104
+
+
+class Session:
+    """What the bot last answered one user in one channel."""
+
+    __slots__ = ("intent", "roles", "skills", "expires_at")
+
+    def __init__(self, intent: str = None, roles: tuple = (), skills: tuple = ()):
+        self.intent = sys.intern(intent) if intent else None
+        self.roles = tuple(sys.intern(role_id) for role_id in roles)
+        self.skills = tuple(sys.intern(skill) for skill in skills)
+        self.expires_at = 0.0
+
+    def __getstate__(self):
+        return self.intent, self.roles, self.skills
+
+    def __setstate__(self, state):
+        # Re-intern after crossing a process boundary, so the strings are shared again.
+        self.__init__(*state)
+
+    def __repr__(self):
+        return f"Session(intent={self.intent!r}, roles={self.roles!r}, skills={self.skills!r})"
+
+    def footprint(self) -> int:
+        """Bytes held by this record alone (interned strings are shared and not counted)."""
+        return (sys.getsizeof(self) + sys.getsizeof(self.roles) + sys.getsizeof(self.skills)
+                + sys.getsizeof(self.expires_at))
+
+
+class SessionStore:
+    """Sessions keyed by (channel id, user id), with TTL, LRU and memory-cap eviction."""
+
+    def __init__(self, max_sessions: int = 200000, ttl: float = 1800.0, max_bytes: int = 96 * 1024 * 1024,
+                 clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.bytes = 0
+        self._entries = collections.OrderedDict()  # packed key -> Session
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0    # removed to stay under max_sessions or max_bytes
+        self.expirations = 0  # removed because the user went quiet for longer than the TTL
+
+    @staticmethod
+    def key(channel_id: int, user_id: int) -> int:
+        """Packs two Discord ids (64-bit snowflakes) into one int, smaller than a tuple of two."""
+        return (channel_id << 64) | user_id
+
+    @staticmethod
+    def _entry_size(key: int, session: Session) -> int:
+        return _ENTRY_OVERHEAD + sys.getsizeof(key) + session.footprint()
+
+    def _remove(self, key: int, session: Session):
+        del self._entries[key]
+        self.bytes -= self._entry_size(key, session)
+
+    def get(self, key: int):
+        """The user's live session, or None. Restarts its TTL."""
+        if self.max_sessions <= 0:
+            return None
+        with self._lock:
+            session = self._entries.get(key)
+            if session is None:
+                self.misses += 1
+                return None
+            now = self.clock()
+            if session.expires_at <= now:
+                self._remove(key, session)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            # A lookup is a use: refresh both the LRU position and the TTL, so they stay in the same order.
+            session.expires_at = now + self.ttl
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return session
+
+    def put(self, key: int, session: Session):
+        """Stores the user's session (replacing any previous one) and restarts its TTL."""
+        if self.max_sessions <= 0:
+            return
+        now = self.clock()
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None:
+                self._remove(key, previous)
+            session.expires_at = now + self.ttl
+            self._entries[key] = session
+            self.bytes += self._entry_size(key, session)
+
+            # Sessions are in last-use order and share one TTL, so expired ones are at the front.
+            while self._entries:
+                oldest_key, oldest = next(iter(self._entries.items()))
+                if oldest.expires_at <= now:
+                    self.expirations += 1
+                elif len(self._entries) > self.max_sessions or self.bytes > self.max_bytes:
+                    self.evictions += 1
+                else:
+                    break
+                self._remove(oldest_key, oldest)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_sessions": self.max_sessions,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
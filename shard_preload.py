@@ -0,0 +1,20 @@
+"""
+shard_preload.py
+
+Imported once by the fork server that shards.py starts the shards from: loads
+discord.py and the knowledge index and compiles every pattern the index holds,
+then moves every object loaded so far out of the garbage collector's reach
+(gc.freeze), so collections in the shards do not write to those objects and
+their memory, compiled patterns included, stays shared between shards.
+"""
+
+import gc
+
+import discord  # noqa: F401
+import nlu
+
+# load_index already compiles the index; make sure of it before freezing, as a
+# pattern compiled later would be compiled again in every shard.
+nlu.INDEX.compile()
+
+gc.freeze()
@@ -0,0 +1,302 @@
+"""
+shards.py
+
+Runs the bot as several Discord shards, one process per shard, under a
+supervisor. Discord assigns every guild to one shard, so N shards spread the
+gateway traffic and the response pipeline over N cores.
+
+The shards share one copy of the knowledge structures. The supervisor builds
+(or refreshes) the knowledge base snapshot once, then starts the shards from a
+fork server that has already imported nlu (shard_preload.py): every shard is
+forked from that process, so the loaded index (gazetteer, intent rules,
+fuzzy index, role gaps) is shared copy-on-write and the role/skill matrix is
+memory-mapped from the snapshot file. An extra shard costs its own Discord client, caches and
+sessions, not another index. A knowledge base reload in one shard is private
+to that shard (each one watches knowledge_base.py).
+
+The supervisor restarts a shard that exits or stops reporting, with an
+exponential backoff for shards that keep crashing. Every shard reports its
+health (ready, gateway latency, guilds), dispatcher and memory figures and its
+metrics every SHARD_REPORT_INTERVAL seconds. The supervisor logs the totals and
+serves the metrics of all shards on one /metrics endpoint (counters and
+histograms summed, gauges per shard as bot_shard); the shards' own endpoints
+are disabled. Each shard logs to logs/bot-shard-<id>.log.
+
+Usage:
+    python shards.py                # SHARD_COUNT shards (default: one per CPU)
+    python shards.py --shards 4
+"""
+
+import os
+import sys
+import math
+import time
+import queue
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+
+from dotenv import load_dotenv
+
+import metrics
+from structured_logging import setup_logging, shutdown_logging
+
+# Load environment variables from .env file (before anything reads them)
+load_dotenv()
+
+SHARD_REPORT_INTERVAL = float(os.getenv("SHARD_REPORT_INTERVAL", "10"))
+# A shard that has not reported for this long is considered hung and restarted.
+SHARD_HEALTH_TIMEOUT = float(os.getenv("SHARD_HEALTH_TIMEOUT", "120"))
+# Restart delay after a crash doubles with every crash in a row, up to this many seconds.
+MAX_RESTART_DELAY = 60.0
+# A shard that ran at least this long before exiting is restarted without delay.
+STABLE_UPTIME = 60.0
+
+# Figures summed over the shards in the supervisor's log line.
+_SUMMED_STATS = ("ready", "guilds", "queue_depth", "completed", "shed", "sessions", "rss_mb", "private_mb")
+
+
+def memory_usage() -> dict:
+    """
+    Memory of this process in MB (Linux only): resident, proportional (shared
+    pages divided between the processes that map them) and private.
+    """
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as handle:
+            for line in handle:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                    fields[name] = int(value.split()[0]) / 1024
+    except (OSError, ValueError):
+        return {}
+    return {
+        "rss_mb": round(fields.get("Rss", 0.0), 1),
+        "pss_mb": round(fields.get("Pss", 0.0), 1),
+        "private_mb": round(fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0), 1),
+    }
+
+
+# --- SHARD PROCESS ---
+
+def _shard_stats(bot) -> dict:
+    latency = bot.client.latency
+    stats = {
+        "ready": int(bot.client.is_ready()),
+        "latency_ms": round(latency * 1000, 1) if math.isfinite(latency) else -1,
+        "guilds": len(bot.client.guilds),
+        "sessions": len(bot.dispatcher.sessions),
+    }
+    stats.update({name: value for name, value in bot.dispatcher.stats().items() if isinstance(value, (int, float))})
+    for cache, figures in bot.nlu.cache_stats().items():
+        stats[f"{cache}_cache_size"] = figures["size"]
+        stats[f"{cache}_cache_hit_rate"] = figures["hit_rate"]
+    stats.update(memory_usage())
+    return stats
+
+
+def _report(bot, shard_id: int, reports, interval: float):
+    """Shard thread: sends health, stats and the metrics recorded since the last report."""
+    while True:
+        try:
+            reports.put_nowait((shard_id, os.getpid(), _shard_stats(bot), metrics.REGISTRY.drain()))
+        except queue.Full:
+            logging.warning("The supervisor is not reading shard reports; dropping one.")
+        except Exception as error:
+            logging.error(f"Could not report shard stats: {error!r}")
+        time.sleep(interval)
+
+
+def _run_shard(shard_id: int, shard_count: int, reports, interval: float):
+    """Shard process entry point: runs bot.py for one shard."""
+    base, extension = os.path.splitext(os.getenv("LOG_FILE", os.path.join("logs", "bot.log")))
+    os.environ.update({
+        "SHARD_ID": str(shard_id),
+        "SHARD_COUNT": str(shard_count),
+        "METRICS_PORT": "0",  # the supervisor serves every shard's metrics
+        "LOG_FILE": f"{base}-shard-{shard_id}{extension}",
+    })
+    import bot
+    threading.Thread(target=_report, args=(bot, shard_id, reports, interval),
+                     name="shard-report", daemon=True).start()
+    bot.run()
+
+
+# --- SUPERVISOR ---
+
+class _Shard:
+    """The supervisor's view of one shard."""
+
+    def __init__(self, shard_id: int):
+        self.shard_id = shard_id
+        self.process = None
+        self.started_at = 0.0
+        self.last_report = 0.0
+        self.stats = {}
+        self.restarts = 0
+        self.crashes_in_a_row = 0
+        self.start_after = 0.0  # monotonic time of the next (re)start
+
+
+class ShardSupervisor:
+    """Starts, watches and restarts the shard processes and collects their reports."""
+
+    def __init__(self, shard_count: int, report_interval: float = SHARD_REPORT_INTERVAL,
+                 health_timeout: float = SHARD_HEALTH_TIMEOUT, target=_run_shard):
+        self.shard_count = shard_count
+        self.report_interval = report_interval
+        self.health_timeout = health_timeout
+        self.target = target
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            # Shards are forked from a process that has already loaded the index.
+            self.context = multiprocessing.get_context("forkserver")
+            self.context.set_forkserver_preload(["shard_preload"])
+        else:
+            self.context = multiprocessing.get_context("spawn")
+        self.reports = self.context.Queue(maxsize=max(100, 10 * shard_count))
+        self.shards = [_Shard(shard_id) for shard_id in range(shard_count)]
+        self.stopping = threading.Event()
+
+    def _start(self, shard: _Shard):
+        shard.process = self.context.Process(
+            target=self.target, args=(shard.shard_id, self.shard_count, self.reports, self.report_interval),
+            name=f"shard-{shard.shard_id}")
+        shard.process.start()
+        shard.started_at = shard.last_report = time.monotonic()
+        shard.stats = {}
+        logging.info(f"Shard {shard.shard_id}/{self.shard_count} started (pid {shard.process.pid}).")
+
+    def _collect_reports(self, timeout: float):
+        """Reads the shard reports that arrive within `timeout` seconds."""
+        try:
+            report = self.reports.get(timeout=timeout)
+            while True:
+                shard_id, pid, stats, metrics_delta = report
+                shard = self.shards[shard_id]
+                if shard.process is not None and shard.process.pid == pid:
+                    shard.last_report = time.monotonic()
+                    shard.stats = stats
+                metrics.REGISTRY.merge(metrics_delta)
+                report = self.reports.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _check(self, shard: _Shard):
+        """Restarts a shard that exited or stopped reporting."""
+        now = time.monotonic()
+        if shard.process is None:
+            if now >= shard.start_after:
+                self._start(shard)
+            return
+        if shard.process.is_alive():
+            if now - shard.last_report > self.health_timeout:
+                logging.error(f"Shard {shard.shard_id} has not reported for {now - shard.last_report:.0f} s; "
+                              f"restarting it.")
+                _stop_process(shard.process)
+            return
+
+        uptime = now - shard.started_at
+        shard.crashes_in_a_row = 0 if uptime >= STABLE_UPTIME else shard.crashes_in_a_row + 1
+        delay = min(MAX_RESTART_DELAY, 2 ** shard.crashes_in_a_row - 1)
+        logging.warning(f"Shard {shard.shard_id} exited with code {shard.process.exitcode} after {uptime:.0f} s; "
+                        f"restarting in {delay:.0f} s.")
+        shard.process.close()
+        shard.process = None
+        shard.stats = {}
+        shard.restarts += 1
+        shard.start_after = now + delay
+
+    def health(self) -> dict:
+        """{shard id: figures} for every shard, including whether it is up and its restarts."""
+        health = {}
+        for shard in self.shards:
+            up = shard.process is not None and shard.process.is_alive()
+            health[shard.shard_id] = dict(shard.stats, up=int(up), restarts=shard.restarts)
+        return health
+
+    def summary(self) -> dict:
+        """Totals over every shard."""
+        health = self.health()
+        totals = {"shards": self.shard_count, "up": sum(figures["up"] for figures in health.values()),
+                  "restarts": sum(figures["restarts"] for figures in health.values())}
+        for name in _SUMMED_STATS:
+            totals[name] = round(sum(figures.get(name, 0) for figures in health.values()), 1)
+        totals["max_latency_ms"] = max((figures.get("latency_ms", -1) for figures in health.values()), default=-1)
+        return totals
+
+    def run(self, log_interval: float = 60.0):
+        """Supervises the shards until stop() is called, then stops them."""
+        next_log = time.monotonic() + log_interval
+        try:
+            while not self.stopping.is_set():
+                for shard in self.shards:
+                    self._check(shard)
+                self._collect_reports(timeout=1.0)
+                if log_interval and time.monotonic() >= next_log:
+                    next_log = time.monotonic() + log_interval
+                    logging.info(f"Shard stats: {self.summary()}")
+        finally:
+            for shard in self.shards:
+                if shard.process is not None:
+                    _stop_process(shard.process)
+            logging.info("All shards stopped.")
+
+    def stop(self):
+        self.stopping.set()
+
+
+def _stop_process(process, grace: float = 10.0):
+    """Asks a shard to shut down like on Ctrl+C, and kills it if it has not exited after `grace` seconds."""
+    if process.is_alive():
+        os.kill(process.pid, signal.SIGINT)
+        process.join(grace)
+    if process.is_alive():
+        process.kill()
+        process.join()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the bot as several Discord shards under a supervisor.")
+    parser.add_argument("--shards", type=int, default=int(os.getenv("SHARD_COUNT", "0")) or os.cpu_count(),
+                        help="number of shard processes (default: SHARD_COUNT, or one per CPU)")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    if not os.getenv("DISCORD_TOKEN"):
+        logging.error("FATAL: DISCORD_TOKEN environment variable not set.")
+        shutdown_logging()
+        return 1
+
+    # Builds the snapshot the shards load, and defines the metrics they report
+    # (every counter and histogram a shard can send must be registered here to be merged).
+    import nlu
+    import outbound  # noqa: F401
+    # Gauges describe the process serving them; the supervisor's own caches are idle.
+    # The shards' figures are in bot_shard instead.
+    for name, metric in list(metrics.REGISTRY.metrics.items()):
+        if metric.kind == "gauge":
+            metrics.REGISTRY.unregister(name)
+    supervisor = ShardSupervisor(args.shards)
+    metrics.Gauge("bot_shard", "Health, dispatcher and memory figures of each shard.",
+                  lambda: {(str(shard_id), name): value for shard_id, figures in supervisor.health().items()
+                           for name, value in figures.items()},
+                  ("shard", "stat"))
+    metrics_port = int(os.getenv("METRICS_PORT", "9464"))
+    if metrics_port:
+        metrics.start_metrics_server(metrics_port, os.getenv("METRICS_HOST", "127.0.0.1"))
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: supervisor.stop())
+    logging.info(f"Starting {args.shards} shard(s) for knowledge base {nlu.INDEX.version}.")
+    try:
+        supervisor.run(log_interval=float(os.getenv("STATS_LOG_INTERVAL", "60")))
+    except KeyboardInterrupt:
+        pass  # the shards got the same Ctrl+C; run() waits for them to stop
+    finally:
+        shutdown_logging()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
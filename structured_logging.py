@@ -0,0 +1,284 @@
+"""
+structured_logging.py
+
+Logging setup for the bot that keeps disk I/O off the event loop.
+
+In "async" mode (the default) the root logger only has a QueueHandler: logging
+a record appends it to an in-memory queue, and a background QueueListener
+thread formats and writes it. Message formatting is deferred to that thread as
+well, so the hot path pays neither for the disk nor for building the line.
+If the writer falls behind and the queue fills up, new records are dropped
+(and counted) rather than blocking the caller.
+
+Records are written to the log file as JSON lines, with size-based rotation:
+
+    {"ts": "...", "level": "INFO", "logger": "root", "msg": "Message: 'hi'",
+     "intents": ["greeting"], "entities": {}, "sample_rate": 0.1}
+
+Structured fields are passed with extra={"fields": {...}}. High-volume INFO
+records can also pass extra={"sampled": True}; only LOG_SAMPLE_RATE of those
+are kept. "sync" mode attaches the same handlers directly to the root logger.
+
+Usage:
+    python structured_logging.py    # compare the per-call cost of sync and async logging
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import random
+import logging
+import logging.handlers
+import multiprocessing
+
+LOG_MODES = ("async", "sync")
+
+CONSOLE_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+# Handlers and listeners of the current configuration, so they can be stopped.
+_handlers = []
+_listeners = []
+_worker_queue = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line, including its structured fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.processName != "MainProcess":
+            entry["process"] = record.process
+        entry.update(getattr(record, "fields", None) or {})
+        if getattr(record, "sampled", False):
+            entry["sample_rate"] = getattr(record, "sample_rate", 1.0)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """The classic one-line console format, with structured fields appended."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " | " + " | ".join(f"{key}: {value}" for key, value in fields.items())
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only `rate` of the records logged with extra={"sampled": True} at INFO or below."""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or record.levelno > logging.INFO or not getattr(record, "sampled", False):
+            return True
+        # In sync mode every handler has a filter; they must agree on a record.
+        if not hasattr(record, "sample_rate"):
+            record.sample_rate = self.rate
+            record.sample_keep = random.random() < self.rate
+            if not record.sample_keep:
+                self.dropped += 1
+        return record.sample_keep
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler that never blocks and, unless `eager` is set, leaves the
+    message unformatted: the listener thread calls getMessage() when it writes
+    the record. Records crossing a process boundary must be formatted eagerly,
+    since their arguments may not be picklable.
+    """
+
+    def __init__(self, log_queue, eager: bool = False):
+        super().__init__(log_queue)
+        self.eager = eager
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if self.eager:
+            return super().prepare(record)
+        record = copy.copy(record)
+        # Tracebacks hold references to live frames; render them now.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    """A QueueListener whose stop() waits for room in a full queue instead of raising queue.Full."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def _build_handlers(log_file: str, max_bytes: int, backup_count: int, console: bool) -> list:
+    handlers = []
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(ConsoleFormatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+    return handlers
+
+
+def setup_logging(mode: str = None, level: str = None, log_file: str = None, max_bytes: int = None,
+                  backup_count: int = None, queue_size: int = None, sample_rate: float = None,
+                  console: bool = True, handlers: list = None):
+    """
+    Configures the root logger. Every argument defaults to its LOG_* environment
+    variable (see .env.example). `handlers` replaces the file and console
+    handlers. Calling it again replaces the previous setup.
+    """
+    mode = mode or os.getenv("LOG_MODE", "async")
+    if mode not in LOG_MODES:
+        raise ValueError(f"Unknown log mode '{mode}'. Expected one of {LOG_MODES}.")
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    log_file = log_file if log_file is not None else os.getenv("LOG_FILE", os.path.join("logs", "bot.log"))
+    max_bytes = max_bytes if max_bytes is not None else int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    backup_count = backup_count if backup_count is not None else int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    queue_size = queue_size if queue_size is not None else int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    sample_rate = sample_rate if sample_rate is not None else float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+    shutdown_logging()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.setLevel(level.upper())
+
+    if handlers is None:
+        handlers = _build_handlers(log_file, max_bytes, backup_count, console)
+    _handlers.extend(handlers)
+    if mode == "sync":
+        front_handlers = _handlers
+    else:
+        log_queue = queue.Queue(maxsize=queue_size)
+        listener = FlushingQueueListener(log_queue, *_handlers, respect_handler_level=True)
+        listener.start()
+        _listeners.append(listener)
+        front_handlers = [NonBlockingQueueHandler(log_queue)]
+
+    for handler in front_handlers:
+        handler.addFilter(SamplingFilter(sample_rate))
+        root.addHandler(handler)
+
+
+def worker_log_queue():
+    """
+    Returns a multiprocessing queue that process pool workers can log to (see
+    configure_worker), drained by another listener into the same handlers.
+    Returns None in sync mode, where forked workers keep the inherited handlers.
+    """
+    global _worker_queue
+    if _worker_queue is None and _listeners:
+        _worker_queue = multiprocessing.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        listener = FlushingQueueListener(_worker_queue, *_handlers, respect_handler_level=True)
+        listener.start()
+        _listeners.append(listener)
+    return _worker_queue
+
+
+def configure_worker(log_queue):
+    """Process pool initializer helper: sends the worker's records to the main process."""
+    if log_queue is None:
+        return
+    root = logging.getLogger()
+    sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    handler = NonBlockingQueueHandler(log_queue, eager=True)
+    handler.addFilter(SamplingFilter(sample_rate))
+    root.addHandler(handler)
+
+
+def logging_stats() -> dict:
+    """Records dropped by sampling and because the queue was full."""
+    stats = {"sampled_out": 0, "queue_full_drops": 0}
+    for handler in logging.getLogger().handlers:
+        stats["queue_full_drops"] += getattr(handler, "dropped", 0)
+        for log_filter in handler.filters:
+            stats["sampled_out"] += getattr(log_filter, "dropped", 0)
+    return stats
+
+
+def shutdown_logging():
+    """Flushes the queues and stops the writer threads."""
+    global _worker_queue
+    while _listeners:
+        _listeners.pop().stop()
+    while _handlers:
+        _handlers.pop().close()
+    _worker_queue = None
+
+
+# --- HOT PATH COST ---
+
+class _SlowDiskHandler(logging.Handler):
+    """Simulates a stalling disk: every write takes `delay` seconds."""
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    def emit(self, record):
+        self.format(record)
+        time.sleep(self.delay)
+
+
+def _time_calls(calls: int) -> list:
+    latencies = []
+    entities = {"technology": ["python", "docker"], "role": ["devops engineer"]}
+    for number in range(calls):
+        started = time.perf_counter()
+        logging.info("Message: %r", f"message {number}",
+                     extra={"sampled": True, "fields": {"intents": ["career_path"], "entities": entities}})
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return latencies
+
+
+def main() -> int:
+    calls, delay = 2000, 0.002
+    print(f"{calls} INFO records per mode, each write stalling the 'disk' for {delay * 1000:.0f} ms")
+    print(f"{'mode':<8}{'mean us':>10}{'p99 us':>10}{'max us':>11}")
+    for mode in LOG_MODES:
+        slow_disk = _SlowDiskHandler(delay)
+        setup_logging(mode=mode, level="INFO", queue_size=calls, sample_rate=1.0, handlers=[slow_disk])
+        # A few hundred calls are enough to show the stalls in sync mode.
+        latencies = _time_calls(calls if mode == "async" else 200)
+        print(f"{mode:<8}{1e6 * sum(latencies) / len(latencies):>10.1f}"
+              f"{1e6 * latencies[int(0.99 * (len(latencies) - 1))]:>10.1f}{1e6 * latencies[-1]:>11.1f}")
+        slow_disk.delay = 0  # let the writer catch up before stopping it
+        shutdown_logging()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests build the knowledge index in memory rather than reading or writing snapshots/.
+os.environ.setdefault("KB_SNAPSHOT_DIR", "")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
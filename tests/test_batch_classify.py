@@ -0,0 +1,38 @@
+import json
+
+import batch_classify
+import nlu
+
+MESSAGES = [
+    "hi",
+    "what skills for a devops engineer",
+    "I'm proficient in python and react, what jobs can I get?",
+    "I know pyhton, kubernets and postgres, can I be a data scintist?",
+    "I'm a data analyst, how do I become an ML engineer?",
+    "how " + "x" * 1990 + " become",
+    ("what " * 400)[:2000],
+    "i know " + ", ".join(["python", "sql", "docker", "kubernets", "terraform"] * 60),
+] * 5
+
+
+def classify(tmp_path, *options):
+    source = tmp_path / "messages.txt"
+    source.write_text("\n".join(MESSAGES) + "\n", encoding="utf-8")
+    output = tmp_path / f"out{'-'.join(options)}.jsonl"
+    assert batch_classify.main([str(source), "-o", str(output), *options]) == 0
+    return [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+
+
+def test_output_does_not_depend_on_workers_or_chunks(tmp_path):
+    single = classify(tmp_path, "--workers", "1")
+    assert len(single) == len(MESSAGES)
+    assert classify(tmp_path, "--workers", "2", "--chunk-size", "7") == single
+    assert classify(tmp_path, "--workers", "1", "--chunk-size", "3") == single
+
+
+def test_classification_ignores_the_time_budget(monkeypatch):
+    expected = [nlu.classify_message(message) for message in MESSAGES[:8]]
+    monkeypatch.setattr(nlu, "MATCH_BUDGET_MS", 0)
+    monkeypatch.setattr(nlu, "FUZZY_BUDGET_MS", 0)
+    assert [nlu.classify_message(message) for message in MESSAGES[:8]] == expected
+    assert "data scientist" in expected[3]["entities"]["role"]
@@ -0,0 +1,21 @@
+import benchmark
+
+
+def test_noise_floor_and_threshold():
+    baseline = {"stages": {"fast": {"p95_us": 4.0}, "slow": {"p95_us": 400.0}, "new": {}}}
+    results = {"fast": {"p95_us": 8.0}, "slow": {"p95_us": 520.0}, "new": {"p95_us": 1.0}, "missing": {"p95_us": 1.0}}
+    regressions = benchmark.compare_to_baseline(results, baseline, threshold=0.25)
+    assert len(regressions) == 1 and regressions[0].startswith("slow:")
+    assert benchmark.compare_to_baseline(results, baseline, threshold=0.5) == []
+    assert len(benchmark.compare_to_baseline(results, baseline, threshold=0.25, noise_floor_us=0)) == 2
+
+
+def test_median_results():
+    runs = [{"stage": {"p95_us": value, "calls": 10}} for value in (300.0, 100.0, 200.0)]
+    assert benchmark.median_results(runs) == {"stage": {"p95_us": 200.0, "calls": 10}}
+
+
+def test_corpus_is_built_in():
+    corpus = benchmark.build_corpus()
+    assert corpus == benchmark.build_corpus()
+    assert len(corpus) > 100
@@ -0,0 +1,46 @@
+import pytest
+
+import nlu
+
+
+@pytest.fixture
+def session():
+    _, session = nlu.respond("I know python and sql, what jobs can I get")
+    assert len(session.roles) == 3
+    return session
+
+
+def card(session, position):
+    return nlu.INDEX.role_cards.card(session.roles[position])
+
+
+@pytest.mark.parametrize("message, position", [
+    ("tell me more about the first one", 0),
+    ("what skills does the second one need?", 1),  # scores as career_path
+    ("what about #3", 2),
+    ("the last one", -1),
+])
+def test_ordinal_follow_ups(session, message, position):
+    reply, kept = nlu.respond(message, session)
+    assert reply == card(session, position)
+    assert kept is session
+
+
+def test_more_asks_which_one(session):
+    reply, _ = nlu.respond("tell me more", session)
+    assert reply.startswith("Which one would you like to know more about")
+
+
+@pytest.mark.parametrize("message", [
+    "I know python, what are the first steps?",
+    "what are the first steps to become a devops engineer?",  # names a role: answered on its own
+])
+def test_questions_of_their_own_are_not_follow_ups(session, message):
+    reply, _ = nlu.respond(message, session)
+    assert reply != card(session, 0)
+
+
+def test_small_talk_keeps_the_session(session):
+    _, kept = nlu.respond("thanks", session)
+    reply, _ = nlu.respond("the second one", kept)
+    assert reply == card(session, 1)
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+import fuzzy_matcher
+from fuzzy_matcher import FuzzyMatcher
+
+VOCABULARY = {"python": "technology", "kubernetes": "technology", "postgresql": "technology",
+              "react native": "technology", "data scientist": "role", "flask": "technology"}
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return FuzzyMatcher(VOCABULARY)
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("i know pyhton", [("python", "technology", 1)]),
+    ("kubernets and postgressql", [("kubernetes", "technology", 1), ("postgresql", "technology", 1)]),
+    ("reactt native apps", [("react native", "technology", 1)]),
+    ("can i be a data scintist", [("data scientist", "role", 1)]),
+])
+def test_typos(matcher, message, expected):
+    assert matcher.match_tokens(message) == expected
+
+
+def test_stopwords_and_short_words_are_not_matched(matcher):
+    assert matcher.match_tokens("flash reach java") == []
+
+
+def test_covered_spans_are_skipped(matcher):
+    assert matcher.match_tokens("pyhton", covered=[(0, 6)]) == []
+
+
+def test_large_vocabulary_bounds_the_compared_candidates(monkeypatch):
+    rng = random.Random(1)
+    vocabulary = dict(VOCABULARY)
+    while len(vocabulary) < 20000:
+        vocabulary["".join(rng.choice("pythonabc") for _ in range(6))] = "technology"
+    matcher = FuzzyMatcher(vocabulary, cache_size=0)
+    compared = []
+    real_distance = fuzzy_matcher.bounded_edit_distance
+    monkeypatch.setattr(fuzzy_matcher, "bounded_edit_distance",
+                        lambda a, b, k: compared.append(b) or real_distance(a, b, k))
+    result = matcher.lookup("pythno")
+    assert result is not None and result[2] == 1
+    assert len(compared) <= fuzzy_matcher.MAX_CANDIDATES
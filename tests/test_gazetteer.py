@@ -0,0 +1,35 @@
+import pytest
+
+import knowledge_base
+from gazetteer import build_gazetteer
+
+
+@pytest.fixture(scope="module")
+def gazetteer():
+    return build_gazetteer(knowledge_base.entity_patterns, knowledge_base.role_skill_map)
+
+
+@pytest.mark.parametrize("message, technologies", [
+    ("I have experience with c++, c# and .net", ["c++", "c#", ".net"]),
+    ("c++, then c#", ["c++", "c#"]),
+    ("I build apps in react native", ["react native"]),
+    ("react and react native", ["react", "react native"]),
+    ("node.js or nodejs", ["node.js", "nodejs"]),
+])
+def test_longest_match(gazetteer, message, technologies):
+    assert gazetteer.extract(message).get("technology") == technologies
+
+
+def test_word_boundaries(gazetteer):
+    assert "technology" not in gazetteer.extract("reactive gopher")
+
+
+def test_order_of_appearance_without_duplicates(gazetteer):
+    found = gazetteer.extract("Backend developer or data analyst? I know SQL, python and sql")
+    assert found == {"role": ["backend developer", "data analyst"], "technology": ["sql", "python"]}
+
+
+def test_spans(gazetteer):
+    spans = []
+    gazetteer.extract("I know c++", spans)
+    assert spans == [(7, 10)]
@@ -0,0 +1,63 @@
+import re
+
+import pytest
+
+import knowledge_base
+from intent_engine import IntentEngine
+
+MESSAGES = [
+    "",
+    "hi",
+    "hello there! good morning",
+    "thanks a lot, bye",
+    "can you help me?",
+    "what skills for a devops engineer",
+    "What skills are needed to become a data scientist?",
+    "how do I become a backend developer",
+    "I'm proficient in python and react, what jobs can I get?",
+    "I know java, spring, docker and kubernetes. What should I do with my skills?",
+    "what does a product manager do",
+    "I am thinking of switching careers, what should I pursue with my background in sql?",
+    "how do I go from data analyst to ml engineer",
+    "ſkills for a devops engineer",  # non-ASCII: the keyword scan is bypassed
+    "what " * 50 + "become",
+]
+
+
+def reference_rank(intent_patterns: dict, message: str) -> list:
+    """The bot's original detect_intents: every pattern of every intent, in order."""
+    scores = {}
+    message_lower = message.lower()
+    for intent, patterns in intent_patterns.items():
+        score = 0
+        for pattern, weight in patterns:
+            matches = re.compile(pattern, re.IGNORECASE).findall(message_lower)
+            if matches:
+                score += weight * len(matches)
+        if score > 0:
+            scores[intent] = score
+    return sorted(scores.keys(), key=lambda k: scores[k], reverse=True)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return IntentEngine(knowledge_base.intent_patterns)
+
+
+@pytest.mark.parametrize("message", MESSAGES)
+def test_rank_matches_per_pattern_loop(engine, message):
+    assert engine.rank(message) == reference_rank(knowledge_base.intent_patterns, message)
+
+
+@pytest.mark.parametrize("message", MESSAGES)
+def test_rank_scores_matches_rank(engine, message):
+    assert engine.rank_scores(engine.scores(message)) == engine.rank(message)
+
+
+def test_ties_keep_declaration_order():
+    engine = IntentEngine({"first": [(r"\bsame\b", 1)], "second": [(r"\bsame\b", 1)]})
+    assert engine.rank("same") == ["first", "second"]
+
+
+def test_expired_deadline_skips_rules(engine):
+    assert engine.scores("how do I become a backend developer", deadline=0.0) == {}
@@ -0,0 +1,77 @@
+import io
+
+import numpy as np
+import pytest
+
+import knowledge_index
+
+
+def test_snapshot_load_compiles_every_pattern(tmp_path):
+    knowledge_index.load_index(str(tmp_path))  # builds and saves the snapshot
+    index = knowledge_index.load_index(str(tmp_path))  # loads it
+    assert index.intent_engine.is_compiled
+    assert index.gazetteer.is_compiled
+
+
+def test_unpickled_engine_compiles_on_first_use(tmp_path):
+    index = knowledge_index.KnowledgeIndex()
+    path = knowledge_index.save_snapshot(index, str(tmp_path), "test")
+    loaded = knowledge_index.load_snapshot(str(tmp_path), "test")
+    assert path.endswith(".pkl")
+    assert not loaded.intent_engine.is_compiled and not loaded.gazetteer.is_compiled
+    assert loaded.gazetteer.extract("I know c++ and react native") == {"technology": ["c++", "react native"]}
+    assert loaded.compile().intent_engine.is_compiled
+
+
+def test_snapshot_round_trip_memory_maps_the_matrix(tmp_path):
+    built = knowledge_index.load_index(str(tmp_path))
+    loaded = knowledge_index.load_index(str(tmp_path))
+    assert loaded is not built and loaded.version == built.version
+    assert isinstance(loaded.role_matcher.weights, np.memmap)
+    assert not loaded.role_matcher.weights.flags.writeable
+    assert np.array_equal(loaded.role_matcher.weights, built.role_matcher.weights)
+    skills = ["python", "sql", "docker"]
+    assert loaded.role_matcher.top_roles(skills) == built.role_matcher.top_roles(skills)
+    assert loaded.role_gaps.gaps == built.role_gaps.gaps
+
+
+def test_snapshot_key_covers_content_and_builder_code(monkeypatch):
+    kb = knowledge_index.load_knowledge_module()
+    key = knowledge_index.snapshot_key(kb)
+    assert key == knowledge_index.snapshot_key()
+    kb.simple_responses["greeting"] = ["Hello!"]
+    assert knowledge_index.snapshot_key(kb) != key
+    monkeypatch.setattr(knowledge_index, "SNAPSHOT_FORMAT", knowledge_index.SNAPSHOT_FORMAT + 1)
+    assert knowledge_index.snapshot_key() != key
+
+
+def test_stale_snapshot_is_rebuilt_and_removed(tmp_path):
+    knowledge_index.save_snapshot(knowledge_index.KnowledgeIndex(), str(tmp_path), "stale")
+    assert knowledge_index.load_snapshot(str(tmp_path)) is None
+    index = knowledge_index.load_index(str(tmp_path))
+    key = knowledge_index.snapshot_key()
+    assert index.version == knowledge_index.knowledge_fingerprint()
+    assert sorted(path.name for path in tmp_path.iterdir()) == [f"kb-{key}.matrices.npy", f"kb-{key}.pkl"]
+
+
+@pytest.mark.parametrize("suffix, corrupt", [
+    (".pkl", lambda data: data[: len(data) // 2]),
+    (".pkl", lambda data: b"not a pickle"),
+    (".matrices.npy", lambda data: data[: len(data) // 2]),
+    (".matrices.npy", lambda data: _other_matrix()),
+])
+def test_corrupt_snapshot_is_rebuilt(tmp_path, suffix, corrupt):
+    knowledge_index.load_index(str(tmp_path))
+    path = tmp_path / f"kb-{knowledge_index.snapshot_key()}{suffix}"
+    path.write_bytes(corrupt(path.read_bytes()))
+    assert knowledge_index.load_snapshot(str(tmp_path)) is None
+    index = knowledge_index.load_index(str(tmp_path))
+    assert index.role_matcher.top_roles(["python"])
+    # The rebuild replaced the broken file, so the next start loads the snapshot again.
+    assert knowledge_index.load_snapshot(str(tmp_path)) is not None
+
+
+def _other_matrix() -> bytes:
+    handle = io.BytesIO()
+    np.save(handle, np.zeros((2, 2), dtype=np.float32))
+    return handle.getvalue()
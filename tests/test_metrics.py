@@ -0,0 +1,51 @@
+import re
+import logging
+
+from metrics import Counter, Histogram, Registry
+
+
+def test_drain_and_merge_across_registries():
+    shard, supervisor = Registry(), Registry()
+    for registry in (shard, supervisor):
+        Counter("messages_total", "Messages.", ("outcome",), registry=registry)
+        Histogram("seconds", "Seconds.", ("stage",), buckets=(0.1, 1.0), registry=registry)
+    shard.metrics["messages_total"].inc("answered", amount=3)
+    shard.metrics["seconds"].observe(0.5, "send")
+
+    supervisor.merge(shard.drain())
+    supervisor.merge(shard.drain())  # nothing new since the last drain
+
+    assert supervisor.metrics["messages_total"].values == {("answered",): 3.0}
+    assert supervisor.metrics["seconds"].values == {("send",): [0, 1, 0, 0.5]}
+    assert shard.metrics["messages_total"].values == {}
+
+
+def test_merging_an_unknown_metric_is_logged(caplog):
+    registry = Registry()
+    with caplog.at_level(logging.WARNING):
+        registry.merge({"unknown_total": {("x",): 1.0}})
+        registry.merge({"unknown_total": {("x",): 1.0}})
+    assert [record.getMessage() for record in caplog.records] == [
+        "Dropping values of metric 'unknown_total', which is not registered in this process."]
+
+
+def test_shard_metrics_are_known_to_the_supervisor():
+    import metrics
+    import nlu  # noqa: F401
+    import outbound  # noqa: F401  (what shards.main imports)
+    for name in ("bot_inbound_messages_total", "bot_outbound_messages_total", "bot_stage_seconds",
+                 "bot_intent_detections_total"):
+        assert name in metrics.REGISTRY.metrics
+
+
+def test_intent_patterns_are_labelled_by_rule_number():
+    import knowledge_base
+    import nlu
+    nlu.PATTERN_MATCHES.values.clear()
+    nlu.score_intents("hello there, hi!", bounded=False)
+    labels = set(nlu.PATTERN_MATCHES.values)
+    assert labels and all(intent in knowledge_base.intent_patterns for intent, _ in labels)
+    for intent, rule in labels:
+        pattern, _ = knowledge_base.intent_patterns[intent][int(rule)]
+        assert re.search(pattern, "hello there, hi!", re.IGNORECASE)
+    assert labels <= set(nlu.PATTERN_SECONDS.values)
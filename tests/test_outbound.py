@@ -0,0 +1,187 @@
+import asyncio
+import random
+
+import pytest
+
+from outbound import FENCE, PRIORITY_ADMIN, PRIORITY_ANSWER, PRIORITY_NOTICE, SendScheduler, send_chunked, split_message
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(["skill", "python", "kubernetes", "x" * rng.randint(1, 120)]) for _ in range(count))
+
+
+def random_reply(rng: random.Random) -> str:
+    lines = []
+    for _ in range(rng.randint(1, 60)):
+        kind = rng.random()
+        if kind < 0.1:
+            lines.append(FENCE + rng.choice(["", "python"]))
+        elif kind < 0.15:
+            lines.append("y" * rng.randint(1, 5000))  # overlong, no spaces
+        else:
+            lines.append(_words(rng, rng.randint(0, 80)))
+    return "\n".join(lines)
+
+
+def test_short_text_is_one_message():
+    assert split_message("hello", 2000) == ["hello"]
+    assert split_message("   ", 2000) == []
+
+
+def test_splits_at_line_boundaries():
+    text = "\n".join(["a" * 900] * 3)
+    assert split_message(text, 2000) == ["a" * 900 + "\n" + "a" * 900, "a" * 900]
+
+
+def test_code_block_is_closed_and_reopened():
+    text = "intro\n```python\n" + "\n".join(["print(1)"] * 300) + "\n```\noutro"
+    messages = split_message(text, 500)
+    assert len(messages) > 1
+    for message in messages:
+        assert message.count(FENCE) % 2 == 0
+    assert messages[1].startswith("```python\n")
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_every_message_fits_the_limit(seed):
+    rng = random.Random(seed)
+    limit = rng.choice([20, 50, 200, 2000])
+    text = random_reply(rng)
+    messages = split_message(text, limit)
+    assert all(len(message) <= limit for message in messages)
+    # Nothing is lost: the non-space characters outside the added fences come back in order.
+    rejoined = "".join("".join(message.split()) for message in messages).replace(FENCE, "")
+    assert rejoined.replace("python", "") == "".join(text.split()).replace(FENCE, "").replace("python", "")
+
+
+# --- SEND SCHEDULING ---
+
+def recorder(sent: list, channel_id):
+    async def send(text):
+        sent.append((channel_id, text))
+    return send
+
+
+def test_most_important_messages_are_sent_first():
+    async def scenario():
+        scheduler = SendScheduler(channel_burst=10)
+        sent = []
+        results = await asyncio.gather(
+            scheduler.send(1, recorder(sent, 1), "notice", PRIORITY_NOTICE),
+            scheduler.send(1, recorder(sent, 1), "answer 1", PRIORITY_ANSWER),
+            scheduler.send(2, recorder(sent, 2), "admin", PRIORITY_ADMIN),
+            scheduler.send(1, recorder(sent, 1), "answer 2", PRIORITY_ANSWER),
+        )
+        return results, sent
+
+    results, sent = asyncio.run(scenario())
+    assert results == [True] * 4
+    assert [text for _, text in sent] == ["admin", "answer 1", "answer 2", "notice"]
+
+
+def test_order_across_many_channels():
+    rng = random.Random(5)
+    messages = [(rng.randrange(20), rng.choice((PRIORITY_ADMIN, PRIORITY_ANSWER, PRIORITY_NOTICE)), str(number))
+                for number in range(300)]
+
+    async def scenario():
+        scheduler = SendScheduler(channel_burst=1000, global_rate=1e6, global_burst=1000)
+        sent = []
+        await asyncio.gather(*(scheduler.send(channel_id, recorder(sent, channel_id), text, priority)
+                               for channel_id, priority, text in messages))
+        return sent, scheduler.stats()
+
+    sent, stats = asyncio.run(scenario())
+    assert [text for _, text in sent] == [text for _, _, text in sorted(messages, key=lambda entry: entry[1])]
+    assert stats == {"queued": 0, "sending": 0}
+
+
+def test_an_empty_channel_bucket_lets_other_channels_go_first():
+    async def scenario():
+        scheduler = SendScheduler(channel_rate=10, channel_burst=1)
+        sent = []
+        await asyncio.gather(
+            scheduler.send(1, recorder(sent, 1), "a1"),
+            scheduler.send(1, recorder(sent, 1), "a2", PRIORITY_ADMIN),
+            scheduler.send(2, recorder(sent, 2), "b1"),
+        )
+        return sent
+
+    assert [text for _, text in asyncio.run(scenario())] == ["a2", "b1", "a1"]
+
+
+def test_messages_that_wait_too_long_expire():
+    async def scenario():
+        scheduler = SendScheduler(channel_rate=1, channel_burst=1, max_age=0.1)
+        sent = []
+        results = await asyncio.gather(
+            scheduler.send(1, recorder(sent, 1), "now"),
+            scheduler.send(1, recorder(sent, 1), "too late"),
+            scheduler.send(2, recorder(sent, 2), "other channel"),
+        )
+        return results, sent, scheduler.stats()
+
+    results, sent, stats = asyncio.run(scenario())
+    assert results == [True, False, True]
+    assert [text for _, text in sent] == ["now", "other channel"]
+    assert stats["queued"] == 0
+
+
+def test_a_full_queue_drops_the_least_important_most_recent_message():
+    async def scenario():
+        scheduler = SendScheduler(max_queued=2, channel_burst=10)
+        sent = []
+        results = await asyncio.gather(
+            scheduler.send(1, recorder(sent, 1), "notice 1", PRIORITY_NOTICE),
+            scheduler.send(1, recorder(sent, 1), "notice 2", PRIORITY_NOTICE),
+            scheduler.send(1, recorder(sent, 1), "answer", PRIORITY_ANSWER),
+            scheduler.send(1, recorder(sent, 1), "notice 3", PRIORITY_NOTICE),
+        )
+        return results, sent
+
+    results, sent = asyncio.run(scenario())
+    assert results == [True, False, True, False]
+    assert [text for _, text in sent] == ["answer", "notice 1"]
+
+
+def test_send_errors_reach_the_sender():
+    async def failing(text):
+        raise ConnectionError("gone")
+
+    async def scenario():
+        scheduler = SendScheduler()
+        with pytest.raises(ConnectionError):
+            await scheduler.send(1, failing, "hello")
+        return await scheduler.send(1, recorder([], 1), "again")
+
+    assert asyncio.run(scenario())
+
+
+def test_send_chunked_stops_at_the_first_dropped_part():
+    reply = "\n".join(["A" * 30, "B" * 30, "C" * 30])
+
+    async def scenario():
+        # The first part expires just as the bucket refills, in time for the second one.
+        scheduler = SendScheduler(channel_rate=2, channel_burst=1, max_age=0.3)
+        sent = []
+
+        def send(text):
+            return scheduler.send(1, recorder(sent, 1), text)
+
+        await send("earlier reply")  # the channel's bucket is now empty
+        complete = await send_chunked(send, reply, limit=40)
+        return complete, sent
+
+    complete, sent = asyncio.run(scenario())
+    assert not complete
+    assert [text for _, text in sent] == ["earlier reply"]
+
+
+def test_send_chunked_sends_every_part():
+    sent = []
+
+    async def send(text):
+        sent.append(text)
+
+    assert asyncio.run(send_chunked(send, "\n".join(["A" * 30, "B" * 30]), limit=40))
+    assert sent == ["A" * 30, "B" * 30]
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+
+from rate_limits import BurstCoalescer, KeyedTokenBuckets, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_burst_and_refill():
+    bucket = TokenBucket(rate=2.0, capacity=3, now=0.0)
+    assert [bucket.take(0.0) for _ in range(4)] == [True, True, True, False]
+    assert bucket.wait_time(0.0) == 0.5
+    assert bucket.take(0.5) and not bucket.take(0.5)
+    assert bucket.wait_time(100.0) == 0.0 and bucket.tokens == 3  # refills up to the capacity only
+
+
+def test_token_bucket_without_rate_never_refills():
+    bucket = TokenBucket(rate=0.0, capacity=1, now=0.0)
+    assert bucket.take(0.0)
+    assert bucket.wait_time(10.0) == float("inf")
+
+
+def test_keyed_buckets_are_independent_and_bounded():
+    clock = FakeClock()
+    buckets = KeyedTokenBuckets(rate=1.0, capacity=1, max_keys=2, clock=clock)
+    assert buckets.take("a") and not buckets.take("a")
+    assert buckets.take("b")
+    assert buckets.wait_time("a") == 1.0  # also marks "a" as recently used
+    assert buckets.take("c")  # drops "b", the least recently used
+    assert len(buckets) == 2
+    assert buckets.take("b")  # back, and full again
+    clock.now += 1
+    assert buckets.take("c")
+
+
+def run_coalescer(scenario, **options):
+    answers = []
+
+    async def handler(context, text):
+        answers.append((context, text))
+
+    async def main():
+        coalescer = BurstCoalescer(handler, **options)
+        await scenario(coalescer)
+        return coalescer
+
+    coalescer = asyncio.run(main())
+    return answers, coalescer
+
+
+def test_first_message_is_answered_and_the_burst_merged():
+    async def scenario(coalescer):
+        assert coalescer.submit("user", "one", 1)
+        await asyncio.sleep(0.01)
+        assert not coalescer.submit("user", "two", 2)
+        assert not coalescer.submit("user", "three", 3)
+        assert coalescer.submit("other", "hello", 4)
+        await asyncio.sleep(0.2)
+
+    answers, coalescer = run_coalescer(scenario, window=0.05, max_wait=1.0)
+    assert answers == [(1, "one"), (4, "hello"), (3, "two\nthree")]
+    assert coalescer.stats() == {"active_users": 0, "answered": 3, "coalesced": 1, "failed": 0}
+
+
+def test_a_steady_stream_is_answered_after_max_wait():
+    async def scenario(coalescer):
+        coalescer.submit("user", "first")
+        for number in range(8):
+            await asyncio.sleep(0.02)
+            coalescer.submit("user", f"m{number}")
+        await asyncio.sleep(0.1)
+
+    answers, _ = run_coalescer(scenario, window=0.05, max_wait=0.07)
+    assert answers[0] == (None, "first")
+    assert len(answers) >= 3  # held messages did not wait for the user to stop
+    assert "\n".join(text for _, text in answers[1:]) == "\n".join(f"m{number}" for number in range(8))
+
+
+def test_handler_failures_are_logged(caplog):
+    async def failing(context, text):
+        raise RuntimeError(f"cannot answer {text}")
+
+    async def main():
+        coalescer = BurstCoalescer(failing, window=0.01)
+        coalescer.submit("user", "hi")
+        await asyncio.sleep(0.05)
+        return coalescer
+
+    with caplog.at_level(logging.ERROR):
+        coalescer = asyncio.run(main())
+    assert coalescer.failed == 1 and not coalescer._tasks
+    assert "cannot answer hi" in caplog.text
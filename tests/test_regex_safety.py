@@ -0,0 +1,78 @@
+import re
+
+import pytest
+
+import knowledge_base
+import nlu
+from gazetteer import Gazetteer
+from pattern_analysis import backtracking_risks
+from regex_safety import audit_patterns, chunk_text, knowledge_base_patterns
+
+
+@pytest.mark.parametrize("pattern", [r"(a+)+$", r"(a*)*b", r"\b(\w+\s?)+\bcareer", r"(?:\s*\w+)*x"])
+def test_nested_quantifiers_are_exponential(pattern):
+    assert "exponential" in [severity for severity, _ in backtracking_risks(pattern, re.IGNORECASE)]
+
+
+def test_dot_star_between_words_is_polynomial():
+    assert backtracking_risks(r"what.*become", re.IGNORECASE) == [
+        ("polynomial", "O(n^2): 1 '.*'-style repeat(s) across words with more pattern after them")]
+    assert backtracking_risks(r"^what.*become") == []
+
+
+@pytest.mark.parametrize("pattern", [r"\b(python|java|go)\b", r"\bhow (?:do|can) i become\b", r"\d{1,3}"])
+def test_safe_patterns_have_no_risks(pattern):
+    assert backtracking_risks(pattern, re.IGNORECASE) == []
+
+
+def test_knowledge_base_has_no_exponential_patterns():
+    findings = audit_patterns(knowledge_base_patterns(knowledge_base))
+    assert [finding for finding in findings if finding[2] == "exponential"] == []
+    flagged = audit_patterns([("intent:test", r"(a+)+b")])
+    assert flagged and flagged[0][:3] == ("intent:test", r"(a+)+b", "exponential")
+
+
+def test_chunks_keep_words_whole_and_add_up():
+    text = " ".join(f"word{number}" for number in range(300))
+    chunks = chunk_text(text, 64)
+    assert "".join(chunks) == text
+    assert all(len(chunk) <= 64 for chunk in chunks)
+    assert {word for chunk in chunks for word in chunk.split()} == set(text.split())
+    assert chunk_text("short", 64) == ["short"]
+    # A word longer than the chunk is cut, as there is nowhere else to cut.
+    assert chunk_text("x" * 10, 4) == ["xxxx", "xxxx", "xx"]
+
+
+def test_chunks_do_not_split_phrases_across_sentences():
+    sentence = "I have been working with spreadsheets for years. "
+    text = sentence + "Should I learn machine learning or data engineering next?"
+    # Cutting at the last space before 72 characters would leave "machine" and "learning" apart.
+    assert text.index("machine learning") < 72 < text.index("machine learning") + len("machine learning")
+    for size in range(60, 96):
+        chunks = chunk_text(text, size)
+        assert chunks == [sentence[:-1], " " + text[len(sentence):]], size
+
+
+def test_chunks_do_not_cut_dotted_names():
+    text = "a" * 40 + " node.js and next.js " + "b" * 40
+    for size in range(45, 70):
+        chunks = chunk_text(text, size)
+        assert any("node.js" in chunk for chunk in chunks) and any("next.js" in chunk for chunk in chunks), size
+
+
+def test_long_messages_keep_their_intents_and_entities():
+    filler = "Some context about my week and my job. " * 40
+    message = filler + "How do I become a machine learning engineer? I know python and react native."
+    assert len(chunk_text(message, nlu.MATCH_CHUNK_CHARS)) > 1
+    intents, entities = nlu.analyze_message(message)
+    assert entities["role"] == ["machine learning engineer"]
+    assert entities["technology"] == ["python", "react native"]
+    assert nlu.select_handler(intents, entities) == nlu.select_handler(*nlu.analyze_message(message[len(filler):]))
+
+
+def test_fallback_patterns_find_phrases_in_chunks():
+    gazetteer = Gazetteer()
+    gazetteer.add_pattern(r"\b\w+ developer\b", "role")
+    gazetteer.compile()
+    text = "I used to teach. " * 10 + "Now I am a game developer."
+    assert gazetteer.extract(text, chunk_size=64) == {"role": ["game developer"]}
@@ -0,0 +1,78 @@
+import pytest
+
+import nlu
+from knowledge_index import load_knowledge_module
+
+
+@pytest.fixture
+def edited_kb(monkeypatch):
+    """A fresh copy of knowledge_base.py that reload_knowledge_base will pick up instead of the file."""
+    kb = load_knowledge_module()
+    monkeypatch.setattr(nlu, "load_knowledge_module", lambda: kb)
+    # Whatever a test swaps in is put back afterwards.
+    monkeypatch.setattr(nlu, "INDEX", nlu.INDEX)
+    monkeypatch.setattr(nlu, "KB_VERSION", nlu.KB_VERSION)
+    return kb
+
+
+def test_unchanged_knowledge_base_is_not_rebuilt(edited_kb):
+    live = nlu.INDEX
+    assert nlu.reload_knowledge_base(snapshot_dir="") == (False, live.version)
+    assert nlu.INDEX is live
+
+
+def test_valid_change_swaps_in(edited_kb):
+    live = nlu.INDEX
+    edited_kb.simple_responses["greeting"] = ["Hello from the reloaded knowledge base!"]
+    changed, version = nlu.reload_knowledge_base(snapshot_dir="")
+    assert changed and version != live.version
+    assert nlu.INDEX is not live and nlu.KB_VERSION == version == nlu.INDEX.version
+    assert nlu.INDEX.simple_responses["greeting"] == ["Hello from the reloaded knowledge base!"]
+    # The live index was left as it was, for messages already using it.
+    assert live.simple_responses["greeting"] != ["Hello from the reloaded knowledge base!"]
+
+
+def test_unchanged_parts_are_reused(edited_kb):
+    live = nlu.INDEX
+    role_id = next(iter(edited_kb.role_skill_map))
+    edited_kb.role_skill_map[role_id]["description"] += " Updated."
+    nlu.reload_knowledge_base(snapshot_dir="")
+    index = nlu.INDEX
+    assert index is not live
+    assert index.intent_engine is live.intent_engine
+    assert index.gazetteer is live.gazetteer
+    assert index.fuzzy_matcher is live.fuzzy_matcher
+    # The role data changed (if not its skills), so the role structures are rebuilt...
+    assert index.role_cards is not live.role_cards
+    assert index.role_skill_map[role_id]["description"].endswith(" Updated.")
+    # ...but no skill gap between two roles needed recomputing.
+    assert index.role_gaps.recomputed == 0
+
+
+def test_changed_role_skills_only_recompute_its_gaps(edited_kb):
+    role_id = next(iter(edited_kb.role_skill_map))
+    edited_kb.role_skill_map[role_id]["skills"]["languages"] = ["python", "cobol"]
+    nlu.reload_knowledge_base(snapshot_dir="")
+    roles = len(edited_kb.role_skill_map)
+    assert nlu.INDEX.role_gaps.recomputed == 2 * (roles - 1)
+    assert "cobol" in nlu.INDEX.gazetteer.phrases
+
+
+@pytest.mark.parametrize("pattern, message", [
+    (r"(unclosed", "invalid pattern"),
+    (r"\b(a+)+\b", "unsafe"),
+])
+def test_bad_pattern_keeps_the_live_index(edited_kb, pattern, message):
+    live = nlu.INDEX
+    edited_kb.intent_patterns["greeting"].append((pattern, 1.0))
+    with pytest.raises(ValueError, match=message):
+        nlu.reload_knowledge_base(snapshot_dir="")
+    assert nlu.INDEX is live and nlu.KB_VERSION == live.version
+
+
+def test_malformed_knowledge_base_keeps_the_live_index(edited_kb):
+    live = nlu.INDEX
+    edited_kb.intent_patterns["greeting"].append("hello")  # not a (pattern, weight) tuple
+    with pytest.raises(ValueError, match="tuples"):
+        nlu.reload_knowledge_base(snapshot_dir="")
+    assert nlu.INDEX is live
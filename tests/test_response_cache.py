@@ -0,0 +1,56 @@
+from response_cache import LRUTTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction():
+    cache = LRUTTLCache(max_size=2, ttl=60, clock=FakeClock())
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = LRUTTLCache(max_size=10, ttl=60, clock=clock)
+    cache.put("a", 1)
+    clock.now += 59
+    assert cache.get("a") == 1
+    clock.now += 1
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_version_change_clears_and_drops_stale_puts():
+    cache = LRUTTLCache(max_size=10, ttl=60, clock=FakeClock())
+    cache.bind_version("v1")
+    cache.put("a", 1, version="v1")
+    cache.bind_version("v2")
+    assert cache.get("a") is None
+    cache.put("b", 2, version="v1")  # computed with the old knowledge base
+    assert len(cache) == 0
+
+
+def test_disabled_cache():
+    cache = LRUTTLCache(max_size=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+
+def test_ttl_per_entry():
+    clock = FakeClock()
+    cache = LRUTTLCache(max_size=10, ttl=60, clock=clock)
+    cache.put("short", 1, ttl=5)
+    cache.put("long", 2)
+    clock.now += 5
+    assert (cache.get("short"), cache.get("long")) == (None, 2)
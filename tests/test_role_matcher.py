@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+import knowledge_base
+from role_matcher import RoleMatcher
+from role_transitions import compute_gap, weighted_skills
+
+ROLES = {
+    "small": {"skills": {"languages": ["python"], "soft_skills": ["communication"]}},
+    "large": {"skills": {"languages": ["python", "java", "go", "rust"], "tools": ["docker", "git"]}},
+    "twin": {"skills": {"languages": ["python"], "soft_skills": ["communication"]}},
+    "unrelated": {"skills": {"tools": ["excel"]}},
+}
+WEIGHTS = {"soft_skills": 0.5}
+
+
+@pytest.fixture
+def matcher():
+    return RoleMatcher(ROLES, WEIGHTS)
+
+
+def test_weighted_jaccard_matches_compute_gap():
+    matcher = RoleMatcher(knowledge_base.role_skill_map, knowledge_base.skill_category_weights)
+    skills = ["python", "sql", "communication", "docker"]
+    # On the user's side a skill weighs what it weighs for the roles that value it most.
+    user = {skill: float(matcher.skill_weights[matcher.skill_index[skill]]) for skill in skills}
+    scores, _ = matcher.score(skills, "jaccard")
+    for row, role_id in enumerate(matcher.role_ids):
+        role = weighted_skills(knowledge_base.role_skill_map[role_id], knowledge_base.skill_category_weights)
+        assert scores[row] == pytest.approx(compute_gap(user, role).similarity, abs=1e-4)
+
+
+def test_category_weights_change_the_default_ranking():
+    roles = {
+        "people": {"skills": {"languages": ["python"], "soft_skills": ["communication", "teamwork", "leadership"]}},
+        "polyglot": {"skills": {"languages": ["python", "java", "go"]}},
+    }
+    # The soft skills the user lacks only count for half, so "people" is the closer role.
+    assert RoleMatcher(roles, WEIGHTS).top_roles(["python"], k=1)[0][0] == "people"
+    assert RoleMatcher(roles).top_roles(["python"], k=1)[0][0] == "polyglot"
+
+
+def test_jaccard_does_not_favour_large_roles(matcher):
+    best, score, overlap = matcher.top_roles(["python", "communication"], k=1)[0]
+    assert best == "small" and score == pytest.approx(1.0) and overlap == 2
+    assert matcher.top_roles(["python", "git"], k=1, metric="overlap")[0][0] == "large"
+    assert matcher.top_roles(["python", "git"], k=1)[0][0] == "small"
+
+
+def test_metrics(matcher):
+    large = matcher.role_ids.index("large")
+    for metric, expected in [("overlap", 2.0), ("coverage", 2 / 6), ("jaccard", 2 / 6)]:
+        scores, overlaps = matcher.score(["python", "docker"], metric)
+        assert scores[large] == pytest.approx(expected)
+        assert overlaps[large] == 2
+    with pytest.raises(ValueError):
+        matcher.score(["python"], "cosine")
+
+
+def test_ties_keep_knowledge_base_order(matcher):
+    assert [role_id for role_id, _, _ in matcher.top_roles(["python", "communication"], k=2)] == ["small", "twin"]
+    # Partial selection must not drop a role tied with the k-th best.
+    assert [role_id for role_id, _, _ in matcher.top_roles(["python"], k=1)] == ["small"]
+
+
+def test_roles_without_shared_skills_are_left_out(matcher):
+    assert [role_id for role_id, _, _ in matcher.top_roles(["python"], k=10)] == ["small", "twin", "large"]
+    assert matcher.top_roles(["cobol"]) == []
+    scores, overlaps = matcher.score([], "jaccard")
+    assert not scores.any() and not overlaps.any()
+
+
+def test_only_the_weight_matrix_is_stored(matcher):
+    assert not hasattr(matcher, "incidence")
+    assert matcher.weights.dtype == np.float32
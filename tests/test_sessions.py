@@ -0,0 +1,48 @@
+from sessions import Session, SessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_session_ttl_is_refreshed_by_use():
+    clock = FakeClock()
+    store = SessionStore(ttl=10, clock=clock)
+    key = store.key(1, 2)
+    store.put(key, Session("career_path", ("data_scientist",)))
+    clock.now += 9
+    assert store.get(key).roles == ("data_scientist",)
+    clock.now += 9
+    assert store.get(key) is not None
+    clock.now += 10
+    assert store.get(key) is None
+    assert store.stats()["expirations"] == 1
+
+
+def test_session_count_limit_evicts_least_recently_used():
+    clock = FakeClock()
+    store = SessionStore(max_sessions=2, ttl=100, clock=clock)
+    for user_id in (1, 2):
+        store.put(store.key(1, user_id), Session("career_path"))
+    store.get(store.key(1, 1))
+    store.put(store.key(1, 3), Session("career_path"))
+    assert store.get(store.key(1, 2)) is None
+    assert store.get(store.key(1, 1)) is not None
+    assert store.stats()["evictions"] == 1
+
+
+def test_session_memory_limit():
+    store = SessionStore(max_sessions=1000, ttl=100, max_bytes=2000, clock=FakeClock())
+    for user_id in range(50):
+        store.put(store.key(7, user_id), Session("role_suggestion", ("data_analyst", "data_scientist"), ("sql",)))
+        assert store.bytes <= 2000
+    assert 0 < len(store) < 50
+    assert store.bytes == sum(store._entry_size(key, session) for key, session in store._entries.items())
+
+
+def test_keys_do_not_collide():
+    assert SessionStore.key(1, 2) != SessionStore.key(2, 1)
@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHECK = """
+import gc, shard_preload, nlu
+assert nlu.INDEX.intent_engine.is_compiled, "intent rules or scanner not compiled"
+assert nlu.INDEX.gazetteer.is_compiled, "gazetteer scanner not compiled"
+assert gc.get_freeze_count() > 0
+"""
+
+
+def test_preload_compiles_patterns_before_freezing(tmp_path):
+    env = dict(os.environ, KB_SNAPSHOT_DIR=str(tmp_path))
+    for _ in range(2):  # the first run builds the snapshot, the second loads it
+        result = subprocess.run([sys.executable, "-c", CHECK], cwd=ROOT, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+    assert any(name.endswith(".pkl") for name in os.listdir(tmp_path))
@@ -0,0 +1,138 @@
+import json
+import logging
+import threading
+
+import pytest
+
+import structured_logging
+from structured_logging import JsonFormatter, SamplingFilter, logging_stats, setup_logging, shutdown_logging
+
+
+class _Collect(logging.Handler):
+    """Keeps the records it is given; optionally holds the writer thread on its first one."""
+
+    def __init__(self, hold: bool = False):
+        super().__init__()
+        self.records = []
+        self.writing = threading.Event()
+        self.resume = threading.Event()
+        if not hold:
+            self.resume.set()
+
+    def emit(self, record):
+        self.writing.set()
+        self.resume.wait(5)
+        self.records.append(record)
+
+
+@pytest.fixture(autouse=True)
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    shutdown_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def _record(message="Message: %r", args=("hi",), **extra):
+    record = logging.LogRecord("root", logging.INFO, __file__, 1, message, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_lines_include_structured_fields(tmp_path):
+    log_file = tmp_path / "bot.log"
+    setup_logging(mode="async", level="INFO", log_file=str(log_file), console=False)
+    logging.info("Message: %r", "hi", extra={"fields": {"intents": ["greeting"], "entities": {}}})
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        logging.exception("Handler failed")
+    shutdown_logging()
+    first, second = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+    assert first["msg"] == "Message: 'hi'" and first["level"] == "INFO" and first["logger"] == "root"
+    assert first["intents"] == ["greeting"] and first["entities"] == {}
+    assert "ts" in first and "sample_rate" not in first and "process" not in first
+    assert second["level"] == "ERROR" and "RuntimeError: boom" in second["exc"]
+
+
+def test_json_formatter_keeps_non_ascii_and_unserialisable_values():
+    line = JsonFormatter().format(_record("Café %s", ("☕",), fields={"when": object}))
+    entry = json.loads(line)
+    assert entry["msg"] == "Café ☕" and "☕" in line
+    assert entry["when"] == str(object)
+
+
+def test_sampling_keeps_a_share_of_sampled_info_records(monkeypatch):
+    draws = iter([0.05, 0.5, 0.09, 0.95])
+    monkeypatch.setattr(structured_logging.random, "random", lambda: next(draws))
+    sampling = SamplingFilter(0.1)
+    kept = [sampling.filter(_record(sampled=True)) for _ in range(4)]
+    assert kept == [True, False, True, False] and sampling.dropped == 2
+    # Unsampled records and warnings always pass, without drawing.
+    assert sampling.filter(_record())
+    warning = _record(sampled=True)
+    warning.levelno = logging.WARNING
+    assert sampling.filter(warning)
+
+
+def test_sampled_records_carry_their_rate(tmp_path, monkeypatch):
+    monkeypatch.setattr(structured_logging.random, "random", lambda: 0.0)
+    log_file = tmp_path / "bot.log"
+    setup_logging(mode="sync", level="INFO", log_file=str(log_file), sample_rate=0.25, console=False)
+    logging.info("sampled", extra={"sampled": True})
+    shutdown_logging()
+    assert json.loads(log_file.read_text(encoding="utf-8"))["sample_rate"] == 0.25
+
+
+def test_sync_handlers_agree_on_a_sampled_record(monkeypatch):
+    draws = iter([0.9, 0.0])
+    monkeypatch.setattr(structured_logging.random, "random", lambda: next(draws))
+    first, second = _Collect(), _Collect()
+    setup_logging(mode="sync", level="INFO", sample_rate=0.5, handlers=[first, second])
+    logging.info("dropped", extra={"sampled": True})
+    logging.info("kept", extra={"sampled": True})
+    assert [r.getMessage() for r in first.records] == [r.getMessage() for r in second.records] == ["kept"]
+    assert logging_stats()["sampled_out"] == 1  # counted once, not once per handler
+
+
+def test_full_queue_drops_and_counts_instead_of_blocking():
+    stalled = _Collect(hold=True)
+    setup_logging(mode="async", level="INFO", queue_size=1, handlers=[stalled])
+    logging.info("taken by the writer")
+    assert stalled.writing.wait(5)
+    logging.info("queued")
+    logging.info("dropped 1")
+    logging.info("dropped 2")
+    assert logging_stats() == {"sampled_out": 0, "queue_full_drops": 2}
+    stalled.resume.set()
+    shutdown_logging()
+    assert [record.getMessage() for record in stalled.records] == ["taken by the writer", "queued"]
+
+
+def test_shutdown_flushes_queued_records():
+    collected = _Collect()
+    setup_logging(mode="async", level="INFO", queue_size=1000, handlers=[collected])
+    for number in range(200):
+        logging.info("record %d", number)
+    shutdown_logging()
+    assert [record.getMessage() for record in collected.records] == [f"record {n}" for n in range(200)]
+    assert logging_stats()["queue_full_drops"] == 0
+
+
+def test_async_mode_formats_on_the_writer_thread():
+    collected = _Collect()
+    setup_logging(mode="async", level="INFO", handlers=[collected])
+    logging.info("Message: %r", "hi")
+    shutdown_logging()
+    record = collected.records[0]
+    assert record.args == ("hi",) and record.getMessage() == "Message: 'hi'"
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        setup_logging(mode="threaded")
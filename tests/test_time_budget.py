@@ -0,0 +1,49 @@
+import pytest
+
+import nlu
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    nlu.ANALYSIS_CACHE.clear()
+    nlu.REPLY_CACHE.clear()
+    yield
+    nlu.ANALYSIS_CACHE.clear()
+    nlu.REPLY_CACHE.clear()
+
+
+def expiry(cache, key):
+    return cache._entries[key][0] - cache.clock()
+
+
+def test_complete_analysis_is_cached_for_the_full_ttl():
+    message = "what skills do i need to become a devops engineer"
+    incomplete = set()
+    nlu.respond(message)
+    nlu.analyze_message(message, incomplete=incomplete)
+    assert incomplete == set()
+    assert expiry(nlu.ANALYSIS_CACHE, message) > nlu.DEGRADED_CACHE_TTL
+    assert expiry(nlu.REPLY_CACHE, message) > nlu.DEGRADED_CACHE_TTL
+
+
+def test_skipped_fuzzy_pass_is_cached_briefly(monkeypatch):
+    monkeypatch.setattr(nlu, "FUZZY_BUDGET_MS", 0)
+    message = "i know " + ", ".join(["python", "sql", "docker", "kubernets"] * 120)
+    reply = nlu.generate_response(message)
+    for cache in (nlu.ANALYSIS_CACHE, nlu.REPLY_CACHE):
+        assert 0 < expiry(cache, message) <= nlu.DEGRADED_CACHE_TTL
+    incomplete = set()
+    nlu.analyze_message(message, incomplete=incomplete)  # from the cache
+    assert incomplete == {"detect_entities"}
+    assert nlu.generate_response(message) == reply
+    assert nlu.REPLY_CACHE.stats()["hits"] >= 1
+
+
+def test_cut_intent_scoring_is_not_cached(monkeypatch):
+    monkeypatch.setattr(nlu, "MATCH_BUDGET_MS", 0)
+    message = "what skills do I need to become a data scientist"
+    incomplete = set()
+    nlu.analyze_message(message, incomplete=incomplete)
+    nlu.generate_response(message)
+    assert "detect_intents" in incomplete
+    assert len(nlu.ANALYSIS_CACHE) == 0 and len(nlu.REPLY_CACHE) == 0
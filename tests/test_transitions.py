@@ -0,0 +1,89 @@
+import pytest
+
+import knowledge_base
+import nlu
+from role_transitions import RoleGapIndex
+
+
+@pytest.mark.parametrize("message, source, target", [
+    ("I'm a data analyst, how do I become an ML engineer", "data_analyst", "machine_learning_engineer"),
+    ("I want to become a data scientist, I'm currently a data analyst", "data_analyst", "data_scientist"),
+    ("how do I switch from backend developer to full-stack developer?", "backend_developer", "full_stack_developer"),
+    ("what's the skill gap between a qa engineer and a pen tester", "qa_engineer", "penetration_tester"),
+    ("can a data analyst become a data scientist?", "data_analyst", "data_scientist"),
+])
+def test_transition_questions(message, source, target):
+    intents, entities = nlu.analyze_message(message)
+    assert nlu.select_handler(intents, entities) == "handle_role_transition_query"
+    assert nlu.transition_roles(nlu.normalize_message(message), entities, nlu.INDEX) == (source, target)
+    reply, session = nlu.respond(message)
+    names = nlu.INDEX.role_skill_map
+    assert reply.startswith(f"Moving from **{names[source]['display_name']}** to **{names[target]['display_name']}**")
+    assert session.roles[0] == source and session.roles[-1] == target
+
+
+def test_current_role_alone_asks_where_to_go():
+    message = "I am currently a data analyst and I like it"
+    intents, entities = nlu.analyze_message(message)
+    assert nlu.transition_roles(nlu.normalize_message(message), entities, nlu.INDEX) == ("data_analyst", None)
+    reply, session = nlu.respond(message)
+    assert reply.startswith("Which role would you like to move to from **Data Analyst**?")
+    assert "To become" not in reply
+    assert session.roles == nlu.INDEX.role_gaps.closest("data_analyst") and "data_analyst" not in session.roles
+
+
+def test_current_role_and_skills_get_suggestions_for_other_roles():
+    message = "I work as a qa engineer and know python and selenium, what jobs can I get?"
+    reply, session = nlu.respond(message)
+    assert "career prospects" in reply and "To become" not in reply
+    assert "QA Engineer" not in reply
+    assert len(session.roles) == 3 and "qa_engineer" not in session.roles
+
+
+def test_role_to_move_to_alone_gets_its_card():
+    message = "I want a career change, maybe to data scientist"
+    intents, entities = nlu.analyze_message(message)
+    assert nlu.transition_roles(nlu.normalize_message(message), entities, nlu.INDEX) == (None, "data_scientist")
+    assert nlu.generate_response(message).startswith("Excellent choice! To become a **Data Scientist**")
+
+
+def test_closest_roles():
+    closest = nlu.INDEX.role_gaps.closest("data_analyst")
+    gaps = [nlu.INDEX.role_gaps.gap("data_analyst", role_id).similarity for role_id in closest]
+    assert len(closest) == 3 and gaps == sorted(gaps, reverse=True)
+    assert nlu.INDEX.role_gaps.closest("no_such_role") == ()
+
+
+def test_two_roles_without_a_move_get_both_cards():
+    reply, session = nlu.respond("what are the skills needed for a backend developer and a frontend developer?")
+    assert "Moving from" not in reply
+    assert "**Backend Developer**" in reply and "**Frontend Developer**" in reply
+    assert session.roles == ("backend_developer", "frontend_developer")
+
+
+def test_from_to_without_roles_is_not_a_transition():
+    message = "I moved from Jakarta to Bandung, what jobs can I get with python and sql?"
+    intents, entities = nlu.analyze_message(message)
+    assert "career_transition" not in intents
+    assert nlu.select_handler(intents, entities) == "handle_skill_to_role_query"
+    assert "career prospects" in nlu.generate_response(message)
+
+
+def test_route_through_neighbouring_roles():
+    index = nlu.INDEX.role_gaps
+    assert index.route("data_analyst", "machine_learning_engineer") == (
+        "data_analyst", "data_scientist", "machine_learning_engineer")
+    gap = index.gap("data_analyst", "machine_learning_engineer")
+    assert "python" in gap.shared and "pytorch" in gap.missing
+    assert gap.similarity == index.gap("machine_learning_engineer", "data_analyst").similarity
+
+
+def test_incremental_rebuild_matches_full_build():
+    roles = {role_id: {**data, "skills": dict(data["skills"])} for role_id, data in knowledge_base.role_skill_map.items()}
+    previous = RoleGapIndex(roles, knowledge_base.skill_category_weights)
+    roles["data_analyst"]["skills"]["libraries"] = ["scikit-learn", "tensorflow"]
+    del roles["technical_writer"]
+    updated = RoleGapIndex(roles, knowledge_base.skill_category_weights, previous=previous)
+    full = RoleGapIndex(roles, knowledge_base.skill_category_weights)
+    assert updated.recomputed == 2 * (len(roles) - 1)
+    assert updated.gaps == full.gaps and updated.routes == full.routes
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import pytest
+
+import worker_pool
+from worker_pool import ResponseDispatcher
+
+
+@pytest.fixture
+def slow_pipeline(monkeypatch):
+    """Messages starting with "slow" take 0.2 s to answer, others are immediate."""
+    def pipeline(message, submitted_at, kb_version=None, session=None):
+        if message.startswith("slow"):
+            time.sleep(0.2)
+        return f"reply to {message}", session, 0.0, None
+    monkeypatch.setattr(worker_pool, "_run_pipeline", pipeline)
+
+
+def test_replies_keep_channel_order(slow_pipeline):
+    async def scenario():
+        dispatcher = ResponseDispatcher(mode="thread", workers=4)
+        sent = {1: [], 2: []}
+
+        def sender(channel_id):
+            async def send(text):
+                sent[channel_id].append(text)
+            return send
+
+        await asyncio.gather(
+            dispatcher.dispatch(1, "slow a", sender(1)),
+            dispatcher.dispatch(1, "b", sender(1)),
+            dispatcher.dispatch(2, "c", sender(2)),
+            dispatcher.dispatch(1, "d", sender(1)),
+        )
+        dispatcher.shutdown()
+        return sent
+
+    sent = asyncio.run(scenario())
+    assert sent[1] == ["reply to slow a", "reply to b", "reply to d"]
+    assert sent[2] == ["reply to c"]
+
+
+def test_other_channels_are_not_held_up(slow_pipeline):
+    async def scenario():
+        dispatcher = ResponseDispatcher(mode="thread", workers=4)
+        sent = []
+
+        async def send(text):
+            sent.append(text)
+
+        await asyncio.gather(dispatcher.dispatch(1, "slow a", send), dispatcher.dispatch(2, "b", send))
+        dispatcher.shutdown()
+        return sent
+
+    assert asyncio.run(scenario()) == ["reply to b", "reply to slow a"]
+
+
+def test_cancelled_dispatch_does_not_break_the_channel(slow_pipeline):
+    async def scenario():
+        dispatcher = ResponseDispatcher(mode="thread", workers=4)
+        sent = []
+
+        async def send(text):
+            sent.append(text)
+
+        first = asyncio.create_task(dispatcher.dispatch(1, "slow a", send))
+        second = asyncio.create_task(dispatcher.dispatch(1, "b", send))
+        await asyncio.sleep(0.05)  # "b" is answered and waiting for "slow a" to be sent
+        second.cancel()
+        assert await first is True
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        assert await dispatcher.dispatch(1, "c", send) is True
+        dispatcher.shutdown()
+        return sent, dispatcher.pending
+
+    sent, pending = asyncio.run(scenario())
+    assert sent == ["reply to slow a", "reply to c"]
+    assert pending == 0
+
+
+def test_sheds_when_full(slow_pipeline):
+    async def scenario():
+        dispatcher = ResponseDispatcher(mode="thread", workers=1, max_pending=1, busy_reply="busy")
+        sent = []
+
+        async def send(text):
+            sent.append(text)
+
+        results = await asyncio.gather(dispatcher.dispatch(1, "slow a", send), dispatcher.dispatch(2, "b", send))
+        dispatcher.shutdown()
+        return results, sent
+
+    results, sent = asyncio.run(scenario())
+    assert results == [True, False]
+    assert sent == ["busy", "reply to slow a"]
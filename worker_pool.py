@@ -0,0 +1,165 @@
+"""
+worker_pool.py
+
+Runs the CPU-bound response pipeline (nlu.respond) off the Discord
+event loop, so one long message cannot stall heartbeats or other channels.
+
+Three execution modes are supported:
+  - "inline":  run on the event loop, exactly like the original bot.
+  - "thread":  run in a thread pool (cheap, but shares the GIL).
+  - "process": run in a process pool; each worker imports nlu once when it
+               starts, so only the message text crosses the process boundary.
+
+The number of messages in flight is bounded. When the bound is reached new
+messages are shed, optionally with a short "busy" reply. Replies within one
+channel are always sent in the order the messages arrived.
+
+With a SessionStore, each user's conversation state is kept here, in the
+bot's process: it is passed to the pipeline with the message and the updated
+state comes back with the reply, so follow-ups work in every mode.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import os
+import time
+
+import metrics
+import structured_logging
+
+EXECUTION_MODES = ("inline", "thread", "process")
+
+DEFAULT_BUSY_REPLY = "I'm answering a lot of questions right now. Please try again in a moment!"
+
+
+def _init_worker(log_queue=None):
+    """Process pool initializer: loads the knowledge structures once per worker."""
+    started = time.perf_counter()
+    structured_logging.configure_worker(log_queue)
+    metrics.REGISTRY.drain()  # forget values inherited from the bot's process
+    import nlu  # noqa: F401  (importing nlu loads the knowledge index)
+    logging.info(f"Worker {os.getpid()} ready in {(time.perf_counter() - started) * 1000:.1f} ms.")
+
+
+def _run_pipeline(message: str, submitted_at: float, kb_version: str = None, session=None):
+    """
+    Runs in the worker. Returns the reply, the session to remember, how long the
+    job waited to start and the metrics recorded by a process worker (None in
+    the bot's own process).
+    Process workers get the bot's knowledge base version with each job and
+    reload (from the snapshot the bot just wrote) when it has changed.
+    """
+    import nlu
+    started_at = time.time()
+    nlu.ensure_version(kb_version)
+    reply, session = nlu.respond(message, session)
+    metrics_delta = metrics.REGISTRY.drain() if kb_version is not None else None
+    return reply, session, started_at - submitted_at, metrics_delta
+
+
+class ResponseDispatcher:
+    """Bounded, per-channel ordered execution of nlu.respond."""
+
+    def __init__(self, mode: str = "inline", workers: int = None, max_pending: int = 100,
+                 busy_reply: str = DEFAULT_BUSY_REPLY, sessions=None):
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode '{mode}'. Expected one of {EXECUTION_MODES}.")
+        self.mode = mode
+        self.max_pending = max_pending
+        self.busy_reply = busy_reply
+        self.sessions = sessions  # SessionStore, or None to answer every message on its own
+
+        if mode == "thread":
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="nlu-worker")
+        elif mode == "process":
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker,
+                initargs=(structured_logging.worker_log_queue(),))
+        else:
+            self.executor = None
+
+        self.pending = 0
+        self.completed = 0
+        self.shed = 0
+        self.recent_waits = collections.deque(maxlen=1000)  # seconds spent queued
+        self._channel_tails = {}  # channel id -> future resolved once its last reply is sent
+
+    async def _run(self, message: str, session=None) -> tuple:
+        submitted_at = time.time()
+        if self.executor is None:
+            reply, session, waited, metrics_delta = _run_pipeline(message, submitted_at, None, session)
+        else:
+            import nlu
+            kb_version = nlu.INDEX.version if self.mode == "process" else None
+            loop = asyncio.get_running_loop()
+            reply, session, waited, metrics_delta = await loop.run_in_executor(
+                self.executor, _run_pipeline, message, submitted_at, kb_version, session)
+        if metrics_delta:
+            metrics.REGISTRY.merge(metrics_delta)
+        self.recent_waits.append(max(waited, 0.0))
+        metrics.STAGE_SECONDS.observe(max(waited, 0.0), "queue_wait")
+        return reply, session
+
+    async def dispatch(self, channel_id, message: str, send, user_id=None):
+        """
+        Generates a reply for `message` and passes it to the `send` coroutine
+        function, after any earlier reply for the same channel has been sent.
+        With `user_id` and a session store, the reply can follow up on the last
+        one this user got in this channel.
+        Returns False if the message was shed because too many are in flight.
+        """
+        if self.pending >= self.max_pending:
+            self.shed += 1
+            logging.warning(f"Worker queue full ({self.pending} pending), shedding a message.")
+            if self.busy_reply:
+                await send(self.busy_reply)
+            return False
+
+        received = time.perf_counter()
+        self.pending += 1
+        previous = self._channel_tails.get(channel_id)
+        done = asyncio.get_running_loop().create_future()
+        self._channel_tails[channel_id] = done
+        session_key = None
+        if self.sessions is not None and user_id is not None:
+            session_key = self.sessions.key(channel_id, user_id)
+        try:
+            session = self.sessions.get(session_key) if session_key is not None else None
+            reply, session = await self._run(message, session)
+            if session_key is not None and session is not None:
+                self.sessions.put(session_key, session)
+            if previous is not None:
+                # Shielded: if this dispatch is cancelled, the previous one must still complete normally.
+                await asyncio.shield(previous)
+            started = time.perf_counter()
+            await send(reply)
+            finished = time.perf_counter()
+            metrics.STAGE_SECONDS.observe(finished - started, "send")
+            metrics.STAGE_SECONDS.observe(finished - received, "dispatch")
+            self.completed += 1
+            return True
+        finally:
+            self.pending -= 1
+            done.set_result(None)
+            if self._channel_tails.get(channel_id) is done:
+                del self._channel_tails[channel_id]
+
+    def stats(self) -> dict:
+        """Queue depth and wait-time figures for monitoring."""
+        waits = sorted(self.recent_waits)
+        return {
+            "mode": self.mode,
+            "queue_depth": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "shed": self.shed,
+            "avg_wait_ms": round(1000 * sum(waits) / len(waits), 3) if waits else 0.0,
+            "max_wait_ms": round(1000 * waits[-1], 3) if waits else 0.0,
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)